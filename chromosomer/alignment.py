@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import multiprocessing
+import os
+from bioformats.blast import BlastTab
+from chromosomer.exception import AlignmentToMapError
+from collections import OrderedDict
+from operator import attrgetter
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def add_best_alignment(alignments, new_alignment):
+    """
+    Given a list of the best alignments of a fragment, add a new
+    alignment to it and leave two alignments with the greatest
+    bit-score values.
+
+    :param alignments: a list of alignments of a fragment
+    :param new_alignment: an alignment to be added to the list
+    :type alignments: list
+    :type new_alignment: BlastTab.Alignment
+    :return: the updated list of alignments
+    :rtype: list
+    """
+    alignments.append(new_alignment)
+    if len(alignments) > 2:
+        alignments = sorted(alignments, key=attrgetter('bit_score'),
+                            reverse=True)[0:2]
+    return alignments
+
+
+def skip_queries(lines, queries):
+    """
+    Given lines of a BLAST tabular file, skip the lines of the
+    specified queries. Only the query column of a line is inspected,
+    so the lines are skipped without parsing the whole records.
+
+    :param lines: lines of a BLAST tabular file
+    :param queries: names of queries which alignments are to be
+        skipped
+    :type queries: set
+    :return: an iterator to the lines of other queries
+    """
+    for line in lines:
+        if line.split('\t', 1)[0] not in queries:
+            yield line
+
+
+class PafAlignments(object):
+    """
+    The class implements reading alignments in the PAF format produced
+    by minimap2 and similar aligners. The alignments are converted to
+    BLAST tabular alignments, so the object can be passed to
+    AlignmentToMap.blast instead of a BlastTab object; a column or a
+    tag of a PAF record is used as the alignment bit score.
+    """
+
+    # the PAF score columns and tags which can be used as bit scores
+    scores = ('block_length', 'matches', 'AS')
+
+    def __init__(self, handle, score='block_length'):
+        """
+        Create a PafAlignments object.
+
+        :param handle: a handle or an iterator to lines of a PAF file
+        :param score: the alignment score, the alignment block length
+            ('block_length'), the number of matching bases
+            ('matches') or the value of the AS tag ('AS')
+        :type score: str
+        """
+        if score not in self.scores:
+            logger.error('incorrect PAF alignment score %s', score)
+            raise AlignmentToMapError
+        self.__handle = handle
+        self.__score = score
+
+    def alignments(self):
+        """
+        Iterate through the alignments of the PAF file converted to
+        BLAST tabular alignments. Records of unmapped queries and
+        alignments with non-positive scores are skipped, since
+        alignment scores are compared by their ratios.
+
+        :return: an iterator to the alignments
+        """
+        for line in self.__handle:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            if len(parts) < 12:
+                logger.error('the incorrect number of columns in a PAF '
+                             'line: %s', line)
+                raise AlignmentToMapError
+            if parts[4] not in ('+', '-'):
+                # the query is unmapped
+                continue
+            try:
+                q_start, q_end = int(parts[2]), int(parts[3])
+                s_start, s_end = int(parts[7]), int(parts[8])
+                matches, block_length = int(parts[9]), int(parts[10])
+            except ValueError:
+                logger.error('the incorrect PAF line: %s', line)
+                raise AlignmentToMapError
+            if self.__score == 'block_length':
+                score = block_length
+            elif self.__score == 'matches':
+                score = matches
+            else:
+                score = None
+                for tag in parts[12:]:
+                    if tag.startswith('AS:i:'):
+                        score = int(tag[5:])
+                        break
+                if score is None:
+                    logger.error('the AS tag missing in a PAF line: %s',
+                                 line)
+                    raise AlignmentToMapError
+            if score <= 0:
+                logger.debug('an alignment with the non-positive score '
+                             'skipped: %s', line)
+                continue
+            # PAF positions are zero-based and BLAST ones are one-based;
+            # BLAST reports the subject positions of an alignment to
+            # the reverse strand in the descending order
+            s_start += 1
+            if parts[4] == '-':
+                s_start, s_end = s_end, s_start
+            yield BlastTab.Alignment(
+                query=parts[0], subject=parts[5],
+                identity=100.0 * matches / block_length
+                if block_length else 0.0,
+                length=block_length,
+                mismatches=block_length - matches,
+                gap_openings=0,
+                q_start=q_start + 1, q_end=q_end,
+                s_start=s_start, s_end=s_end,
+                e_value=0.0, bit_score=float(score))
+
+
+def _read_range(alignment_file, start, end):
+    """
+    Given a BLAST tabular file opened in the binary mode, iterate
+    through its lines located in the specified byte range.
+
+    :param alignment_file: a BLAST tabular file
+    :param start: the range start position
+    :param end: the range end position
+    :type alignment_file: file
+    :type start: int
+    :type end: int
+    :return: an iterator to the range lines
+    """
+    alignment_file.seek(start)
+    position = start
+    while position < end:
+        line = alignment_file.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line
+
+
+# queries skipped by a worker process of ParallelBlastTab
+_skipped_queries = None
+
+
+def _init_worker(queries):
+    """
+    Initialize a worker process of ParallelBlastTab.
+
+    :param queries: names of queries which alignments are to be
+        skipped
+    :type queries: set
+    """
+    global _skipped_queries
+    _skipped_queries = queries
+
+
+def _reduce_range(task):
+    """
+    Given a BLAST tabular file name and a byte range of it, return
+    the two best alignments of every query in the range. The routine
+    is launched in worker processes of ParallelBlastTab.
+
+    :param task: a tuple of the file name and the range start and
+        end positions
+    :type task: tuple
+    :return: a list of tuples of query names and lists of their best
+        alignments converted to plain tuples
+    :rtype: list
+    """
+    filename, start, end = task
+    best_alignments = OrderedDict()
+    with open(filename, 'rb') as alignment_file:
+        lines = _read_range(alignment_file, start, end)
+        if _skipped_queries:
+            lines = skip_queries(lines, _skipped_queries)
+        for alignment in BlastTab(lines).alignments():
+            best_alignments[alignment.query] = add_best_alignment(
+                best_alignments.get(alignment.query, []), alignment)
+    # named tuples of the BlastTab class cannot be pickled, so they are
+    # converted to plain tuples
+    return [(query, [tuple(i) for i in alignments])
+            for query, alignments in best_alignments.iteritems()]
+
+
+class ParallelBlastTab(object):
+    """
+    The class implements parallel reading of a BLAST tabular file.
+    The file is split into byte ranges aligned to query boundaries,
+    and worker processes reduce each range to the two best alignments
+    of every query. Only these alignments are required to construct
+    a fragment map, so the object can be passed to
+    AlignmentToMap.blast instead of a BlastTab object.
+    """
+
+    def __init__(self, filename, processes=None, chunks=None,
+                 skipped_queries=None):
+        """
+        Create a ParallelBlastTab object to read the specified BLAST
+        tabular file.
+
+        :param filename: a name of a BLAST tabular file
+        :param processes: the number of worker processes; if it is
+            omitted, the number of CPUs is used
+        :param chunks: the number of ranges the file is split into;
+            by default, four ranges per worker process
+        :param skipped_queries: names of queries which alignments are
+            to be skipped before parsing
+        :type filename: str
+        :type processes: int
+        :type chunks: int
+        :type skipped_queries: set
+        """
+        self.__filename = filename
+        self.__processes = processes or multiprocessing.cpu_count()
+        self.__chunks = chunks or 4 * self.__processes
+        self.__skipped_queries = skipped_queries
+
+    def ranges(self):
+        """
+        Split the BLAST tabular file into byte ranges, so that all
+        adjacent alignments of the same query are located in the same
+        range.
+
+        :return: a list of tuples of range start and end positions
+        :rtype: list
+        """
+        file_size = os.path.getsize(self.__filename)
+        boundaries = [0]
+        with open(self.__filename, 'rb') as alignment_file:
+            for i in xrange(1, self.__chunks):
+                position = file_size * i // self.__chunks
+                if position <= boundaries[-1]:
+                    continue
+                alignment_file.seek(position)
+                # skip the incomplete line
+                position += len(alignment_file.readline())
+                line = alignment_file.readline()
+                query = line.split('\t', 1)[0]
+                # skip the lines of the same query
+                while line and line.split('\t', 1)[0] == query:
+                    position += len(line)
+                    line = alignment_file.readline()
+                if boundaries[-1] < position < file_size:
+                    boundaries.append(position)
+        boundaries.append(file_size)
+
+        return zip(boundaries[:-1], boundaries[1:])
+
+    def alignments(self):
+        """
+        Return an iterator to the two best alignments of every query
+        from the BLAST tabular file.
+
+        :return: an iterator to the alignments
+        """
+        tasks = [(self.__filename, start, end)
+                 for start, end in self.ranges()]
+        logger.debug('%s split into %d ranges processed by %d workers',
+                     self.__filename, len(tasks), self.__processes)
+
+        best_alignments = OrderedDict()
+        pool = multiprocessing.Pool(self.__processes, _init_worker,
+                                    (self.__skipped_queries, ))
+        try:
+            for range_result in pool.imap(_reduce_range, tasks):
+                for query, alignments in range_result:
+                    query_alignments = best_alignments.get(query, [])
+                    for alignment in alignments:
+                        query_alignments = add_best_alignment(
+                            query_alignments,
+                            BlastTab.Alignment(*alignment))
+                    best_alignments[query] = query_alignments
+        finally:
+            pool.close()
+            pool.join()
+
+        for alignments in best_alignments.itervalues():
+            for alignment in alignments:
+                yield alignment
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import json
+import logging
+import multiprocessing
+import os
+import time
+from chromosomer.exception import BatchError
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class Batch(object):
+    """
+    The class implements running a batch of Chromosomer routines in a
+    single process. The routines are run by threads, so they share
+    fragment maps and FASTA files loaded by previous routines.
+    Routines that do not depend on each other are run concurrently;
+    a routine depends on a previous one if it reads or writes a file
+    written by the previous routine or writes a file the previous
+    routine reads.
+    """
+
+    Step = namedtuple('Step', ('name', 'args', 'dependencies'))
+
+    # arguments of output files and directories of the routines; the
+    # pipeline reference is an output since the aligner index (a BLAST
+    # database or a minimap2 .mmi file) is created next to it
+    output_arguments = {
+        'agp2map': ('output_file', ),
+        'assemble': ('output_fasta', ),
+        'bench': ('output', 'work_dir'),
+        'fastalength': ('output', ),
+        'fragmentmap': ('output_map', ),
+        'fragmentmapbed': ('output', ),
+        'fragmentmapstat': ('output', ),
+        'pipeline': ('output_map', 'archive', 'reference', 'cache'),
+        'simulator': ('output_dir', ),
+        'transfer': ('output', )
+    }
+
+    # routines that cannot be run in a batch
+    excluded_commands = ('batch', 'serve')
+
+    def __init__(self, jobs, parser, workers=None):
+        """
+        Create a Batch object from a list of routine steps. A step is
+        a list of command-line arguments of a routine or a dictionary
+        with the 'args' key of the arguments, the optional 'name' key
+        of the step name and the optional 'after' key of a list of
+        names of steps to be completed before the step.
+
+        :param jobs: a list of steps
+        :param parser: a command-line parser of the routine arguments
+        :param workers: the default number of concurrently run steps
+        :type jobs: list
+        :type parser: argparse.ArgumentParser
+        :type workers: int
+        """
+        self.__workers = workers
+        self.__steps = []
+        names = {}
+        for i, job in enumerate(jobs):
+            if not isinstance(job, dict):
+                job = {'args': job}
+            name = str(job.get('name', i + 1))
+            if name in names:
+                logger.error('duplicate step name %s', name)
+                raise BatchError
+            args = self.__parse(name, job.get('args'), parser)
+            dependencies = set()
+            for j in job.get('after', []):
+                if str(j) not in names:
+                    logger.error('step %s follows unknown step %s',
+                                 name, j)
+                    raise BatchError
+                dependencies.add(names[str(j)])
+            dependencies.update(self.__dependencies(args))
+            names[name] = i
+            self.__steps.append(Batch.Step(name, args,
+                                           sorted(dependencies)))
+
+    @property
+    def steps(self):
+        """
+        Return the steps of the batch.
+
+        :return: a list of steps; dependencies of a step are indices
+            of steps to be completed before it
+        :rtype: list
+        """
+        return self.__steps
+
+    @staticmethod
+    def read(filename, parser):
+        """
+        Read a batch from a JSON file. The file contains a list of
+        steps or a dictionary with the 'steps' key of the list and
+        the optional 'workers' key of the number of concurrently run
+        steps.
+
+        :param filename: a name of a JSON file of steps
+        :param parser: a command-line parser of the routine arguments
+        :type filename: str
+        :type parser: argparse.ArgumentParser
+        :return: the batch
+        :rtype: Batch
+        """
+        with open(filename) as jobs_file:
+            try:
+                jobs = json.load(jobs_file)
+            except ValueError as e:
+                logger.error('incorrect jobs file %s: %s', filename, e)
+                raise BatchError
+        if isinstance(jobs, dict):
+            return Batch(jobs.get('steps', []), parser,
+                         jobs.get('workers'))
+        return Batch(jobs, parser)
+
+    def __parse(self, name, args, parser):
+        """
+        Parse command-line arguments of a step.
+        """
+        if not isinstance(args, list) or not args:
+            logger.error('step %s has no routine arguments', name)
+            raise BatchError
+        args = map(str, args)
+        if args[0] in self.excluded_commands:
+            logger.error('the %s routine cannot be run in a batch',
+                         args[0])
+            raise BatchError
+        try:
+            return parser.parse_args(args)
+        except SystemExit:
+            logger.error('incorrect arguments of step %s: %s', name,
+                         ' '.join(args))
+            raise BatchError
+
+    @staticmethod
+    def __paths(args, names=None):
+        """
+        Return absolute paths of string arguments of a routine; if
+        argument names are specified, only their values are used.
+        """
+        values = []
+        for name, value in vars(args).iteritems():
+            if names is not None and name not in names:
+                continue
+            if isinstance(value, list):
+                values.extend(value)
+            else:
+                values.append(value)
+        return set(os.path.abspath(i) for i in values
+                   if isinstance(i, basestring))
+
+    @staticmethod
+    def __related(paths, other_paths):
+        """
+        Check if any path of one set is equal to or contains a path
+        of another set.
+        """
+        for i in paths:
+            for j in other_paths:
+                if i == j or i.startswith(j + os.sep) or \
+                        j.startswith(i + os.sep):
+                    return True
+        return False
+
+    def __dependencies(self, args):
+        """
+        Return indices of the previous steps which files are used by
+        a step with the specified arguments.
+        """
+        paths = self.__paths(args)
+        outputs = self.__paths(args, self.output_arguments.get(
+            args.command, ()))
+        result = []
+        for i, step in enumerate(self.__steps):
+            step_outputs = self.__paths(
+                step.args, self.output_arguments.get(step.args.command,
+                                                     ()))
+            if self.__related(paths, step_outputs) or \
+                    self.__related(outputs, self.__paths(step.args)):
+                result.append(i)
+        return result
+
+    def run(self, routine, workers=None):
+        """
+        Run the steps of the batch and log the time spent on every
+        step. If a step fails, the steps depending on it are skipped.
+
+        :param routine: a function launching a routine by its parsed
+            command-line arguments
+        :param workers: the number of concurrently run steps; by
+            default, the number specified for the batch or the number
+            of CPUs
+        :type workers: int
+        """
+        workers = workers or self.__workers or \
+            multiprocessing.cpu_count()
+        start_time = time.time()
+        completed = Queue()
+        pending = set(xrange(len(self.__steps)))
+        running = set()
+        succeeded = set()
+        failed = set()
+        pool = ThreadPool(workers)
+        try:
+            while pending or running:
+                for i in sorted(pending):
+                    dependencies = set(self.__steps[i].dependencies)
+                    if dependencies & failed:
+                        logger.error('step %s skipped because of '
+                                     'failed steps',
+                                     self.__steps[i].name)
+                        pending.remove(i)
+                        failed.add(i)
+                    elif dependencies <= succeeded:
+                        pending.remove(i)
+                        running.add(i)
+                        pool.apply_async(self.__run_step,
+                                         (i, routine),
+                                         callback=completed.put)
+                if not running:
+                    continue
+                i, error = completed.get()
+                running.remove(i)
+                if error:
+                    failed.add(i)
+                else:
+                    succeeded.add(i)
+        finally:
+            pool.close()
+            pool.join()
+        logger.info('batch of %d steps finished in %.3f s',
+                    len(self.__steps), time.time() - start_time)
+        if failed:
+            logger.error('%d of %d steps failed', len(failed),
+                         len(self.__steps))
+            raise BatchError
+
+    def __run_step(self, index, routine):
+        """
+        Run a step and return its index and whether it failed.
+        """
+        step = self.__steps[index]
+        logger.info('step %s (%s) started', step.name,
+                    step.args.command)
+        start_time = time.time()
+        try:
+            routine(step.args)
+        except Exception as e:
+            logger.error('step %s (%s) failed after %.3f s: %r',
+                         step.name, step.args.command,
+                         time.time() - start_time, e)
+            return index, True
+        logger.info('step %s (%s) finished in %.3f s', step.name,
+                    step.args.command, time.time() - start_time)
+        return index, False
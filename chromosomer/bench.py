@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import bioformats.bed
+import bioformats.gff3
+import chromosomer
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+import vcf
+from bioformats.blast import BlastTab
+from chromosomer.fragment import AlignmentToMap
+from chromosomer.fragment import Map
+from chromosomer.fragment import SeqLengths
+from chromosomer.simulator import StreamSimulator
+from chromosomer.timing import peak_rss
+from chromosomer.transfer import BedTransfer
+from chromosomer.transfer import Gff3Transfer
+from chromosomer.transfer import VcfTransfer
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class Benchmark(object):
+    """
+    The class implements a benchmark of Chromosomer routines on
+    simulated data of several scales.
+    """
+
+    def __init__(self, fragment_numbers, fragment_length=1000,
+                 chromosome_number=10, features=1, seed=1,
+                 work_dir=None):
+        """
+        Create a Benchmark object.
+
+        :param fragment_numbers: the numbers of simulated fragments,
+            each number defines a benchmark scale
+        :param fragment_length: the mean length of simulated fragments
+        :param chromosome_number: the number of simulated chromosomes
+        :param features: the number of simulated features of each
+            type per fragment
+        :param seed: the random seed of the simulated data
+        :param work_dir: a directory for simulated data; by default, a
+            temporary directory is created and removed afterwards
+        :type fragment_numbers: list
+        :type fragment_length: int
+        :type chromosome_number: int
+        :type features: int
+        :type seed: int
+        :type work_dir: str
+        """
+        self.__fragment_numbers = fragment_numbers
+        self.__fragment_length = fragment_length
+        self.__chromosome_number = chromosome_number
+        self.__features = features
+        self.__seed = seed
+        self.__work_dir = work_dir
+        self.__results = []
+
+    def __measure(self, scale, name, records, routine, *args):
+        """
+        Launch the routine and record its wall time, the number of
+        processed records per second and the peak memory usage.
+
+        :param scale: the benchmark scale
+        :param name: the benchmark name
+        :param records: the number of records processed by the
+            routine
+        :param routine: a routine to be measured
+        :type scale: int
+        :type name: str
+        :type records: int
+        :return: the value returned by the routine
+        """
+        start = time.time()
+        value = routine(*args)
+        seconds = time.time() - start
+        result = {
+            'scale': scale,
+            'name': name,
+            'records': records,
+            'seconds': seconds,
+            'records_per_second': records / seconds if seconds > 0
+            else None,
+            'peak_rss_kb': peak_rss()
+        }
+        logger.info('%s (%d fragments): %d records in %.3f s', name,
+                    scale, records, seconds)
+        self.__results.append(result)
+        return value
+
+    @staticmethod
+    def __count_lines(filename, comment=None):
+        """
+        Return the number of lines in a file excluding comment ones.
+        """
+        with open(filename) as input_file:
+            if comment is None:
+                return sum(1 for _ in input_file)
+            return sum(1 for line in input_file
+                       if not line.startswith(comment))
+
+    @staticmethod
+    def __transfer(transferrer, reader, writer):
+        """
+        Transfer features from the reader to the writer.
+        """
+        for feature in reader:
+            transferred_feature = transferrer.feature(feature)
+            if transferred_feature is not None:
+                writer(transferred_feature)
+
+    def __transfer_bed(self, map_file, input_file, output_file):
+        transferrer = BedTransfer(map_file)
+        with open(input_file) as input_bed:
+            with bioformats.bed.Writer(output_file) as output_bed:
+                self.__transfer(
+                    transferrer,
+                    bioformats.bed.Reader(input_bed).records(),
+                    output_bed.write)
+
+    def __transfer_gff3(self, map_file, input_file, output_file):
+        transferrer = Gff3Transfer(map_file)
+        with open(input_file) as input_gff3:
+            with bioformats.gff3.Writer(output_file) as output_gff3:
+                self.__transfer(
+                    transferrer,
+                    bioformats.gff3.Reader(input_gff3).records(),
+                    output_gff3.write)
+
+    def __transfer_vcf(self, map_file, input_file, output_file):
+        transferrer = VcfTransfer(map_file)
+        with open(input_file) as input_vcf:
+            reader = vcf.Reader(input_vcf)
+            with open(output_file, 'w') as output_vcf:
+                writer = vcf.Writer(output_vcf, reader)
+                self.__transfer(transferrer, reader,
+                                writer.write_record)
+
+    def __run_scale(self, fragment_number, work_dir):
+        """
+        Simulate data of the specified scale and benchmark routines
+        on it.
+        """
+        def path(name):
+            return os.path.join(work_dir, '{}_{}'.format(
+                fragment_number, name))
+
+        simulator = StreamSimulator(
+            self.__fragment_length, fragment_number,
+            self.__chromosome_number, fragment_number // 10,
+            100, seed=self.__seed)
+        simulator.write(path('map.txt'), path('fragments.fa'),
+                        path('chromosomes.fa'))
+        simulator.write_alignments(path('alignments.txt'))
+        simulator.write_features(self.__features,
+                                 *[path('features.' + i) for i in
+                                   ('bed', 'gff3', 'vcf')])
+
+        map_records = self.__count_lines(path('map.txt'))
+        fragment_map = Map()
+        self.__measure(fragment_number, 'Map.read', map_records,
+                       fragment_map.read, path('map.txt'))
+        self.__measure(fragment_number, 'Map.write', map_records,
+                       fragment_map.write, path('map_copy.txt'))
+        self.__measure(fragment_number, 'Map.assemble', map_records,
+                       fragment_map.assemble, path('fragments.fa'),
+                       path('assembled.fa'))
+        self.__measure(fragment_number, 'Map.shrink_gaps', map_records,
+                       fragment_map.shrink_gaps, 10)
+
+        fragment_lengths = SeqLengths(path('fragments.fa')).lengths()
+        with open(path('alignments.txt')) as alignment_file:
+            self.__measure(
+                fragment_number, 'AlignmentToMap.blast',
+                self.__count_lines(path('alignments.txt')),
+                AlignmentToMap(100, fragment_lengths).blast,
+                BlastTab(alignment_file), 1.2)
+        self.__measure(
+            fragment_number, 'AlignmentToMap.blast_columnar',
+            self.__count_lines(path('alignments.txt')),
+            AlignmentToMap(100, fragment_lengths).blast_columnar,
+            path('alignments.txt'), 1.2)
+
+        for name, routine, comment in (
+                ('BedTransfer', self.__transfer_bed, None),
+                ('Gff3Transfer', self.__transfer_gff3, '#'),
+                ('VcfTransfer', self.__transfer_vcf, '#')):
+            extension = name[:-len('Transfer')].lower()
+            input_file = path('features.' + extension)
+            self.__measure(fragment_number, name,
+                           self.__count_lines(input_file, comment),
+                           routine, path('map.txt'), input_file,
+                           path('transferred.' + extension))
+
+    def run(self):
+        """
+        Run the benchmark at all scales.
+
+        :return: a list of benchmark results
+        :rtype: list
+        """
+        self.__results = []
+        work_dir = self.__work_dir or tempfile.mkdtemp()
+        try:
+            for fragment_number in self.__fragment_numbers:
+                self.__run_scale(fragment_number, work_dir)
+        finally:
+            if self.__work_dir is None:
+                shutil.rmtree(work_dir)
+        return self.__results
+
+    def write(self, filename):
+        """
+        Run the benchmark and write its results to the specified file
+        in the JSON format.
+
+        :param filename: a name of the output JSON file
+        :type filename: str
+        """
+        results = self.run()
+        with open(filename, 'w') as output_file:
+            json.dump({
+                'chromosomer_version': chromosomer.__version__,
+                'python_version': platform.python_version(),
+                'platform': platform.platform(),
+                'fragment_length': self.__fragment_length,
+                'chromosome_number': self.__chromosome_number,
+                'features': self.__features,
+                'seed': self.__seed,
+                'results': results
+            }, output_file, indent=2, sort_keys=True)
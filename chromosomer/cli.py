@@ -5,24 +5,17 @@
 # gaik (dot) tamazian (at) gmail (dot) com
 
 import argparse
-import bioformats.bed
-import bioformats.gff3
+import cProfile
 import csv
 import logging
 import os
-import vcf
-from chromosomer.fragment import AlignmentToMap
-from chromosomer.fragment import SeqLengths
-from chromosomer.fragment import Map
-from chromosomer.fragment import Simulator
-from chromosomer.fragment import agp2map
-from chromosomer.transfer import BedTransfer
-from chromosomer.transfer import Gff3Transfer
-from chromosomer.transfer import VcfTransfer
-from bioformats.blast import BlastTab
+from chromosomer.timing import profiler
+from chromosomer.timing import progress
 from os.path import splitext
 
-from chromosomer.fragment import logger
+# the subcommand dependencies are imported on dispatch, so the
+# logger of the fragment module is obtained by its name
+logger = logging.getLogger('chromosomer.fragment')
 
 
 def read_fragment_lengths(filename):
@@ -36,19 +29,109 @@ def read_fragment_lengths(filename):
         values are their lengths
     :rtype: dict
     """
+    from chromosomer.fileio import open_input
     result = dict()
-    with open(filename) as length_file:
+    with open_input(filename) as length_file:
         length_reader = csv.reader(length_file, delimiter='\t')
         for fragment, length in length_reader:
             result[fragment] = int(length)
     return result
 
 
-def chromosomer():
+def read_centromeres(filename):
     """
-    The main function that is run if Chromosomer was launched. It
-    defines a command-line parser which processed arguments passed to
-    the program.
+    Given a name of a BED file of centromere locations, read them to
+    a dictionary.
+
+    :param filename: a name of a BED file of centromere locations
+    :type filename: str
+    :return: a dictionary which keys are reference chromosome names
+        and values are their centromere BED records
+    :rtype: dict
+    """
+    import bioformats.bed
+    from chromosomer.fileio import open_input
+    result = dict()
+    with open_input(filename) as centromere_file:
+        for record in bioformats.bed.Reader(centromere_file).records():
+            result[record.seq] = record
+    return result
+
+
+def get_fragment_lengths(filename):
+    """
+    Given a name of a file with fragment lengths, a FASTA file of
+    fragment sequences or its index (.fai) file, return a dictionary
+    of fragment lengths.
+
+    :param filename: a name of a file to get fragment lengths from
+    :type filename: str
+    :return: a dictionary which keys are fragment sequence names and
+        values are their lengths
+    :rtype: dict
+    """
+    from chromosomer.fileio import open_input
+    from chromosomer.fragment import SeqLengths
+    if filename.endswith('.fai'):
+        return SeqLengths(filename).lengths()
+    with open_input(filename) as input_file:
+        is_fasta = input_file.read(1) == '>'
+    if is_fasta:
+        return SeqLengths(filename).lengths()
+    return read_fragment_lengths(filename)
+
+
+def input_size(filename):
+    """
+    Given a name of an input file, return its size to report progress
+    of reading it; the size of a compressed file is unknown.
+
+    :param filename: a file name
+    :type filename: str
+    :return: the file size in bytes or None if the file is compressed
+    :rtype: int
+    """
+    from chromosomer.fileio import detect_compression
+    if detect_compression(filename) is not None:
+        return None
+    return os.path.getsize(filename)
+
+
+def write_fragment_map(fragment_map, unlocalized, unplaced,
+                       output_map):
+    """
+    Write a fragment map and lists of unlocalized and unplaced
+    fragments next to it.
+
+    :param fragment_map: a fragment map
+    :param unlocalized: a list of tuples of unlocalized fragment names
+        and chromosomes they were localized to
+    :param unplaced: a list of unplaced fragment names
+    :param output_map: an output fragment map file name
+    :type fragment_map: Map
+    :type unlocalized: list
+    :type unplaced: list
+    :type output_map: str
+    """
+    from chromosomer.fileio import output_compression
+    fragment_map.write(output_map)
+    prefix = splitext(output_map)[0]
+    if output_compression(output_map) is not None:
+        prefix = splitext(prefix)[0]
+    with open(prefix + '_unlocalized.txt', 'w') as unlocalized_file:
+        for i in unlocalized:
+            unlocalized_file.write('{}\t{}\n'.format(*i))
+    with open(prefix + '_unplaced.txt', 'w') as unplaced_file:
+        for i in unplaced:
+            unplaced_file.write('{}\n'.format(i))
+
+
+def create_parser():
+    """
+    Create the command-line parser of Chromosomer.
+
+    :return: the command-line parser
+    :rtype: argparse.ArgumentParser
     """
     parser = argparse.ArgumentParser(
         description='Reference-assisted chromosome assembly tool.')
@@ -60,6 +143,18 @@ def chromosomer():
     parser.add_argument('-d', '--debug', action='store_true',
                         help='show debugging messages')
 
+    parser.add_argument('-p', '--profile', action='store_true',
+                        help='report time spent in routine phases and '
+                             'peak memory usage')
+
+    parser.add_argument('--cprofile',
+                        help='write cProfile statistics of the run to '
+                             'the specified file')
+
+    parser.add_argument('--progress', type=float, metavar='SECONDS',
+                        help='report progress of long-running '
+                             'routines with the specified interval')
+
     # Parser for the 'chromosomer assemble' part that produces a FASTA
     # file of assembled chromosomes from the specified fragment map.
     assemble_parser = subparsers.add_parser(
@@ -84,6 +179,12 @@ def chromosomer():
                                  action='store_true',
                                  help='keep soft masking from the '
                                       'original fragment sequences')
+    assemble_parser.add_argument('-i', '--incremental',
+                                 action='store_true',
+                                 help='reassemble only chromosomes '
+                                      'which map records or fragment '
+                                      'sequences changed since the '
+                                      'previous run')
 
     # Parser for the 'chromosomer fragmentmap' part that
     # produces a map of fragment positions on reference
@@ -100,7 +201,7 @@ def chromosomer():
     # required arguments for the 'fragmentmap' routine
     fragmentmap_parser.add_argument(
         'alignment_file',
-        help='a BLAST tabular file of fragment alignments to '
+        help='a BLAST tabular or PAF file of fragment alignments to '
              'reference chromosomes'
     )
     fragmentmap_parser.add_argument(
@@ -109,8 +210,9 @@ def chromosomer():
     )
     fragmentmap_parser.add_argument(
         'fragment_lengths',
-        help='a file containing lengths of fragment sequences; it can '
-             'be obtained using the \'chromosomer fastalength\' tool'
+        help='a file containing lengths of fragment sequences (it can '
+             'be obtained using the \'chromosomer fastalength\' tool), '
+             'a FASTA file of fragment sequences or its index (.fai)'
     )
     fragmentmap_parser.add_argument(
         'output_map',
@@ -130,6 +232,122 @@ def chromosomer():
         help='shrink large interfragment gaps to the specified size'
     )
 
+    fragmentmap_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='the number of processes to read the alignment file in '
+             'parallel'
+    )
+
+    fragmentmap_parser.add_argument(
+        '--columnar', action='store_true',
+        help='process alignments in chunks of columns using NumPy; '
+             'the number of processes is ignored'
+    )
+
+    fragmentmap_parser.add_argument(
+        '--format', choices=('blast', 'paf'), default='blast',
+        help='the format of the alignment file, BLAST tabular or PAF '
+             'produced by minimap2'
+    )
+
+    fragmentmap_parser.add_argument(
+        '--paf_score', choices=('block_length', 'matches', 'AS'),
+        default='block_length',
+        help='the PAF column or tag used as an alignment score: the '
+             'alignment block length, the number of matching bases '
+             'or the AS tag value'
+    )
+
+    fragmentmap_parser.add_argument(
+        '-m', '--min_fragment_length', type=int,
+        help='the minimal length of a fragment to be included in the '
+             'map'
+    )
+
+    fragmentmap_parser.add_argument(
+        '-c', '--centromeres',
+        help='a BED file of reference chromosome centromere '
+             'locations; fragments aligned to different chromosome '
+             'arms are assigned to different chromosomes'
+    )
+
+    # Parser for the 'chromosomer pipeline' part that aligns fragments
+    # to reference chromosomes and constructs a fragment map from the
+    # aligner output without writing it to an intermediate file
+    pipeline_parser = subparsers.add_parser(
+        'pipeline',
+        description='Align fragments to reference chromosomes and '
+                    'construct a fragment map from the alignments '
+                    'while they are produced.',
+        help='align fragments and construct a fragment map',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    pipeline_parser.add_argument(
+        'fragments',
+        help='a FASTA file of fragment sequences'
+    )
+    pipeline_parser.add_argument(
+        'reference',
+        help='a FASTA file of reference chromosome sequences or a '
+             'BLAST database of them'
+    )
+    pipeline_parser.add_argument(
+        'gap_size', type=int,
+        help='a size of a gap inserted between mapped fragments'
+    )
+    pipeline_parser.add_argument(
+        'output_map',
+        help='an output fragment map file name'
+    )
+    pipeline_parser.add_argument(
+        '-a', '--aligner', choices=('blastn', 'minimap2'),
+        default='blastn',
+        help='the aligner of fragments to reference chromosomes'
+    )
+    pipeline_parser.add_argument(
+        '-t', '--threads', type=int, default=1,
+        help='the number of aligner threads'
+    )
+    pipeline_parser.add_argument(
+        '-x', '--preset', default='asm5',
+        help='the minimap2 preset'
+    )
+    pipeline_parser.add_argument(
+        '--paf_score', choices=('block_length', 'matches', 'AS'),
+        default='block_length',
+        help='the PAF column or tag used as an alignment score'
+    )
+    pipeline_parser.add_argument(
+        '--archive',
+        help='a file to save the aligner output to; it is compressed '
+             'if its name ends with .gz'
+    )
+    pipeline_parser.add_argument(
+        '--cache',
+        help='an alignment cache file; blastn aligns only fragments '
+             'which alignments are missing in it'
+    )
+    pipeline_parser.add_argument(
+        '-r', '--ratio_threshold', type=float, default=1.2,
+        help='the least ratio of two greatest fragment alignment '
+             'scores to determine the fragment placed to a reference '
+             'genome'
+    )
+    pipeline_parser.add_argument(
+        '-s', '--shrink_gaps', action='store_true',
+        help='shrink large interfragment gaps to the specified size'
+    )
+    pipeline_parser.add_argument(
+        '-m', '--min_fragment_length', type=int,
+        help='the minimal length of a fragment to be included in the '
+             'map'
+    )
+    pipeline_parser.add_argument(
+        '-c', '--centromeres',
+        help='a BED file of reference chromosome centromere '
+             'locations'
+    )
+
     # Parser for the 'chromosomer fragmentmapstat' part that reports
     # statistics on a fragment map
     fragmentmapstat_parser = subparsers.add_parser(
@@ -144,6 +362,15 @@ def chromosomer():
     fragmentmapstat_parser.add_argument('output',
                                         help='an output file of '
                                              'fragment map statistics')
+    fragmentmapstat_parser.add_argument('-e', '--extended',
+                                        action='store_true',
+                                        help='write extended statistics '
+                                             'in the JSON format')
+    fragmentmapstat_parser.add_argument('--bins', type=int, nargs='+',
+                                        help='upper bounds of bins of '
+                                             'the fragment length '
+                                             'histogram of extended '
+                                             'statistics')
 
     # Parser for the 'chromosomer fragmentmapbed' part that converts
     # a fragement map to the BED format
@@ -188,6 +415,16 @@ def chromosomer():
                                  help='the format of a file of '
                                       'annotated features (bed, '
                                       'gff3 or vcf)')
+    transfer_parser.add_argument('--policy', default='drop',
+                                 choices=['drop', 'clip', 'split'],
+                                 help='transfer features not located '
+                                      'within a single placed region '
+                                      'of a fragment by dropping, '
+                                      'clipping or splitting them')
+    transfer_parser.add_argument('--hierarchy', action='store_true',
+                                 help='transfer or skip GFF3 gene '
+                                      'models as a whole and lift '
+                                      'sequence-region pragmas')
 
     # Parser for the 'chromosomer fastalength' part that calculates
     # lengths of sequences in the given FASTA file.
@@ -234,6 +471,32 @@ def chromosomer():
     simulator_parser.add_argument('--prefix', default='',
                                   help='the prefix for output file '
                                        'names')
+    simulator_parser.add_argument('--seed', type=int,
+                                  help='the random seed to reproduce '
+                                       'the simulated data')
+    simulator_parser.add_argument('--length_distribution',
+                                  default='fixed',
+                                  choices=('fixed', 'uniform',
+                                           'exponential'),
+                                  help='the distribution of fragment '
+                                       'lengths around fr_len')
+    simulator_parser.add_argument('-a', '--alignments',
+                                  action='store_true',
+                                  help='write simulated BLAST '
+                                       'alignments of fragments to '
+                                       'chromosomes')
+    simulator_parser.add_argument('--decoys', type=int, default=1,
+                                  help='the number of decoy alignments '
+                                       'per fragment')
+    simulator_parser.add_argument('--score_ratio', type=float,
+                                  default=2.0,
+                                  help='the ratio of true to decoy '
+                                       'alignment bit scores')
+    simulator_parser.add_argument('-f', '--features', type=int,
+                                  default=0,
+                                  help='the number of simulated BED, '
+                                       'GFF3 and VCF features per '
+                                       'fragment')
 
     # Parser for the 'chromosomer agp2map' routine
     agp2map_parser = subparsers.add_parser(
@@ -248,10 +511,97 @@ def chromosomer():
                                                     'fragment map '
                                                     'file')
 
-    args = parser.parse_args()
+    # Parser for the 'chromosomer bench' routine
+    bench_parser = subparsers.add_parser(
+        'bench',
+        description='Benchmark Chromosomer routines on simulated '
+                    'data and write the results in the JSON format.',
+        help='benchmark Chromosomer routines',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    # required arguments for the 'bench' routine
+    bench_parser.add_argument('output', help='an output JSON file of '
+                                             'benchmark results')
+
+    # optional arguments for the 'bench' routine
+    bench_parser.add_argument('-n', '--fragment_numbers', type=int,
+                              nargs='+', default=[100, 1000],
+                              help='the numbers of simulated '
+                                   'fragments, one per benchmark scale')
+    bench_parser.add_argument('-l', '--fragment_length', type=int,
+                              default=1000,
+                              help='the mean length of simulated '
+                                   'fragments')
+    bench_parser.add_argument('-c', '--chromosomes', type=int,
+                              default=10,
+                              help='the number of simulated '
+                                   'chromosomes')
+    bench_parser.add_argument('-f', '--features', type=int, default=1,
+                              help='the number of simulated features '
+                                   'of each type per fragment')
+    bench_parser.add_argument('--seed', type=int, default=1,
+                              help='the random seed of simulated data')
+    bench_parser.add_argument('--work_dir',
+                              help='a directory to keep simulated '
+                                   'data in')
+
+    # Parser for the 'chromosomer serve' routine
+    serve_parser = subparsers.add_parser(
+        'serve',
+        description='Load fragment maps and serve requests to '
+                    'transfer coordinates and features.',
+        help='serve transfer requests',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    serve_parser.add_argument('map', nargs='+',
+                              help='a fragment map file; a map name '
+                                   'may be specified as NAME=FILE, '
+                                   'otherwise it is the file name '
+                                   'without the extension')
+    serve_parser.add_argument('-s', '--socket',
+                              help='a Unix socket to serve on')
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help='a host to serve on')
+    serve_parser.add_argument('--port', type=int, default=8035,
+                              help='a port to serve on')
+
+    # Parser for the 'chromosomer batch' routine
+    batch_parser = subparsers.add_parser(
+        'batch',
+        description='Run a list of Chromosomer routines in a single '
+                    'process that shares loaded fragment maps and '
+                    'FASTA files between them.',
+        help='run a batch of routines',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    batch_parser.add_argument('jobs',
+                              help='a JSON file of routine arguments')
+    batch_parser.add_argument('-w', '--workers', type=int,
+                              help='the number of routines run '
+                                   'concurrently; by default, the '
+                                   'number specified in the jobs '
+                                   'file or the number of CPUs')
+
+    return parser
+
+
+def chromosomer():
+    """
+    The main function that is run if Chromosomer was launched. It
+    parses arguments passed to the program and launches the specified
+    routine.
+    """
+    args = create_parser().parse_args()
 
+    # loggers of other modules which messages are shown
+    routine_loggers = [logging.getLogger(i) for i in
+                       ('chromosomer.timing', 'chromosomer.server',
+                        'chromosomer.batch')]
     if args.debug:
         logger.setLevel(logging.DEBUG)
+        for i in routine_loggers:
+            i.setLevel(logging.DEBUG)
     else:
         logger.setLevel(logging.INFO)
         logger.propagate = False
@@ -268,82 +618,259 @@ def chromosomer():
         cli_logger.addHandler(ch)
         cli_logger.setLevel(logging.INFO)
 
+        for i in routine_loggers:
+            i.propagate = False
+            i.addHandler(ch)
+            i.setLevel(logging.INFO)
+
+    if args.profile:
+        profiler.enable()
+    if args.progress is not None:
+        progress.enable(args.progress)
+
+    if args.cprofile is not None:
+        cProfile.runctx('run(args)', globals(), {'args': args},
+                        args.cprofile)
+    else:
+        run(args)
+
+    if args.profile:
+        summary = profiler.summary()
+        for phase in summary['phases']:
+            logger.info('profile: %s - %d calls, %.3f s',
+                        phase['name'], phase['calls'],
+                        phase['seconds'])
+        logger.info('profile: peak memory usage - %d kB',
+                    summary['peak_rss_kb'])
+
+
+def run(args):
+    """
+    Launch the Chromosomer routine specified by the parsed
+    command-line arguments.
+
+    :param args: parsed command-line arguments
+    :type args: argparse.Namespace
+    """
     if args.command == 'assemble':
-        fragment_map = Map()
-        fragment_map.read(args.map)
+        from chromosomer.fragment import fasta_cache
+        from chromosomer.transfer import map_cache
+        # the caches share maps and FASTA files between routines of a
+        # batch
+        fragment_map = map_cache.get(args.map)
         fragment_map.assemble(args.fragment_fasta,
                               args.output_fasta,
-                              args.save_soft_mask)
+                              args.save_soft_mask,
+                              args.incremental,
+                              fasta_cache)
     elif args.command == 'fragmentmap':
-        fragment_lengths = read_fragment_lengths(args.fragment_lengths)
-        map_creator = AlignmentToMap(args.gap_size, fragment_lengths)
-        with open(args.alignment_file) as alignment_file:
-            alignments = BlastTab(alignment_file)
+        from bioformats.blast import BlastTab
+        from chromosomer.alignment import PafAlignments
+        from chromosomer.alignment import ParallelBlastTab
+        from chromosomer.alignment import skip_queries
+        from chromosomer.fileio import open_input
+        from chromosomer.fragment import AlignmentToMap
+        fragment_lengths = get_fragment_lengths(args.fragment_lengths)
+        alignment_size = input_size(args.alignment_file)
+        if args.centromeres is not None:
+            centromeres = read_centromeres(args.centromeres)
+        else:
+            centromeres = None
+        map_creator = AlignmentToMap(args.gap_size, fragment_lengths,
+                                     args.min_fragment_length,
+                                     centromeres)
+        # alignments of short fragments are skipped before parsing
+        skipped_fragments = map_creator.short_fragments()
+        if args.format == 'paf' and (args.columnar or args.jobs > 1):
+            logger.warning('PAF alignments are read by a single '
+                           'process')
+        elif args.jobs > 1 and not args.columnar and \
+                alignment_size is None:
+            logger.warning('compressed alignments are read by a '
+                           'single process')
+        if args.columnar and args.format == 'blast':
+            alignment_progress = progress.start(
+                'fragmentmap',
+                total_bytes=alignment_size,
+                unit='alignments')
+            fragment_map, unlocalized, unplaced = \
+                map_creator.blast_columnar(
+                    args.alignment_file, args.ratio_threshold,
+                    alignment_progress=alignment_progress)
+        elif args.jobs > 1 and args.format == 'blast' and \
+                alignment_size is not None:
+            alignments = ParallelBlastTab(
+                args.alignment_file, args.jobs,
+                skipped_queries=skipped_fragments)
             fragment_map, unlocalized, unplaced = map_creator.blast(
                 alignments, args.ratio_threshold)
-            if args.shrink_gaps:
-                fragment_map.shrink_gaps(args.gap_size)
-            fragment_map.write(args.output_map)
-            # write unlocalized and unplaced fragments
-            with open(splitext(args.output_map)[0] + '_unlocalized.txt',
-                      'w') as unlocalized_file:
-                for i in unlocalized:
-                    unlocalized_file.write('{}\t{}\n'.format(*i))
-            with open(splitext(args.output_map)[0] + '_unplaced.txt',
-                      'w') as unplaced_file:
-                for i in unplaced:
-                    unplaced_file.write('{}\n'.format(i))
+        else:
+            alignment_progress = progress.start(
+                'fragmentmap',
+                total_bytes=alignment_size,
+                unit='alignments')
+            with open_input(args.alignment_file) as alignment_file:
+                lines = alignment_progress.lines(alignment_file)
+                if skipped_fragments:
+                    lines = skip_queries(lines, skipped_fragments)
+                if args.format == 'paf':
+                    alignments = PafAlignments(lines, args.paf_score)
+                else:
+                    alignments = BlastTab(lines)
+                fragment_map, unlocalized, unplaced = map_creator.blast(
+                    alignments, args.ratio_threshold,
+                    alignment_progress)
+        if args.shrink_gaps:
+            fragment_map.shrink_gaps(args.gap_size)
+        write_fragment_map(fragment_map, unlocalized, unplaced,
+                           args.output_map)
+    elif args.command == 'pipeline':
+        from bioformats.blast import BlastTab
+        from chromosomer.alignment import PafAlignments
+        from chromosomer.alignment import skip_queries
+        from chromosomer.fragment import AlignmentToMap
+        from chromosomer.wrapper.process import tee_lines
+        fragment_lengths = get_fragment_lengths(args.fragments)
+        if args.centromeres is not None:
+            centromeres = read_centromeres(args.centromeres)
+        else:
+            centromeres = None
+        map_creator = AlignmentToMap(args.gap_size, fragment_lengths,
+                                     args.min_fragment_length,
+                                     centromeres)
+        skipped_fragments = map_creator.short_fragments()
+        if args.aligner == 'minimap2':
+            from chromosomer.wrapper.minimap2 import Minimap2
+            aligner = Minimap2(args.fragments, args.reference,
+                               threads=args.threads)
+            aligner.set('-x', args.preset)
+            # minimap2 outputs the AS tag only for base-level
+            # alignments
+            aligner.set('-c', args.paf_score == 'AS')
+        else:
+            from chromosomer.wrapper.blast import BlastN
+            from chromosomer.wrapper.blast import MakeBlastDb
+            if not any(os.path.isfile(args.reference + i) for i in
+                       ('.nin', '.nal')):
+                MakeBlastDb(args.reference).launch()
+            if args.cache is not None:
+                from chromosomer.wrapper.blast import CachedBlastN
+                aligner = CachedBlastN(args.fragments, args.reference,
+                                       args.cache)
+            else:
+                aligner = BlastN(args.fragments, args.reference)
+            aligner.set('-num_threads', args.threads)
+        # the aligner output is consumed while it is produced
+        lines = aligner.alignments()
+        if args.archive is not None:
+            lines = tee_lines(lines, args.archive)
+        alignment_progress = progress.start('pipeline',
+                                            unit='alignments')
+        lines = alignment_progress.lines(lines)
+        if skipped_fragments:
+            lines = skip_queries(lines, skipped_fragments)
+        if args.aligner == 'minimap2':
+            alignments = PafAlignments(lines, args.paf_score)
+        else:
+            alignments = BlastTab(lines)
+        fragment_map, unlocalized, unplaced = map_creator.blast(
+            alignments, args.ratio_threshold, alignment_progress)
+        if args.shrink_gaps:
+            fragment_map.shrink_gaps(args.gap_size)
+        write_fragment_map(fragment_map, unlocalized, unplaced,
+                           args.output_map)
     elif args.command == 'transfer':
+        import bioformats.bed
+        import bioformats.gff3
+        import vcf
+        from chromosomer.transfer import BedTransfer
+        from chromosomer.transfer import Gff3Transfer
+        from chromosomer.fileio import open_input
+        from chromosomer.fileio import open_output
+        from chromosomer.fileio import uncompressed_output
+        from chromosomer.transfer import VcfTransfer
         total_count = transferred_count = 0
+        transfer_progress = progress.start(
+            'transfer', total_bytes=input_size(args.annotation),
+            unit='features')
         if args.format == 'bed':
-            transferrer = BedTransfer(args.map)
-            with open(args.annotation) as input_file:
-                with bioformats.bed.Writer(args.output) as output_file:
+            transferrer = BedTransfer(args.map, args.policy)
+            with open_input(args.annotation) as input_file, \
+                    uncompressed_output(args.output) as output_filename:
+                with bioformats.bed.Writer(
+                        output_filename) as output_file:
                     for feature in bioformats.bed.Reader(
-                            input_file).records():
+                            transfer_progress.lines(
+                                input_file)).records():
                         total_count += 1
-                        transferred_feature = transferrer.feature(
+                        transfer_progress.update()
+                        transferred_features = transferrer.features(
                             feature)
-                        if transferred_feature is not None:
+                        if transferred_features:
                             transferred_count += 1
-                            output_file.write(transferred_feature)
+                        for i in transferred_features:
+                            output_file.write(i)
+        elif args.format == 'gff3' and args.hierarchy:
+            transferrer = Gff3Transfer(args.map, args.policy)
+            with open_input(args.annotation) as input_file:
+                with open_output(args.output) as output_file:
+                    total_count, transferred_count = transferrer.stream(
+                        transfer_progress.lines(input_file),
+                        output_file, transfer_progress)
         elif args.format == 'gff3':
-            transferrer = Gff3Transfer(args.map)
-            with open(args.annotation) as input_file:
-                with bioformats.gff3.Writer(args.output) as output_file:
+            transferrer = Gff3Transfer(args.map, args.policy)
+            with open_input(args.annotation) as input_file, \
+                    uncompressed_output(args.output) as output_filename:
+                with bioformats.gff3.Writer(
+                        output_filename) as output_file:
                     for feature in bioformats.gff3.Reader(
-                            input_file).records():
+                            transfer_progress.lines(
+                                input_file)).records():
                         total_count += 1
-                        transferred_feature = transferrer.feature(
+                        transfer_progress.update()
+                        transferred_features = transferrer.features(
                             feature)
-                        if transferred_feature is not None:
+                        if transferred_features:
                             transferred_count += 1
-                            output_file.write(transferred_feature)
+                        for i in transferred_features:
+                            output_file.write(i)
         elif args.format == 'vcf':
-            transferrer = VcfTransfer(args.map)
-            reader = vcf.Reader(open(args.annotation))
-            writer = vcf.Writer(open(args.output, 'w'), reader)
-            for variant in reader:
-                total_count += 1
-                transferred_feature = transferrer.feature(variant)
-                if transferred_feature is not None:
-                    transferred_count += 1
-                    writer.write_record(transferred_feature)
-            writer.close()
+            transferrer = VcfTransfer(args.map, args.policy)
+            with open_input(args.annotation) as input_file, \
+                    open_output(args.output) as output_file:
+                # the input file is already decompressed, so the
+                # reader must not detect compression by its name
+                reader = vcf.Reader(
+                    fsock=transfer_progress.lines(input_file),
+                    compressed=False)
+                writer = vcf.Writer(output_file, reader)
+                for variant in reader:
+                    total_count += 1
+                    transfer_progress.update()
+                    transferred_features = transferrer.features(
+                        variant)
+                    if transferred_features:
+                        transferred_count += 1
+                    for i in transferred_features:
+                        writer.write_record(i)
+        transfer_progress.finish()
 
         logger.info('%d features transferred', transferred_count)
         logger.info('%d features skipped',
                     total_count - transferred_count)
     elif args.command == 'fastalength':
+        from chromosomer.fileio import open_output
+        from chromosomer.fragment import SeqLengths
         seq_lengths = SeqLengths(args.fasta)
-        with open(args.output, 'wt') as length_file:
+        with open_output(args.output) as length_file:
             length_writer = csv.writer(length_file, delimiter='\t')
-            for header, length in seq_lengths.lengths().iteritems():
+            for header, length in seq_lengths.iterlengths():
                 length_writer.writerow((header, length, ))
     elif args.command == 'simulator':
-        fr_simulator = Simulator(args.fr_len, args.fr_num,
-                                 args.chr_num, args.unplaced,
-                                 args.gap_size)
+        from chromosomer.simulator import StreamSimulator
+        fr_simulator = StreamSimulator(
+            args.fr_len, args.fr_num, args.chr_num, args.unplaced,
+            args.gap_size, args.seed, args.length_distribution)
         map_file = os.path.join(args.output_dir,
                                 args.prefix + 'map.txt')
         chr_file = os.path.join(args.output_dir,
@@ -351,18 +878,68 @@ def chromosomer():
         fr_file = os.path.join(args.output_dir, args.prefix +
                                'fragments.fa')
         fr_simulator.write(map_file, fr_file, chr_file)
+        if args.alignments:
+            fr_simulator.write_alignments(
+                os.path.join(args.output_dir,
+                             args.prefix + 'alignments.txt'),
+                args.decoys, args.score_ratio)
+        if args.features > 0:
+            fr_simulator.write_features(
+                args.features,
+                *[os.path.join(args.output_dir,
+                               args.prefix + 'features.' + i)
+                  for i in ('bed', 'gff3', 'vcf')])
     elif args.command == 'fragmentmapstat':
-        fragment_map = Map()
-        fragment_map.read(args.map)
-        summary = fragment_map.summary()
-        template = '\t'.join(['{}'] * 4) + '\n'
-        with open(args.output, 'w') as output_file:
-            for chromosome in sorted(summary.keys()):
-                output_file.write(template.format(chromosome,
-                                                  *summary[chromosome]))
+        from chromosomer.fileio import open_output
+        from chromosomer.fragment import Map
+        if args.extended:
+            import json
+            from chromosomer.mapstat import MapStatistics
+            statistics = MapStatistics.file_statistics(args.map,
+                                                       args.bins)
+            with open_output(args.output) as output_file:
+                json.dump(statistics, output_file, indent=2,
+                          separators=(',', ': '), sort_keys=True)
+                output_file.write('\n')
+        else:
+            summary = Map.file_summary(args.map)
+            template = '\t'.join(['{}'] * 4) + '\n'
+            with open_output(args.output) as output_file:
+                for chromosome in sorted(summary.keys()):
+                    output_file.write(template.format(
+                        chromosome, *summary[chromosome]))
     elif args.command == 'fragmentmapbed':
-        fragment_map = Map()
-        fragment_map.read(args.map)
-        fragment_map.convert2bed(args.output)
+        from chromosomer.fragment import Map
+        Map.convert_file2bed(args.map, args.output)
     elif args.command == 'agp2map':
+        from chromosomer.fragment import agp2map
         agp2map(args.agp_file, args.output_file)
+    elif args.command == 'serve':
+        from chromosomer.server import TransferServer
+        maps = {}
+        for i in args.map:
+            if '=' in i:
+                name, filename = i.split('=', 1)
+            else:
+                filename = i
+                name = splitext(os.path.basename(i))[0]
+            maps[name] = filename
+        server = TransferServer(maps)
+        if args.socket is not None:
+            server.bind(args.socket)
+        else:
+            server.bind((args.host, args.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    elif args.command == 'bench':
+        from chromosomer.bench import Benchmark
+        benchmark = Benchmark(args.fragment_numbers,
+                              args.fragment_length, args.chromosomes,
+                              args.features, args.seed, args.work_dir)
+        benchmark.write(args.output)
+    elif args.command == 'batch':
+        from chromosomer.batch import Batch
+        batch = Batch.read(args.jobs, create_parser())
+        batch.run(run, args.workers)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import numpy as np
+from bioformats.blast import BlastTab
+from chromosomer.exception import AlignmentToMapError
+from chromosomer.fileio import open_input
+from chromosomer.timing import progress
+from itertools import compress
+from itertools import izip
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class ColumnarBlastTab(object):
+    """
+    The class implements reading BLAST tabular alignments in chunks
+    of columns stored in NumPy arrays and selecting the best
+    alignments of every query by vectorized operations.
+    """
+
+    column_number = 12
+
+    # numeric columns of alignments and their types
+    numeric_columns = (('identity', 2, np.float64),
+                       ('length', 3, np.int64),
+                       ('mismatches', 4, np.int64),
+                       ('gap_openings', 5, np.int64),
+                       ('q_start', 6, np.int64),
+                       ('q_end', 7, np.int64),
+                       ('s_start', 8, np.int64),
+                       ('s_end', 9, np.int64),
+                       ('e_value', 10, np.float64),
+                       ('bit_score', 11, np.float64))
+
+    def __init__(self, filename, chunk_size=1 << 22):
+        """
+        Create a ColumnarBlastTab object.
+
+        :param filename: a name of a file of BLAST tabular alignments
+        :param chunk_size: the approximate size of a chunk of the
+            file to be read at once in bytes
+        :type filename: str
+        :type chunk_size: int
+        """
+        self.__filename = filename
+        self.__chunk_size = chunk_size
+
+    def chunks(self):
+        """
+        Iterate through chunks of alignment columns.
+
+        :return: an iterator of tuples of the chunk size in bytes, a
+            list of query names, a list of subject names and a
+            dictionary of numeric column arrays
+        """
+        with open_input(self.__filename) as alignment_file:
+            while True:
+                text = alignment_file.read(self.__chunk_size)
+                if not text:
+                    break
+                # complete the last line of the chunk
+                text += alignment_file.readline()
+                size = len(text)
+                if text.startswith('#') or '\n#' in text:
+                    text = ''.join(i for i in text.splitlines(True)
+                                   if not i.startswith('#'))
+                tokens = text.split()
+                if len(tokens) % self.column_number:
+                    logger.error('the incorrect number of columns in '
+                                 '%s', self.__filename)
+                    raise AlignmentToMapError
+                columns = {}
+                row_number = len(tokens) // self.column_number
+                for name, i, column_type in self.numeric_columns:
+                    # numbers are parsed by NumPy at once
+                    column = np.fromstring(
+                        ' '.join(tokens[i::self.column_number]),
+                        sep=' ')
+                    if len(column) != row_number:
+                        logger.error('the incorrect %s value in %s',
+                                     name, self.__filename)
+                        raise AlignmentToMapError
+                    columns[name] = column.astype(column_type)
+                yield (size, tokens[0::self.column_number],
+                       tokens[1::self.column_number], columns)
+
+    @staticmethod
+    def __ids(names, name_ids):
+        """
+        Given a list of names, return an array of their identifiers
+        and the names which identifiers were assigned. New names get
+        identifiers in the order of their first occurrence.
+        """
+        known_number = len(name_ids)
+        ids = np.fromiter((name_ids.setdefault(i, len(name_ids))
+                           for i in names), np.int64, len(names))
+        new_positions = np.flatnonzero(ids >= known_number)
+        _, first = np.unique(ids[new_positions], return_index=True)
+        return ids, [names[i] for i in new_positions[first]]
+
+    @staticmethod
+    def __top_two(columns):
+        """
+        Given alignment columns, leave two alignments with the
+        greatest bit scores for every query; of alignments with equal
+        scores, the earlier ones are preferred.
+        """
+        order = np.lexsort((columns['index'], -columns['bit_score'],
+                            columns['query']))
+        queries = columns['query'][order]
+        positions = np.arange(len(order))
+        group_start = np.r_[True, queries[1:] != queries[:-1]]
+        rank = positions - np.maximum.accumulate(
+            np.where(group_start, positions, 0))
+        order = order[rank < 2]
+        return dict((k, v[order]) for k, v in columns.iteritems())
+
+    def best_alignments(self, fragment_lengths=None,
+                        min_fragment_length=None, centromeres=None,
+                        alignment_progress=None):
+        """
+        Return two alignments with the greatest bit scores for every
+        fragment in the same way as AlignmentToMap.blast does it.
+
+        :param fragment_lengths: a dictionary of fragment lengths
+        :param min_fragment_length: the minimal length of a fragment
+            which alignments are considered
+        :param centromeres: a dictionary of reference chromosome
+            centromere locations
+        :param alignment_progress: a progress object to report
+            processed alignments to
+        :type fragment_lengths: dict
+        :type min_fragment_length: int
+        :type centromeres: dict
+        :return: a dictionary which keys are fragment names and
+            values are lists of their best alignments
+        :rtype: dict
+        """
+        if alignment_progress is None:
+            alignment_progress = progress.start('fragmentmap',
+                                                unit='alignments')
+        query_ids = {}
+        query_names = []
+        subject_ids = {}
+        subject_names = []
+        # centromere positions of subjects, -1 if there is none
+        centromere_starts = np.empty(0, np.int64)
+        counts = np.empty(0, np.int64)
+        query_lengths = np.empty(0, np.int64)
+        candidates = None
+        index_shift = 0
+
+        for size, queries, subjects, columns in self.chunks():
+            alignment_progress.update(len(queries), size)
+            columns['index'] = np.arange(index_shift,
+                                         index_shift + len(queries))
+            index_shift += len(queries)
+            columns['query'], new_names = self.__ids(queries,
+                                                     query_ids)
+            query_names.extend(new_names)
+
+            if min_fragment_length is not None:
+                # skip alignments of fragments shorter than the
+                # threshold value
+                new_lengths = []
+                for name in new_names:
+                    try:
+                        new_lengths.append(fragment_lengths[name])
+                    except KeyError:
+                        logger.error('the fragment %s length is '
+                                     'missing', name)
+                        raise AlignmentToMapError
+                query_lengths = np.r_[query_lengths, new_lengths]
+                mask = query_lengths[columns['query']] >= \
+                    min_fragment_length
+                columns = dict((k, v[mask]) for k, v in
+                               columns.iteritems())
+                subjects = list(compress(subjects, mask))
+
+            columns['subject'], new_names = self.__ids(subjects,
+                                                       subject_ids)
+            subject_names.extend(new_names)
+            centromere_starts = np.r_[centromere_starts, [
+                centromeres[i].start if centromeres is not None and
+                i in centromeres else -1 for i in new_names]]
+
+            # consider the centromeres if required: 1 and 2 denote
+            # the chromosome arms and 0 denotes no centromere
+            subject_centromeres = centromere_starts[columns['subject']]
+            columns['arm'] = np.where(
+                subject_centromeres < 0, 0,
+                np.where(np.minimum(columns['s_start'],
+                                    columns['s_end']) <
+                         subject_centromeres, 1, 2))
+
+            counts = np.r_[counts, np.zeros(len(query_ids) - len(counts),
+                                            np.int64)]
+            counts += np.bincount(columns['query'],
+                                  minlength=len(query_ids))
+            if candidates is not None:
+                columns = dict((k, np.r_[candidates[k], v]) for k, v in
+                               columns.iteritems())
+            candidates = self.__top_two(columns)
+
+        alignment_progress.finish()
+        result = {}
+        if candidates is None:
+            return result
+
+        # two alignments of a fragment are kept in their original
+        # order, otherwise they are sorted by their bit scores
+        scores = np.where(counts[candidates['query']] > 2,
+                          -candidates['bit_score'], 0)
+        order = np.lexsort((candidates['index'], scores,
+                            candidates['query']))
+        candidates = dict((k, v[order].tolist()) for k, v in
+                          candidates.iteritems())
+        arm_suffixes = ('', '_1', '_2')
+        alignments = map(BlastTab.Alignment._make, izip(
+            [query_names[i] for i in candidates['query']],
+            [subject_names[i] + arm_suffixes[j] for i, j in
+             izip(candidates['subject'], candidates['arm'])],
+            *[candidates[name] for name, _, _ in self.numeric_columns]))
+        queries = candidates['query']
+        bounds = [i for i in xrange(1, len(queries))
+                  if queries[i] != queries[i - 1]]
+        for start, end in izip([0] + bounds, bounds + [len(queries)]):
+            result[alignments[start].query] = alignments[start:end]
+        return result
@@ -21,9 +21,65 @@ class MapError(Error):
     pass
 
 
+class UnsortedMapError(MapError):
+    """
+    The class describes an error that occurs if records of a fragment
+    map file are not sorted by chromosomes and their positions.
+    """
+    pass
+
+
 class AlignmentToMapError(Error):
     """
     The class describes an error that may occur while creating a
     fragment __map from alignments.
     """
     pass
+
+
+class SeqLengthsError(Error):
+    """
+    The class describes an error that may occur while obtaining
+    lengths of sequences from a FASTA file.
+    """
+    pass
+
+
+class TransferError(Error):
+    """
+    The class describes an error that may occur while transferring
+    features from fragments to assembled chromosomes.
+    """
+    pass
+
+
+class TransferServerError(Error):
+    """
+    The class describes an error that may occur while requesting a
+    transfer server.
+    """
+    pass
+
+
+class AlignmentCacheError(Error):
+    """
+    The class describes an error that may occur while obtaining
+    alignments using an alignment cache.
+    """
+    pass
+
+
+class CompressionError(Error):
+    """
+    The class describes an error that may occur while reading or
+    writing compressed files.
+    """
+    pass
+
+
+class BatchError(Error):
+    """
+    The class describes an error that may occur while running a batch
+    of Chromosomer routines.
+    """
+    pass
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import bz2
+import gzip
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from chromosomer.exception import CompressionError
+from contextlib import contextmanager
+from distutils.spawn import find_executable
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+# magic numbers of compressed files
+magic_numbers = (('\x1f\x8b', 'gzip'),
+                 ('BZh', 'bzip2'),
+                 ('\xfd7zXZ\x00', 'xz'))
+
+# extensions of compressed output files
+extensions = {'.gz': 'gzip', '.bgz': 'bgzf', '.bz2': 'bzip2',
+              '.xz': 'xz'}
+
+# external programs to decompress and compress files in the order of
+# preference; '{}' is replaced by the number of threads
+decompressors = {
+    'gzip': (('pigz', '-dc', '-p', '{}'), ('gzip', '-dc')),
+    'bgzf': (('bgzip', '-dc', '-@', '{}'), ('pigz', '-dc', '-p', '{}'),
+             ('gzip', '-dc')),
+    'bzip2': (('lbzip2', '-dc', '-n', '{}'), ('pbzip2', '-dc', '-p{}'),
+              ('bzip2', '-dc')),
+    'xz': (('xz', '-dc', '-T', '{}'), )
+}
+compressors = {
+    'gzip': (('pigz', '-c', '-p', '{}'), ('gzip', '-c')),
+    'bgzf': (('bgzip', '-c', '-@', '{}'), ),
+    'bzip2': (('lbzip2', '-c', '-n', '{}'), ('pbzip2', '-c', '-p{}'),
+              ('bzip2', '-c')),
+    'xz': (('xz', '-c', '-T', '{}'), )
+}
+
+
+def detect_compression(filename):
+    """
+    Given a name of a file, detect its compression by the magic
+    number.
+
+    :param filename: a file name
+    :type filename: str
+    :return: the compression format, 'gzip', 'bgzf', 'bzip2' or 'xz',
+        or None if the file is not compressed
+    :rtype: str
+    """
+    with open(filename, 'rb') as input_file:
+        header = input_file.read(16)
+    for magic, compression in magic_numbers:
+        if header.startswith(magic):
+            # a BGZF file is a gzip file with the extra 'BC' field
+            if compression == 'gzip' and len(header) == 16 and \
+                    ord(header[3]) & 4 and header[12:14] == 'BC':
+                return 'bgzf'
+            return compression
+    return None
+
+
+def output_compression(filename):
+    """
+    Given a name of an output file, return its compression format
+    determined by the file extension.
+
+    :param filename: a file name
+    :type filename: str
+    :return: the compression format, 'gzip', 'bgzf', 'bzip2' or 'xz',
+        or None if the file is not to be compressed
+    :rtype: str
+    """
+    return extensions.get(os.path.splitext(filename)[1].lower())
+
+
+def _program(programs, threads):
+    """
+    Given options of programs, return options of the first one
+    which executable is found.
+    """
+    for options in programs:
+        if find_executable(options[0]) is not None:
+            return [i.format(threads) for i in options]
+    return None
+
+
+def _lzma():
+    """
+    Return the lzma module if it is available.
+    """
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            logger.error('neither xz nor the lzma module found')
+            raise CompressionError
+    return lzma
+
+
+class _ProcessInput(object):
+    """
+    The class implements a file object reading the output of a
+    decompressing program.
+    """
+
+    def __init__(self, options, filename):
+        self.name = filename
+        self.__options = options
+        self.__process = subprocess.Popen(options + [filename],
+                                          stdout=subprocess.PIPE,
+                                          bufsize=1 << 20)
+        self.__file = self.__process.stdout
+        self.__completed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for line in self.__file:
+            yield line
+        self.__completed = True
+
+    def read(self, size=-1):
+        data = self.__file.read(size)
+        if not data:
+            self.__completed = True
+        return data
+
+    def readline(self):
+        line = self.__file.readline()
+        if not line:
+            self.__completed = True
+        return line
+
+    def readlines(self):
+        return list(self)
+
+    def close(self):
+        if self.__file.closed:
+            return
+        self.__file.close()
+        if not self.__completed and self.__process.poll() is None:
+            # the file was not read to its end
+            self.__process.terminate()
+            self.__process.wait()
+        elif self.__process.wait():
+            logger.error('%s failed on %s', self.__options[0],
+                         self.name)
+            raise CompressionError
+
+
+class _ProcessOutput(object):
+    """
+    The class implements a file object writing to the input of a
+    compressing program.
+    """
+
+    def __init__(self, options, filename):
+        self.name = filename
+        self.__options = options
+        self.__output = open(filename, 'wb')
+        self.__process = subprocess.Popen(options,
+                                          stdin=subprocess.PIPE,
+                                          stdout=self.__output,
+                                          bufsize=1 << 20)
+        self.__file = self.__process.stdin
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        self.__file.write(data)
+
+    def writelines(self, lines):
+        self.__file.writelines(lines)
+
+    def flush(self):
+        self.__file.flush()
+
+    def close(self):
+        if self.__file.closed:
+            return
+        self.__file.close()
+        return_code = self.__process.wait()
+        self.__output.close()
+        if return_code:
+            logger.error('%s failed on %s', self.__options[0],
+                         self.name)
+            raise CompressionError
+
+
+def open_input(filename, threads=None):
+    """
+    Open a file for reading; if the file is compressed, it is
+    decompressed by an external program, multi-threaded if possible,
+    or by the Python standard library.
+
+    :param filename: a file name
+    :param threads: the number of decompression threads, the number
+        of CPUs by default
+    :type filename: str
+    :type threads: int
+    :return: a file object
+    """
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename)
+    options = _program(decompressors[compression],
+                       threads or multiprocessing.cpu_count())
+    if options is not None:
+        logger.debug('%s decompressed by %s', filename, options[0])
+        return _ProcessInput(options, filename)
+    if compression in ('gzip', 'bgzf'):
+        return gzip.open(filename)
+    elif compression == 'bzip2':
+        return bz2.BZ2File(filename)
+    return _lzma().LZMAFile(filename)
+
+
+def open_output(filename, threads=None):
+    """
+    Open a file for writing; if the file name has the extension of a
+    compressed file (.gz, .bgz, .bz2 or .xz), the written data are
+    compressed by an external program, multi-threaded if possible,
+    or by the Python standard library.
+
+    :param filename: a file name
+    :param threads: the number of compression threads, the number of
+        CPUs by default
+    :type filename: str
+    :type threads: int
+    :return: a file object
+    """
+    compression = output_compression(filename)
+    if compression is None:
+        return open(filename, 'w')
+    options = _program(compressors[compression],
+                       threads or multiprocessing.cpu_count())
+    if options is not None:
+        logger.debug('%s compressed by %s', filename, options[0])
+        return _ProcessOutput(options, filename)
+    if compression == 'bgzf':
+        logger.warning('bgzip not found, %s is compressed by gzip',
+                       filename)
+    if compression in ('gzip', 'bgzf'):
+        return gzip.open(filename, 'wb')
+    elif compression == 'bzip2':
+        return bz2.BZ2File(filename, 'w')
+    return _lzma().LZMAFile(filename, 'w')
+
+
+@contextmanager
+def uncompressed_output(filename, threads=None):
+    """
+    Given a name of an output file, return a name of a file to write
+    uncompressed data to, for writers that open files by their names.
+    If the output file is to be compressed, the data are written to a
+    temporary file which is compressed to the output file on exit.
+
+    :param filename: an output file name
+    :param threads: the number of compression threads, the number of
+        CPUs by default
+    :type filename: str
+    :type threads: int
+    :return: a file name to write uncompressed data to
+    """
+    if output_compression(filename) is None:
+        yield filename
+        return
+    handle, temp_filename = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filename)))
+    os.close(handle)
+    try:
+        yield temp_filename
+        with open(temp_filename, 'rb') as input_file:
+            with open_output(filename, threads) as output_file:
+                shutil.copyfileobj(input_file, output_file, 1 << 20)
+    finally:
+        os.unlink(temp_filename)
@@ -4,16 +4,30 @@
 # Copyright (C) 2015-2016 by Gaik Tamazian
 # gaik (dot) tamazian (at) gmail (dot) com
 
+import bisect
+import hashlib
 import logging
-import pyfaidx
+import os
 import random
 import string
+import threading
 from bioformats.blast import BlastTab
+from chromosomer.alignment import add_best_alignment
 from chromosomer.exception import MapError
 from chromosomer.exception import AlignmentToMapError
+from chromosomer.exception import SeqLengthsError
+from chromosomer.exception import UnsortedMapError
+from chromosomer.fileio import detect_compression
+from chromosomer.fileio import open_input
+from chromosomer.fileio import open_output
+from chromosomer.fileio import output_compression
+from chromosomer.fileio import uncompressed_output
+from chromosomer.timing import profiler
+from chromosomer.timing import progress
 from bioformats.fasta import RandomSequence
 from bioformats.fasta import Writer
 from collections import defaultdict
+from itertools import chain
 from itertools import izip
 from collections import namedtuple
 from operator import attrgetter
@@ -30,18 +44,22 @@ class Map(object):
     """
 
     numeric_values = (1, 2, 3, 6, 7)
-    
+
     record_names = ('fr_name', 'fr_length', 'fr_start', 'fr_end',
                     'fr_strand', 'ref_chr', 'ref_start', 'ref_end')
 
     Record = namedtuple('Record', record_names)
 
+    complement = string.maketrans('ATCGatcgNnXx', 'TAGCtagcNnXx')
+
     def __init__(self):
         """
         Initializes a Map object.
         """
         self.__fragments = defaultdict(list)
         self.__block_adding = False
+        self.__fragment_index = None
+        self.__interval_index = None
 
     def add_record(self, new_record):
         """
@@ -51,26 +69,123 @@ class Map(object):
         :type new_record: Map.Record
         """
         self.__fragments[new_record.ref_chr].append(new_record)
+        self.__fragment_index = None
+
+    def __build_fragment_index(self):
+        """
+        Build the index of fragment names and the index of placed
+        regions of every fragment.
+        """
+        fragment_index = {}
+        interval_index = defaultdict(list)
+        for chromosome in self.chromosomes():
+            for record in self.fragments(chromosome):
+                # if a fragment is present in the map several times,
+                # its first record is returned
+                fragment_index.setdefault(record.fr_name, record)
+                interval_index[record.fr_name].append(record)
+        for fragment, records in interval_index.iteritems():
+            records.sort(key=attrgetter('fr_start'))
+            interval_index[fragment] = ([i.fr_start for i in records],
+                                        records)
+        self.__interval_index = interval_index
+        self.__fragment_index = fragment_index
+
+    def find_fragment(self, fragment):
+        """
+        Given a fragment name, return its record from the fragment
+        map. If the specified fragment is absent in the map, return
+        None. The index of fragment names is built on the first call.
+
+        :param fragment: a fragment name
+        :type fragment: str
+        :return: a fragment map record corresponding to the specified
+            fragment
+        :rtype: Map.Record
+        """
+        if self.__fragment_index is None:
+            self.__build_fragment_index()
+        return self.__fragment_index.get(fragment)
+
+    def fragment_records(self, fragment, start, end):
+        """
+        Given a region of a fragment, return the fragment map records
+        which placed regions of the fragment overlap it. A region of
+        zero length is considered as a point which may be located at
+        the end of a placed region.
+
+        :param fragment: a fragment name
+        :param start: the region start (zero-based)
+        :param end: the region end (zero-based, exclusive)
+        :type fragment: str
+        :type start: int
+        :type end: int
+        :return: a list of fragment map records sorted by their
+            positions on the fragment
+        :rtype: list
+        """
+        if self.__fragment_index is None:
+            self.__build_fragment_index()
+        if fragment not in self.__interval_index:
+            return []
+        starts, records = self.__interval_index[fragment]
+        i = max(bisect.bisect_right(starts, start) - 1, 0)
+        result = []
+        if start == end:
+            while i < len(records) and records[i].fr_start <= start:
+                if start <= records[i].fr_end:
+                    return [records[i]]
+                i += 1
+            return result
+        while i < len(records) and records[i].fr_start < end:
+            if records[i].fr_end > start:
+                result.append(records[i])
+            i += 1
+        return result
 
     def read(self, filename):
         """
         Read a fragment map from the specified file. The file records
-        are added to the records in the map.
+        are added to the records in the map. The file may be
+        compressed by gzip, bzip2 or xz.
 
         :param filename: a name of a file to read a fragment map from
         :type: str
         """
-        lineno = 0
         i = 0
-        with open(filename) as input_map_file:
-            for line in input_map_file:
-                lineno += 1
+        with profiler.phase('map load'):
+            for new_record in Map.iter_file(filename):
+                self.add_record(new_record)
+                i += 1
+        logger.debug('map of %d fragments was successfully read from '
+                     '%s', i, filename)
+
+    @staticmethod
+    def iter_file(filename, require_sorted=False):
+        """
+        Iterate through records of a fragment map file without
+        reading the whole map. The file may be compressed.
+
+        If it is required, the records are checked to be sorted by
+        chromosomes and their start positions as Map.write outputs
+        them; UnsortedMapError is raised when an unsorted record is
+        met.
+
+        :param filename: a name of a fragment map file
+        :param require_sorted: require the records to be sorted or not
+        :type filename: str
+        :type require_sorted: bool
+        :return: an iterator to the fragment map records
+        """
+        previous_key = None
+        with open_input(filename) as input_map_file:
+            for lineno, line in enumerate(input_map_file, 1):
                 line_parts = line.split('\t', 8)
                 if len(line_parts) < 8:
                     logger.error('line %d: the incorrect number of '
                                  'columns', lineno)
                     raise MapError
-                for i in self.numeric_values:
+                for i in Map.numeric_values:
                     try:
                         line_parts[i] = int(line_parts[i])
                     except ValueError:
@@ -78,10 +193,14 @@ class Map(object):
                                      'value %s', lineno, line_parts[i])
                         raise MapError
                 new_record = Map.Record(*line_parts)
-                self.add_record(new_record)
-                i += 1
-        logger.debug('map of %d fragments was successfully read from '
-                     '%s', i, filename)
+                if require_sorted:
+                    key = (new_record.ref_chr, new_record.ref_start)
+                    if previous_key is not None and key < previous_key:
+                        logger.debug('line %d: the map file %s is not '
+                                     'sorted', lineno, filename)
+                        raise UnsortedMapError
+                    previous_key = key
+                yield new_record
 
     @property
     def records(self):
@@ -123,14 +242,16 @@ class Map(object):
 
     def write(self, filename):
         """
-        Write the fragment map to the specified file.
+        Write the fragment map to the specified file. The file is
+        compressed if its name ends with .gz, .bgz, .bz2 or .xz.
 
         :param filename: a name of a file to write the fragment map to
         :type filename: str
         """
         template = '\t'.join(['{}'] * len(self.record_names)) + '\n'
         i = 0
-        with open(filename, 'w') as output_map_file:
+        with profiler.phase('write'), \
+                open_output(filename) as output_map_file:
             for chromosome in self.chromosomes():
                 for fragment in self.fragments(chromosome):
                     new_line = template.format(*fragment)
@@ -140,60 +261,207 @@ class Map(object):
                      'to %s', i, filename)
 
     def assemble(self, fragment_filename, output_filename,
-                 save_soft_mask=False):
+                 save_soft_mask=False, incremental=False,
+                 fasta_cache=None):
         """
         Assemble chromosome sequences from fragments.
 
+        If the incremental mode is on, a hash of every chromosome's
+        map records and fragment sequences is stored next to the
+        output file (with the '.hashes' suffix) and the chromosomes
+        which hashes did not change since the previous run are copied
+        from the existing output file instead of being assembled
+        again.
+
         :param fragment_filename: a name of a FASTA file of fragment
             sequences
         :param output_filename: a name of the output FASTA file of
             the assembled chromosomes
         :param save_soft_mask: save soft-masking in sequences being
             assembled or not
+        :param incremental: reuse unchanged chromosomes from the
+            previous output file or not
+        :param fasta_cache: a cache to get the FASTA file of fragment
+            sequences from; by default, the file is opened and closed
+            by the method
         :type fragment_filename: str
         :type output_filename: str
         :type save_soft_mask: bool
+        :type incremental: bool
+        :type fasta_cache: FastaCache
         """
         logger.debug('assembling chromosomes...')
         logger.debug('FASTA of fragments: %s', fragment_filename)
         logger.debug('FASTA of chromosomes: %s', output_filename)
         logger.debug('saving soft mask: %r', save_soft_mask)
+        logger.debug('incremental mode: %r', incremental)
+        if incremental and output_compression(output_filename):
+            logger.error('the incremental mode requires an '
+                         'uncompressed output file')
+            raise MapError
         num_fragments = 0
         num_chromosomes = 0
+        num_reused = 0
 
-        fragment_fasta = pyfaidx.Fasta(fragment_filename)
-        complement = string.maketrans('ATCGatcgNnXx', 'TAGCtagcNnXx')
-        with Writer(output_filename) as chromosome_writer:
+        import pyfaidx
+        with profiler.phase('index build'):
+            if fasta_cache is not None:
+                fragment_fasta = fasta_cache.get(fragment_filename)
+            else:
+                with fasta_index_lock(fragment_filename):
+                    fragment_fasta = pyfaidx.Fasta(fragment_filename)
+
+        hash_filename = output_filename + '.hashes'
+        new_hashes = {}
+        previous_hashes = {}
+        previous_fasta = None
+        writer_filename = output_filename
+        if incremental:
+            fragment_index = read_fasta_index(fragment_filename +
+                                              '.fai')
+            with open(fragment_filename, 'rb') as fragment_file:
+                for chromosome in self.chromosomes():
+                    new_hashes[chromosome] = self.__chromosome_hash(
+                        chromosome, fragment_file, fragment_index,
+                        save_soft_mask)
+            if os.path.isfile(hash_filename) and \
+                    os.path.isfile(output_filename):
+                with open(hash_filename) as hash_file:
+                    for line in hash_file:
+                        chromosome, chr_hash = line.rstrip().split('\t')
+                        previous_hashes[chromosome] = chr_hash
+                if os.path.isfile(output_filename + '.fai'):
+                    os.unlink(output_filename + '.fai')
+                previous_fasta = pyfaidx.Fasta(output_filename)
+            # the output file may be the source of reused chromosomes,
+            # so the new sequences are written to a temporary file
+            writer_filename = output_filename + '.tmp'
+
+        assembly_progress = progress.start(
+            'assemble', total=sum(len(i) for i in
+                                  self.__fragments.itervalues()),
+            unit='map records')
+        with uncompressed_output(writer_filename) as plain_filename, \
+                Writer(plain_filename) as chromosome_writer:
             for chromosome in self.chromosomes():
-                seq = []
-                for record in self.fragments(chromosome):
-                    if record.fr_name == 'GAP':
-                        record_seq = 'N' * (record.fr_end -
-                                            record.fr_start)
-                    else:
-                        if record.fr_name not in fragment_fasta:
-                            logger.error('the fragment %s sequence '
-                                         'missing', record.fr_name)
-                            raise MapError
-                        record_seq = fragment_fasta[record.fr_name][
-                            record.fr_start:record.fr_end].seq
-                        # convert the sequence to non-unicode
-                        record_seq = str(record_seq)
-                        if not save_soft_mask:
-                            record_seq = record_seq.upper()
-                        # if the fragment orientation is reverse, then
-                        # the reverse complement of the fragment
-                        # sequence is written
-                        if record.fr_strand == '-':
-                            record_seq = record_seq[::-1].translate(
-                                complement)
-                    seq.append(record_seq)
-                    num_fragments += 1
-                chromosome_writer.write(chromosome, ''.join(seq))
+                if previous_fasta is not None and \
+                        chromosome in previous_fasta and \
+                        previous_hashes.get(chromosome) == \
+                        new_hashes[chromosome]:
+                    # the chromosome is unchanged, so its sequence is
+                    # taken from the previous output file
+                    with profiler.phase('sequence fetch'):
+                        seq = str(previous_fasta[chromosome][:].seq)
+                    num_reused += 1
+                    assembly_progress.update(
+                        len(self.__fragments[chromosome]), len(seq))
+                else:
+                    seq = []
+                    for record in self.fragments(chromosome):
+                        seq.append(self.__record_seq(
+                            record, fragment_fasta, save_soft_mask))
+                        num_fragments += 1
+                        assembly_progress.update(1, len(seq[-1]))
+                    seq = ''.join(seq)
+                with profiler.phase('write'):
+                    chromosome_writer.write(chromosome, seq)
                 num_chromosomes += 1
+        assembly_progress.finish()
+        if fasta_cache is None:
+            fragment_fasta.close()
+
+        if incremental:
+            if previous_fasta is not None:
+                previous_fasta.close()
+            os.rename(writer_filename, output_filename)
+            if os.path.isfile(output_filename + '.fai'):
+                os.unlink(output_filename + '.fai')
+            with open(hash_filename, 'w') as hash_file:
+                for chromosome in sorted(new_hashes.keys()):
+                    hash_file.write('{}\t{}\n'.format(
+                        chromosome, new_hashes[chromosome]))
 
         logger.debug('%d fragments assembled to %d chromosomes',
                      num_fragments, num_chromosomes)
+        if incremental:
+            logger.debug('%d unchanged chromosomes reused from %s',
+                         num_reused, output_filename)
+
+    @staticmethod
+    def __record_seq(record, fragment_fasta, save_soft_mask):
+        """
+        Given a fragment map record, return its sequence in the
+        orientation it has on the assembled chromosome.
+
+        :param record: a fragment map record
+        :param fragment_fasta: a FASTA file of fragment sequences
+        :param save_soft_mask: save soft-masking in the sequence or
+            not
+        :type record: Map.Record
+        :type fragment_fasta: pyfaidx.Fasta
+        :type save_soft_mask: bool
+        :return: the record sequence
+        :rtype: str
+        """
+        if record.fr_name == 'GAP':
+            return 'N' * (record.fr_end - record.fr_start)
+
+        if record.fr_name not in fragment_fasta:
+            logger.error('the fragment %s sequence missing',
+                         record.fr_name)
+            raise MapError
+        with profiler.phase('sequence fetch'):
+            record_seq = fragment_fasta[record.fr_name][
+                record.fr_start:record.fr_end].seq
+            # convert the sequence to non-unicode
+            record_seq = str(record_seq)
+            if not save_soft_mask:
+                record_seq = record_seq.upper()
+        # if the fragment orientation is reverse, then the reverse
+        # complement of the fragment sequence is written
+        if record.fr_strand == '-':
+            with profiler.phase('reverse complement'):
+                record_seq = record_seq[::-1].translate(Map.complement)
+        return record_seq
+
+    def __chromosome_hash(self, chromosome, fragment_file,
+                          fragment_index, save_soft_mask):
+        """
+        Return a hash of the chromosome records and the sequences of
+        its fragments.
+
+        :param chromosome: a chromosome name
+        :param fragment_file: a FASTA file of fragment sequences
+            opened in the binary mode
+        :param fragment_index: a FASTA index of the fragment file as
+            returned by read_fasta_index
+        :param save_soft_mask: save soft-masking in the sequence or
+            not
+        :type chromosome: str
+        :type fragment_file: file
+        :type fragment_index: dict
+        :type save_soft_mask: bool
+        :return: a hexadecimal MD5 digest
+        :rtype: str
+        """
+        template = '\t'.join(['{}'] * len(self.record_names)) + '\n'
+        chr_hash = hashlib.md5('{!r}\n'.format(save_soft_mask))
+        for record in self.fragments(chromosome):
+            chr_hash.update(template.format(*record))
+            if record.fr_name == 'GAP':
+                continue
+            if record.fr_name not in fragment_index:
+                logger.error('the fragment %s sequence missing',
+                             record.fr_name)
+                raise MapError
+            # add the raw fragment sequence from the FASTA file
+            entry = fragment_index[record.fr_name]
+            full_lines, remainder = divmod(entry.length,
+                                           entry.line_bases)
+            fragment_file.seek(entry.offset)
+            chr_hash.update(fragment_file.read(
+                full_lines * entry.line_width + remainder))
+        return chr_hash.hexdigest()
 
     def shrink_gaps(self, gap_size):
         """
@@ -234,6 +502,7 @@ class Map(object):
                         fragment[6] -= shifts[i]
                         fragment[7] -= shifts[i]
                     self.__fragments[chrom][i] = Map.Record(*fragment)
+        self.__fragment_index = None
 
         logger.debug('in total, gaps shrinked by %d bp', total_shift)
 
@@ -245,17 +514,45 @@ class Map(object):
             chromosome
         :rtype: dict
         """
-        summary = {}
-        for chromosome in self.chromosomes():
-            gaps = 0
-            chr_fragments = list(self.fragments(chromosome))
-            for fragment in chr_fragments:
-                if fragment.fr_name == 'GAP':
-                    gaps += fragment.fr_length
-            chr_length = chr_fragments[-1].ref_end
-            fr_num = len(chr_fragments)
-            summary[chromosome] = (fr_num, gaps, chr_length)
-        return summary
+        return Map.__summarize(chain.from_iterable(
+            self.__fragments.itervalues()))
+
+    @staticmethod
+    def file_summary(filename):
+        """
+        Return a summary on the fragment map in the specified file.
+        The file is read in a single pass without loading the map.
+
+        :param filename: a name of a fragment map file
+        :type filename: str
+        :return: a dictionary of tuples each describing one assembled
+            chromosome
+        :rtype: dict
+        """
+        return Map.__summarize(Map.iter_file(filename))
+
+    @staticmethod
+    def __summarize(records):
+        """
+        Given fragment map records in any order, return the summary
+        on them. The length of a chromosome is the end of its record
+        with the greatest start position; of records with equal start
+        positions, the last one is taken.
+        """
+        fr_nums = defaultdict(int)
+        gaps = defaultdict(int)
+        last_records = {}
+        for record in records:
+            chromosome = record.ref_chr
+            fr_nums[chromosome] += 1
+            if record.fr_name == 'GAP':
+                gaps[chromosome] += record.fr_length
+            if chromosome not in last_records or \
+                    record.ref_start >= \
+                    last_records[chromosome].ref_start:
+                last_records[chromosome] = record
+        return dict((i, (fr_nums[i], gaps[i], j.ref_end)) for i, j in
+                    last_records.iteritems())
 
     def convert2bed(self, bed_filename):
         """
@@ -266,22 +563,55 @@ class Map(object):
             fragment map
         :type bed_filename: str
         """
+        with open_output(bed_filename) as bed_file:
+            Map.__write_bed(chain.from_iterable(
+                self.fragments(i) for i in self.chromosomes()),
+                bed_file)
+
+    @staticmethod
+    def convert_file2bed(map_filename, bed_filename):
+        """
+        Given a name of a fragment map file, convert it to the BED
+        format. If the map file is sorted as Map.write outputs it,
+        its records are converted while they are read; otherwise, the
+        whole map is loaded and converted.
+
+        :param map_filename: a name of a fragment map file
+        :param bed_filename: a name of the output BED file of the
+            fragment map
+        :type map_filename: str
+        :type bed_filename: str
+        """
+        try:
+            with open_output(bed_filename) as bed_file:
+                Map.__write_bed(Map.iter_file(map_filename, True),
+                                bed_file)
+        except UnsortedMapError:
+            logger.debug('the map %s is loaded to be sorted',
+                         map_filename)
+            fragment_map = Map()
+            fragment_map.read(map_filename)
+            fragment_map.convert2bed(bed_filename)
+
+    @staticmethod
+    def __write_bed(records, bed_file):
+        """
+        Given fragment map records, write them to a BED file.
+        """
         template = '\t'.join(['{}'] * (len(Map.record_names) + 1)) + \
-                   '\n'
-        with open(bed_filename, 'w') as bed_file:
-            for chromosome in sorted(self.chromosomes()):
-                for fragment in self.fragments(chromosome):
-                    bed_file.write(template.format(
-                        fragment.ref_chr,
-                        fragment.ref_start,
-                        fragment.ref_end,
-                        fragment.fr_name,
-                        1000,
-                        fragment.fr_strand,
-                        fragment.fr_start,
-                        fragment.fr_end,
-                        fragment.fr_length
-                    ))
+            '\n'
+        for fragment in records:
+            bed_file.write(template.format(
+                fragment.ref_chr,
+                fragment.ref_start,
+                fragment.ref_end,
+                fragment.fr_name,
+                1000,
+                fragment.fr_strand,
+                fragment.fr_start,
+                fragment.fr_end,
+                fragment.fr_length
+            ))
 
 
 class AlignmentToMap(object):
@@ -324,7 +654,24 @@ class AlignmentToMap(object):
         self.__unplaced = []
         self.__fragment_map = Map()
 
-    def blast(self, blast_alignments, bitscore_ratio_threshold):
+    def short_fragments(self):
+        """
+        Return names of fragments which are shorter than the minimal
+        fragment length. Alignments of these fragments are skipped
+        by the blast method, so they may be filtered out before
+        parsing.
+
+        :return: a set of fragment names
+        :rtype: set
+        """
+        if self.__min_fragment_length is None:
+            return set()
+        return set(fragment for fragment, length in
+                   self.__fragment_lengths.iteritems()
+                   if length < self.__min_fragment_length)
+
+    def blast(self, blast_alignments, bitscore_ratio_threshold,
+              alignment_progress=None):
         """
         Create a fragment map from BLAST blast_alignments between
         fragments and reference chromosomes.
@@ -333,6 +680,8 @@ class AlignmentToMap(object):
         :param bitscore_ratio_threshold: the minimal ratio of two
             greatest fragment alignment bit scores to consider the
             fragment placed to a reference
+        :param alignment_progress: a progress object to report
+            processed alignments to; if omitted, a new one is started
         :type blast_alignments: BlastTab
         :type bitscore_ratio_threshold: float
         :return: a tuple containing the fragment map constructed from
@@ -344,9 +693,86 @@ class AlignmentToMap(object):
         self.__unlocalized = []
         self.__unplaced = []
 
+        if alignment_progress is None:
+            alignment_progress = progress.start('fragmentmap',
+                                                unit='alignments')
+        with profiler.phase('BLAST parse'):
+            best_alignments = self.__best_alignments(
+                blast_alignments, alignment_progress)
+        alignment_progress.finish()
+
+        with profiler.phase('anchor selection'):
+            self.__select_anchors(best_alignments,
+                                  bitscore_ratio_threshold)
+            self.__anchor_fragments()
+
+        return (self.__fragment_map, self.__unlocalized,
+                self.__unplaced)
+
+    def blast_columnar(self, filename, bitscore_ratio_threshold,
+                       chunk_size=1 << 22, alignment_progress=None):
+        """
+        Create a fragment map from BLAST alignments between fragments
+        and reference chromosomes read from a file of BLAST tabular
+        output. The alignments are processed in chunks of columns by
+        vectorized operations, the result is the same as the one of
+        the blast method.
+
+        :param filename: a name of a file of BLAST tabular alignments
+        :param bitscore_ratio_threshold: the minimal ratio of two
+            greatest fragment alignment bit scores to consider the
+            fragment placed to a reference
+        :param chunk_size: the approximate size of a chunk of the
+            alignment file in bytes
+        :param alignment_progress: a progress object to report
+            processed alignments to
+        :type filename: str
+        :type bitscore_ratio_threshold: float
+        :type chunk_size: int
+        :return: a tuple containing the fragment map constructed from
+            the provided BLAST alignments, the list of unlocalized
+            fragments and a list of unplaced fragments
+        :rtype: tuple
+        """
+        from chromosomer.columnar import ColumnarBlastTab
+        self.__anchors = {}
+        self.__unlocalized = []
+        self.__unplaced = []
+
+        with profiler.phase('BLAST parse'):
+            best_alignments = ColumnarBlastTab(
+                filename, chunk_size).best_alignments(
+                self.__fragment_lengths, self.__min_fragment_length,
+                self.__centromeres, alignment_progress)
+
+        with profiler.phase('anchor selection'):
+            self.__select_anchors(best_alignments,
+                                  bitscore_ratio_threshold)
+            self.__anchor_fragments()
+
+        return (self.__fragment_map, self.__unlocalized,
+                self.__unplaced)
+
+    def __best_alignments(self, blast_alignments, alignment_progress):
+        """
+        Given BLAST alignments, return two alignments with the
+        greatest bit scores for every fragment. The alignments of
+        fragments shorter than the minimal fragment length are
+        skipped and the centromeres are considered if they were
+        specified.
+
+        :param blast_alignments: BLAST alignments
+        :param alignment_progress: a progress object to report
+            processed alignments to
+        :type blast_alignments: BlastTab
+        :return: a dictionary which keys are fragment names and
+            values are lists of their best alignments
+        :rtype: dict
+        """
         temp_anchors = defaultdict(list)
 
         for alignment in blast_alignments.alignments():
+            alignment_progress.update()
             if self.__min_fragment_length is not None:
                 # check if the fragment length is equal or greater
                 # than the threshold value
@@ -376,20 +802,28 @@ class AlignmentToMap(object):
                 new_alignment[1] += arm_prefix
                 alignment = BlastTab.Alignment(*new_alignment)
 
-            temp_anchors[alignment.query].append(alignment)
-            # check if there is more than 2 alignments for the
-            # fragment; if there is, then leave two fragments with
-            # the greatest bit-score values
-            if len(temp_anchors[alignment.query]) > 2:
-                temp_anchors[alignment.query] = sorted(
-                    temp_anchors[alignment.query],
-                    key=attrgetter('bit_score'),
-                    reverse=True
-                )
-                temp_anchors[alignment.query] = temp_anchors[
-                    alignment.query][0:2]
+            # leave two alignments with the greatest bit-score values
+            # for the fragment
+            temp_anchors[alignment.query] = add_best_alignment(
+                temp_anchors[alignment.query], alignment)
+
+        return temp_anchors
+
+    def __select_anchors(self, best_alignments,
+                         bitscore_ratio_threshold):
+        """
+        Given the best alignments of fragments, determine anchors of
+        placed fragments, unlocalized and unplaced fragments.
 
-        for fragment, alignments in temp_anchors.iteritems():
+        :param best_alignments: a dictionary which keys are fragment
+            names and values are lists of their best alignments
+        :param bitscore_ratio_threshold: the minimal ratio of two
+            greatest fragment alignment bit scores to consider the
+            fragment placed to a reference
+        :type best_alignments: dict
+        :type bitscore_ratio_threshold: float
+        """
+        for fragment, alignments in best_alignments.iteritems():
             if len(alignments) > 1:
                 # check if the ratio of the alignment bit scores is
                 # greater than the required threshold to consider a
@@ -449,11 +883,6 @@ class AlignmentToMap(object):
         logger.info('%d unplaced fragments of total length %d bp',
                     len(self.__unplaced), total_unplaced)
 
-        self.__anchor_fragments()
-
-        return (self.__fragment_map, self.__unlocalized,
-                self.__unplaced)
-
     def __anchor_fragments(self):
         """
         Build a fragment map from anchors.
@@ -662,10 +1091,12 @@ class SeqLengths(object):
     def __init__(self, filename):
         """
         Create a SeqLengths object to handle sequence lengths of the
-        specified FASTA file.
+        specified FASTA file. The lengths are taken from the FASTA
+        index (.fai) file which is created if it is missing; the
+        index file itself may be specified instead of the FASTA file.
 
         :param filename: a name of a FASTA file with sequences which
-            lengths are to be derived
+            lengths are to be derived or a name of its index file
         :type filename: str
         """
         self.__filename = filename
@@ -673,36 +1104,169 @@ class SeqLengths(object):
 
     def lengths(self):
         """
-        Return a dictionary of sequence lengths.
+        Return a dictionary of sequence lengths. The lengths are read
+        once and cached in the object.
 
         :return: a dictionary which keys are sequence names and
             values are their lengths
         :rtype: dict
         """
-        total_length = 0
         if not self.__lengths:
-            reader = pyfaidx.Fasta(self.__filename)
-            for seq in reader.keys():
-                self.__lengths[seq] = len(reader[seq])
-                total_length += len(reader[seq])
+            total_length = 0
+            for seq, length in self.iterlengths():
+                self.__lengths[seq] = length
+                total_length += length
 
-        logger.debug('%d sequences analyzed with the total length of '
-                     '%d bp', len(self.__lengths), total_length)
+            logger.debug('%d sequences analyzed with the total length '
+                         'of %d bp', len(self.__lengths), total_length)
 
         return self.__lengths
 
+    def iterlengths(self):
+        """
+        Return an iterator to sequence names and lengths in the order
+        the sequences are given in the FASTA file. The FASTA index
+        file is read directly if it exists; otherwise, it is created
+        by a single scan of the FASTA file.
+
+        :return: an iterator to tuples of sequence names and lengths
+        """
+        if self.__filename.endswith('.fai'):
+            index_file = open(self.__filename)
+        else:
+            index_filename = self.__filename + '.fai'
+            # the index is opened under the lock, so it is not
+            # changed by concurrent users of the FASTA file
+            with fasta_index_lock(self.__filename):
+                if os.path.isfile(index_filename) and \
+                        os.path.getmtime(index_filename) < \
+                        os.path.getmtime(self.__filename):
+                    logger.debug('%s is outdated', index_filename)
+                    os.unlink(index_filename)
+                if not os.path.isfile(index_filename):
+                    index_fasta(self.__filename, index_filename)
+                index_file = open(index_filename)
+
+        with index_file:
+            for line in index_file:
+                seq, length = line.split('\t', 2)[:2]
+                yield seq, int(length)
+
+
+def index_fasta(fasta_filename, fai_filename, buffer_size=1 << 22):
+    """
+    Given a name of a FASTA file, create its index (.fai) file in the
+    samtools format. The FASTA file is scanned once with large
+    buffered reads, so the routine requires constant memory. The
+    FASTA file must be uncompressed. The index is written to a
+    temporary file which is renamed to the index file name, so
+    readers never get an incomplete index.
+
+    :param fasta_filename: a name of a FASTA file
+    :param fai_filename: a name of the index file to be created
+    :param buffer_size: the size of the read buffer in bytes
+    :type fasta_filename: str
+    :type fai_filename: str
+    :type buffer_size: int
+    """
+    if detect_compression(fasta_filename) is not None:
+        logger.error('%s is compressed; FASTA files of sequences must '
+                     'be uncompressed', fasta_filename)
+        raise SeqLengthsError
+
+    template = '\t'.join(['{}'] * 5) + '\n'
+
+    def index_line(record):
+        if record[4] is None:
+            # the sequence is empty
+            record[3:5] = 0, 0
+        return template.format(*record)
+
+    offset = 0
+    lineno = 0
+    record = None
+    short_line = False
+    temp_filename = '{}.{}.tmp'.format(fai_filename, os.getpid())
+    try:
+        with open(fasta_filename, 'rb', buffer_size) as fasta_file:
+            with open(temp_filename, 'w') as fai_file:
+                for line in fasta_file:
+                    lineno += 1
+                    offset += len(line)
+                    if line.startswith('>'):
+                        if record is not None:
+                            fai_file.write(index_line(record))
+                        # the record contains the sequence name, its
+                        # length, offset, line bases and line width
+                        record = [line[1:].split(None, 1)[0], 0,
+                                  offset, None, None]
+                        short_line = False
+                        continue
+                    if record is None:
+                        logger.error('line %d: the sequence header '
+                                     'is missing', lineno)
+                        raise SeqLengthsError
+                    line_bases = len(line.rstrip('\r\n'))
+                    if record[4] is None:
+                        record[3] = line_bases
+                        record[4] = len(line)
+                    elif short_line or line_bases > record[3]:
+                        logger.error('line %d: the sequence %s has '
+                                     'lines of different lengths',
+                                     lineno, record[0])
+                        raise SeqLengthsError
+                    short_line = line_bases < record[3]
+                    record[1] += line_bases
+                if record is not None:
+                    fai_file.write(index_line(record))
+    except SeqLengthsError:
+        os.unlink(temp_filename)
+        # the index of the previous file contents is removed too
+        if os.path.isfile(fai_filename):
+            os.unlink(fai_filename)
+        raise
+    except Exception:
+        if os.path.isfile(temp_filename):
+            os.unlink(temp_filename)
+        raise
+    os.rename(temp_filename, fai_filename)
+
+    logger.debug('FASTA index %s created', fai_filename)
+
+
+# locks of FASTA files which indexes are being created or read, one
+# per absolute file path
+_index_locks = {}
+_index_locks_lock = threading.Lock()
+
+
+def fasta_index_lock(filename):
+    """
+    Given a name of a FASTA file, return the lock that serializes
+    creating and reading its index within the process.
+
+    :param filename: a name of a FASTA file
+    :type filename: str
+    :return: the lock of the FASTA file index
+    :rtype: threading.Lock
+    """
+    with _index_locks_lock:
+        return _index_locks.setdefault(os.path.abspath(filename),
+                                       threading.Lock())
+
 
 def agp2map(agp_filename, map_filename):
     """
     Given a name of an AGP file, convert it to the fragment map format.
+    The files may be compressed.
 
     :param agp_filename: a name of an AGP file
     :param map_filename: a name of an output fragment map file
     :type agp_filename: str
     :type map_filename: str
     """
-    with open(agp_filename) as agp_file:
-        with open(map_filename, 'w') as map_file:
+    with open_input(agp_filename) as agp_file:
+        with open_output(map_filename) as map_file:
             for line in agp_file:
                 if line.startswith('#'):
                     continue
@@ -717,3 +1281,104 @@ def agp2map(agp_filename, map_filename):
                     output = (line[5], frag_len, 0, frag_len, line[8],
                               line[0], int(line[1]) - 1, int(line[2]))
                 map_file.write('\t'.join(map(str, output)) + '\n')
+
+
+FastaIndexRecord = namedtuple('FastaIndexRecord', ('length', 'offset',
+                                                   'line_bases',
+                                                   'line_width'))
+
+
+def read_fasta_index(fai_filename):
+    """
+    Given a name of a FASTA index (.fai) file, read its records to a
+    dictionary.
+
+    :param fai_filename: a name of a FASTA index file
+    :type fai_filename: str
+    :return: a dictionary which keys are sequence names and values
+        are FastaIndexRecord tuples
+    :rtype: dict
+    """
+    result = {}
+    with open(fai_filename) as fai_file:
+        for line in fai_file:
+            line_parts = line.rstrip().split('\t')
+            result[line_parts[0]] = FastaIndexRecord(
+                *map(int, line_parts[1:5]))
+    return result
+
+
+class FastaCache(object):
+    """
+    The class implements a cache of opened FASTA files, so routines
+    launched in the same process share indexes and handles of the
+    files. A cached file is identified by its path, modification time
+    and size, so a changed file is opened again. The cache may be
+    used by several threads.
+    """
+
+    def __init__(self):
+        """
+        Create an empty FastaCache object.
+        """
+        self.__files = {}
+        self.__lock = threading.Lock()
+
+    def get(self, filename):
+        """
+        Return the opened FASTA file; its index is created if it is
+        missing.
+
+        :param filename: a name of a FASTA file
+        :type filename: str
+        :return: the opened FASTA file
+        :rtype: pyfaidx.Fasta
+        """
+        import pyfaidx
+        path = os.path.abspath(filename)
+        file_stat = os.stat(path)
+        identity = (file_stat.st_mtime, file_stat.st_size)
+        with self.__lock:
+            fasta = self.__lookup(path, identity)
+        if fasta is not None:
+            return fasta
+
+        # the file is opened under the lock of its index, so other
+        # files are available meanwhile, users of the same file wait
+        # for it to be opened once and the index is not changed by
+        # concurrent users of the file
+        with fasta_index_lock(path):
+            with self.__lock:
+                fasta = self.__lookup(path, identity)
+            if fasta is not None:
+                return fasta
+            fasta = pyfaidx.Fasta(path)
+            with self.__lock:
+                # a changed file is not closed, since it may be still
+                # used
+                self.__files[path] = (identity, fasta)
+            return fasta
+
+    def __lookup(self, path, identity):
+        """
+        Return the cached FASTA file if it was not changed after it
+        was opened, otherwise return None. The method is called under
+        the cache lock.
+        """
+        if path in self.__files and self.__files[path][0] == identity:
+            return self.__files[path][1]
+        return None
+
+    def clear(self):
+        """
+        Close all cached FASTA files and remove them from the cache.
+        """
+        with self.__lock:
+            for _, fasta in self.__files.itervalues():
+                fasta.close()
+            self.__files = {}
+
+
+# the cache of FASTA files of fragment sequences shared by routines
+# of a batch
+fasta_cache = FastaCache()
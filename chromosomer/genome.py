@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import bisect
+import logging
+import pyfaidx
+from chromosomer.exception import MapError
+from chromosomer.fragment import Map
+from collections import OrderedDict
+from operator import attrgetter
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class AssembledChromosome(object):
+    """
+    The class represents a chromosome of an assembled genome in the
+    way pyfaidx represents a FASTA record: it has a name and a length
+    and its slices are sequences.
+    """
+
+    def __init__(self, genome, name):
+        """
+        Create an AssembledChromosome object.
+
+        :param genome: the assembled genome of the chromosome
+        :param name: the chromosome name
+        :type genome: AssembledGenome
+        :type name: str
+        """
+        self.__genome = genome
+        self.name = name
+
+    def __len__(self):
+        return self.__genome.length(self.name)
+
+    def __getitem__(self, key):
+        """
+        Return a sequence of a chromosome region.
+
+        :param key: a zero-based position or a slice of positions
+        :type key: int or slice
+        :return: the region sequence
+        :rtype: pyfaidx.Sequence
+        """
+        length = len(self)
+        if isinstance(key, slice):
+            start, end, step = key.indices(length)
+            if step != 1:
+                logger.error('slices with steps are not supported')
+                raise MapError
+        else:
+            start = key + length if key < 0 else key
+            if not 0 <= start < length:
+                raise IndexError('position out of range')
+            end = start + 1
+        return pyfaidx.Sequence(self.name,
+                                self.__genome.fetch(self.name, start,
+                                                    end),
+                                start=start + 1, end=end)
+
+    def __str__(self):
+        return self.__genome.fetch(self.name, 0, len(self))
+
+    def __repr__(self):
+        return 'AssembledChromosome("{}")'.format(self.name)
+
+
+class AssembledGenome(object):
+    """
+    The class implements random access to sequences of chromosomes
+    assembled from fragments according to a fragment map without
+    writing them to a FASTA file. Sequences of fragments are read in
+    blocks and the recently used blocks are cached.
+    """
+
+    def __init__(self, fragment_map, fragment_filename,
+                 save_soft_mask=False, block_size=65536,
+                 cache_size=256):
+        """
+        Create an AssembledGenome object.
+
+        :param fragment_map: a fragment map or a name of a file to
+            read it from
+        :param fragment_filename: a name of a FASTA file of fragment
+            sequences
+        :param save_soft_mask: save soft-masking in sequences or not
+        :param block_size: the size of fragment sequence blocks
+        :param cache_size: the number of cached fragment sequence
+            blocks
+        :type fragment_map: Map or str
+        :type fragment_filename: str
+        :type save_soft_mask: bool
+        :type block_size: int
+        :type cache_size: int
+        """
+        if not isinstance(fragment_map, Map):
+            map_filename = fragment_map
+            fragment_map = Map()
+            fragment_map.read(map_filename)
+        self.__fasta = pyfaidx.Fasta(fragment_filename)
+        self.__save_soft_mask = save_soft_mask
+        self.__block_size = block_size
+        self.__cache_size = cache_size
+        self.__blocks = OrderedDict()
+
+        # records of every chromosome sorted by their start positions
+        self.__index = OrderedDict()
+        for chromosome in fragment_map.chromosomes():
+            records = sorted(fragment_map.records[chromosome],
+                             key=attrgetter('ref_start'))
+            self.__index[chromosome] = ([i.ref_start for i in records],
+                                        records,
+                                        max(i.ref_end for i in records))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the FASTA file of fragment sequences.
+        """
+        self.__fasta.close()
+
+    def keys(self):
+        """
+        Return names of the assembled chromosomes.
+
+        :return: a list of chromosome names
+        :rtype: list
+        """
+        return self.__index.keys()
+
+    def __contains__(self, chromosome):
+        return chromosome in self.__index
+
+    def __getitem__(self, chromosome):
+        if chromosome not in self.__index:
+            raise KeyError(chromosome)
+        return AssembledChromosome(self, chromosome)
+
+    def __iter__(self):
+        for chromosome in self.__index:
+            yield AssembledChromosome(self, chromosome)
+
+    def __len__(self):
+        return len(self.__index)
+
+    def length(self, chromosome):
+        """
+        Return the length of an assembled chromosome.
+
+        :param chromosome: a chromosome name
+        :type chromosome: str
+        :return: the chromosome length
+        :rtype: int
+        """
+        if chromosome not in self.__index:
+            logger.error('%s missing in the fragment map', chromosome)
+            raise MapError
+        return self.__index[chromosome][2]
+
+    def fetch(self, chromosome, start, end):
+        """
+        Return the sequence of a region of an assembled chromosome.
+        The region parts which are not covered by fragments are
+        filled with N's.
+
+        :param chromosome: a chromosome name
+        :param start: the region start (zero-based)
+        :param end: the region end (zero-based, exclusive)
+        :type chromosome: str
+        :type start: int
+        :type end: int
+        :return: the region sequence
+        :rtype: str
+        """
+        starts, records, length = self.__index.get(chromosome,
+                                                   (None, None, None))
+        if starts is None:
+            logger.error('%s missing in the fragment map', chromosome)
+            raise MapError
+        start = max(start, 0)
+        end = min(end, length)
+        if start >= end:
+            return ''
+
+        seq = []
+        pos = start
+        i = max(bisect.bisect_right(starts, start) - 1, 0)
+        while i < len(records) and records[i].ref_start < end:
+            record = records[i]
+            if record.ref_end > pos:
+                if record.ref_start > pos:
+                    seq.append('N' * (record.ref_start - pos))
+                    pos = record.ref_start
+                record_end = min(end, record.ref_end)
+                seq.append(self.__record_seq(record, pos, record_end))
+                pos = record_end
+            i += 1
+        if pos < end:
+            seq.append('N' * (end - pos))
+        return ''.join(seq)
+
+    def __record_seq(self, record, start, end):
+        """
+        Return the sequence of a region of a fragment map record
+        given by its positions on the chromosome.
+        """
+        if record.fr_name == 'GAP':
+            return 'N' * (end - start)
+        if record.fr_strand == '+':
+            shift = record.fr_start - record.ref_start
+            return self.__fragment_seq(record.fr_name, start + shift,
+                                       end + shift)
+        shift = record.fr_start + record.ref_end
+        seq = self.__fragment_seq(record.fr_name, shift - end,
+                                  shift - start)
+        return seq[::-1].translate(Map.complement)
+
+    def __fragment_seq(self, fragment, start, end):
+        """
+        Return the sequence of a fragment region using the cached
+        blocks of the fragment sequence.
+        """
+        seq = []
+        first_block = start // self.__block_size
+        last_block = (end - 1) // self.__block_size
+        for block in xrange(first_block, last_block + 1):
+            block_seq = self.__block(fragment, block)
+            block_start = block * self.__block_size
+            seq.append(block_seq[max(start - block_start, 0):
+                                 end - block_start])
+        return ''.join(seq)
+
+    def __block(self, fragment, block):
+        """
+        Return a block of a fragment sequence.
+        """
+        key = (fragment, block)
+        if key in self.__blocks:
+            block_seq = self.__blocks.pop(key)
+        else:
+            if fragment not in self.__fasta:
+                logger.error('the fragment %s sequence missing',
+                             fragment)
+                raise MapError
+            block_start = block * self.__block_size
+            block_seq = str(self.__fasta[fragment][
+                block_start:block_start + self.__block_size].seq)
+            if not self.__save_soft_mask:
+                block_seq = block_seq.upper()
+            if len(self.__blocks) >= self.__cache_size:
+                self.__blocks.popitem(last=False)
+        self.__blocks[key] = block_seq
+        return block_seq
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import numpy as np
+from chromosomer.fragment import Map
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def grouped_n50(lengths, groups, group_number):
+    """
+    Given lengths of sequences split into groups, return N50 and L50
+    values of every group.
+
+    :param lengths: an array of sequence lengths
+    :param groups: an array of group numbers of the sequences
+    :param group_number: the number of groups
+    :type lengths: numpy.ndarray
+    :type groups: numpy.ndarray
+    :type group_number: int
+    :return: a tuple of arrays of N50 and L50 values; they are zero
+        for groups without sequences
+    :rtype: tuple
+    """
+    n50_values = np.zeros(group_number, np.int64)
+    l50_values = np.zeros(group_number, np.int64)
+    if not len(lengths):
+        return n50_values, l50_values
+    # the sequences are sorted by groups and decreasing lengths
+    order = np.lexsort((-lengths, groups))
+    lengths = lengths[order]
+    groups = groups[order]
+    group_starts = np.searchsorted(groups, np.arange(group_number))
+    totals = np.bincount(groups, lengths, group_number)
+    cumulative_lengths = np.cumsum(lengths)
+    # cumulative lengths within the groups
+    cumulative_lengths -= (cumulative_lengths - lengths)[
+        group_starts[groups]]
+    reached = np.flatnonzero(cumulative_lengths * 2 >= totals[groups])
+    reached_groups, first = np.unique(groups[reached],
+                                      return_index=True)
+    positions = reached[first]
+    n50_values[reached_groups] = lengths[positions]
+    l50_values[reached_groups] = positions - \
+        group_starts[reached_groups] + 1
+    return n50_values, l50_values
+
+
+class MapStatistics(object):
+    """
+    The class implements computing extended statistics on fragment
+    map records in a single pass. The records are processed in chunks
+    by vectorized operations, so only per-chromosome counters and
+    lengths of placed fragments are kept in memory.
+    """
+
+    # upper bounds of fragment length histogram bins
+    default_bins = (1000, 10000, 100000, 1000000, 10000000)
+
+    # per-chromosome counters
+    counters = ('fragments', 'plus_fragments', 'minus_fragments',
+                'placed_length', 'gaps', 'gap_length')
+
+    def __init__(self, bins=None, chunk_size=1 << 16):
+        """
+        Create a MapStatistics object.
+
+        :param bins: upper bounds of fragment length histogram bins;
+            the last bin contains fragments longer than the last bound
+        :param chunk_size: the number of records processed at once
+        :type bins: tuple
+        :type chunk_size: int
+        """
+        self.__edges = np.array([0] + sorted(bins or self.default_bins)
+                                + [np.iinfo(np.int64).max], np.int64)
+        self.__chunk_size = chunk_size
+        self.__chromosome_ids = {}
+        self.__counters = dict((i, np.zeros(0, np.int64)) for i in
+                               self.counters)
+        self.__lengths = np.zeros(0, np.int64)
+        self.__placed_lengths = []
+        self.__placed_chromosomes = []
+        self.__histogram = np.zeros(len(self.__edges) - 1, np.int64)
+        self.__histogram_length = np.zeros(len(self.__edges) - 1,
+                                           np.int64)
+
+    def add(self, records):
+        """
+        Add fragment map records to the statistics.
+
+        :param records: an iterable of fragment map records in any
+            order
+        """
+        chunk = ([], [], [], [])
+        for record in records:
+            chunk[0].append(self.__chromosome_ids.setdefault(
+                record.ref_chr, len(self.__chromosome_ids)))
+            chunk[1].append(record.ref_end - record.ref_start)
+            chunk[2].append(record.ref_end)
+            chunk[3].append(0 if record.fr_name == 'GAP' else
+                            1 if record.fr_strand == '+' else -1)
+            if len(chunk[0]) == self.__chunk_size:
+                self.__add_chunk(*chunk)
+                chunk = ([], [], [], [])
+        if chunk[0]:
+            self.__add_chunk(*chunk)
+
+    def __add_chunk(self, chromosomes, lengths, ends, kinds):
+        """
+        Aggregate a chunk of records given by their columns.
+        """
+        chromosomes = np.array(chromosomes, np.int64)
+        lengths = np.array(lengths, np.int64)
+        kinds = np.array(kinds, np.int8)
+        number = len(self.__chromosome_ids)
+        for name, counter in self.__counters.iteritems():
+            self.__counters[name] = np.r_[
+                counter, np.zeros(number - len(counter), np.int64)]
+        self.__lengths = np.r_[self.__lengths, np.zeros(
+            number - len(self.__lengths), np.int64)]
+
+        fragments = kinds != 0
+        values = {
+            'fragments': (fragments, None),
+            'plus_fragments': (kinds == 1, None),
+            'minus_fragments': (kinds == -1, None),
+            'placed_length': (fragments, lengths),
+            'gaps': (~fragments, None),
+            'gap_length': (~fragments, lengths)
+        }
+        for name, (mask, weights) in values.iteritems():
+            self.__counters[name] += np.bincount(
+                chromosomes[mask], weights[mask] if weights is not None
+                else None, number).astype(np.int64)
+        np.maximum.at(self.__lengths, chromosomes,
+                      np.array(ends, np.int64))
+
+        placed_lengths = lengths[fragments]
+        self.__placed_lengths.append(placed_lengths)
+        self.__placed_chromosomes.append(chromosomes[fragments])
+        bins = np.searchsorted(self.__edges, placed_lengths,
+                               'right') - 1
+        self.__histogram += np.bincount(
+            bins, minlength=len(self.__histogram))
+        self.__histogram_length += np.bincount(
+            bins, placed_lengths,
+            len(self.__histogram)).astype(np.int64)
+
+    def result(self):
+        """
+        Return the statistics.
+
+        :return: a dictionary of total values and values for every
+            chromosome
+        :rtype: dict
+        """
+        number = len(self.__chromosome_ids)
+        placed_lengths = np.concatenate(
+            [np.zeros(0, np.int64)] + self.__placed_lengths)
+        placed_chromosomes = np.concatenate(
+            [np.zeros(0, np.int64)] + self.__placed_chromosomes)
+        total = dict((i, int(j.sum())) for i, j in
+                     self.__counters.iteritems())
+        total['length'] = int(self.__lengths.sum())
+        total['chromosomes'] = number
+        n50_values, l50_values = grouped_n50(
+            placed_lengths, np.zeros(len(placed_lengths), np.int64), 1)
+        total['n50'], total['l50'] = int(n50_values[0]), \
+            int(l50_values[0])
+
+        n50_values, l50_values = grouped_n50(
+            placed_lengths, placed_chromosomes, number)
+        chromosomes = {}
+        for chromosome, i in self.__chromosome_ids.iteritems():
+            chromosomes[chromosome] = dict(
+                (name, int(counter[i])) for name, counter in
+                self.__counters.iteritems())
+            chromosomes[chromosome]['length'] = int(self.__lengths[i])
+            chromosomes[chromosome]['n50'] = int(n50_values[i])
+            chromosomes[chromosome]['l50'] = int(l50_values[i])
+        for values in [total] + chromosomes.values():
+            self.__add_fractions(values)
+
+        upper_bounds = self.__edges[1:].tolist()
+        upper_bounds[-1] = None
+        total['histogram'] = [
+            {'from': int(i), 'to': j, 'fragments': int(k),
+             'length': int(l)} for i, j, k, l in
+            zip(self.__edges[:-1], upper_bounds, self.__histogram,
+                self.__histogram_length)]
+        return {'total': total, 'chromosomes': chromosomes}
+
+    @staticmethod
+    def __add_fractions(values):
+        """
+        Add percentages of placed and gap lengths and the fraction of
+        fragments on the plus strand to a dictionary of statistics.
+        """
+        length = values['length']
+        values['placed_percent'] = 100.0 * values['placed_length'] / \
+            length if length else 0.0
+        values['gap_percent'] = 100.0 * values['gap_length'] / \
+            length if length else 0.0
+        values['plus_fraction'] = float(values['plus_fragments']) / \
+            values['fragments'] if values['fragments'] else 0.0
+
+    @staticmethod
+    def file_statistics(filename, bins=None):
+        """
+        Return statistics on the fragment map in the specified file.
+        The file is read in a single pass without loading the map.
+
+        :param filename: a name of a fragment map file
+        :param bins: upper bounds of fragment length histogram bins
+        :type filename: str
+        :type bins: tuple
+        :return: a dictionary of total values and values for every
+            chromosome
+        :rtype: dict
+        """
+        statistics = MapStatistics(bins)
+        statistics.add(Map.iter_file(filename))
+        return statistics.result()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import bioformats.bed
+import bioformats.gff3
+import json
+import logging
+import os
+import socket
+import SocketServer
+import stat
+from chromosomer.exception import TransferServerError
+from chromosomer.fragment import Map
+from chromosomer.transfer import BedTransfer
+from chromosomer.transfer import Gff3Transfer
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    """
+    The class processes requests of a single client connection: each
+    request and response is a JSON object on a separate line.
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            response = self.server.transfer_server.respond(line)
+            self.wfile.write(json.dumps(response) + '\n')
+
+
+class _TcpServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(SocketServer.ThreadingMixIn,
+                  SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class TransferServer(object):
+    """
+    The class implements a server that reads fragment maps once and
+    answers requests to transfer coordinates and features from
+    fragments to assembled chromosomes.
+
+    A request is a JSON object on a single line with the 'command'
+    field which is one of the following:
+
+    - 'maps': return names of the loaded maps;
+    - 'coordinates': transfer 'positions', a list of fragment names
+      and zero-based positions on them, using the map 'map';
+    - 'features': transfer 'features', a list of BED or GFF3 records
+      (as lists of their fields) of the 'format' format, using the map
+      'map'.
+
+    A response is a JSON object with the 'result' field, where
+    untransferred coordinates and features are null, or with the
+    'error' field describing the error.
+    """
+
+    transferrers = {'bed': (BedTransfer, bioformats.bed.Record),
+                    'gff3': (Gff3Transfer, bioformats.gff3.Record)}
+
+    def __init__(self, maps):
+        """
+        Create a TransferServer object.
+
+        :param maps: a dictionary which keys are map names and values
+            are names of files to read the maps from
+        :type maps: dict
+        """
+        self.__transferrers = {}
+        for name, filename in maps.iteritems():
+            fragment_map = Map()
+            fragment_map.read(filename)
+            self.__transferrers[name] = dict(
+                (i, j[0](fragment_map)) for i, j in
+                self.transferrers.iteritems())
+            logger.info('map %s loaded from %s', name, filename)
+        self.__server = None
+
+    def bind(self, address):
+        """
+        Bind the server to the specified address.
+
+        :param address: a tuple of a host and a port to serve on or a
+            name of a Unix socket
+        :type address: tuple or str
+        :return: the address the server was bound to
+        """
+        if isinstance(address, tuple):
+            self.__server = _TcpServer(address, _RequestHandler)
+        else:
+            # remove a socket left by a previous server
+            if os.path.exists(address) and \
+                    stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+            self.__server = _UnixServer(address, _RequestHandler)
+        self.__server.transfer_server = self
+        return self.__server.server_address
+
+    def serve_forever(self):
+        """
+        Process requests until the server is shut down.
+        """
+        logger.info('serving on %s', self.__server.server_address)
+        self.__server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stop the server and close its socket.
+        """
+        self.__server.shutdown()
+        self.__server.server_close()
+        if isinstance(self.__server, _UnixServer):
+            os.unlink(self.__server.server_address)
+
+    def respond(self, line):
+        """
+        Given a request line, return the response to it.
+
+        :param line: a JSON object of a request
+        :type line: str
+        :return: the response object
+        :rtype: dict
+        """
+        try:
+            request = json.loads(line)
+            command = request['command']
+            if command == 'maps':
+                return {'result': sorted(self.__transferrers.keys())}
+            transferrers = self.__transferrers[request['map']]
+            if command == 'coordinates':
+                transferrer = transferrers['bed']
+                return {'result': [transferrer.coordinate(*i) for i in
+                                   request['positions']]}
+            elif command == 'features':
+                transferrer = transferrers[request['format']]
+                record_type = self.transferrers[request['format']][1]
+                result = []
+                for fields in request['features']:
+                    feature = transferrer.feature(record_type(*fields))
+                    result.append(list(feature) if feature is not None
+                                  else None)
+                return {'result': result}
+            return {'error': 'unknown command {}'.format(command)}
+        except ValueError:
+            return {'error': 'incorrect request'}
+        except KeyError as e:
+            return {'error': 'unknown value {}'.format(e)}
+        except TypeError:
+            return {'error': 'incorrect record'}
+
+
+class TransferClient(object):
+    """
+    The class implements a client to a transfer server.
+    """
+
+    def __init__(self, address):
+        """
+        Create a TransferClient object connected to a server.
+
+        :param address: a tuple of a host and a port of the server or
+            a name of its Unix socket
+        :type address: tuple or str
+        """
+        if isinstance(address, tuple):
+            self.__socket = socket.create_connection(address)
+        else:
+            self.__socket = socket.socket(socket.AF_UNIX,
+                                          socket.SOCK_STREAM)
+            self.__socket.connect(address)
+        self.__input = self.__socket.makefile('rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the connection to the server.
+        """
+        self.__input.close()
+        self.__socket.close()
+
+    def __request(self, request):
+        """
+        Send a request to the server and return its result.
+
+        :param request: a request object
+        :type request: dict
+        :return: the request result
+        """
+        self.__socket.sendall(json.dumps(request) + '\n')
+        line = self.__input.readline()
+        if not line:
+            logger.error('the server closed the connection')
+            raise TransferServerError
+        response = json.loads(line)
+        if 'error' in response:
+            logger.error('the server error: %s', response['error'])
+            raise TransferServerError
+        return response['result']
+
+    def maps(self):
+        """
+        Return names of the maps loaded by the server.
+
+        :return: a list of map names
+        :rtype: list
+        """
+        return self.__request({'command': 'maps'})
+
+    def coordinates(self, map_name, positions):
+        """
+        Transfer positions on fragments to the assembled chromosomes.
+
+        :param map_name: a name of a map loaded by the server
+        :param positions: a list of tuples of fragment names and
+            zero-based positions on them
+        :type map_name: str
+        :type positions: list
+        :return: a list of tuples of chromosome names and positions
+            on them; untransferred positions are None
+        :rtype: list
+        """
+        return [tuple(i) if i is not None else None for i in
+                self.__request({'command': 'coordinates',
+                                'map': map_name,
+                                'positions': positions})]
+
+    def features(self, map_name, feature_format, features):
+        """
+        Transfer features from fragments to the assembled chromosomes.
+
+        :param map_name: a name of a map loaded by the server
+        :param feature_format: the features format, 'bed' or 'gff3'
+        :param features: a list of BED or GFF3 records
+        :type map_name: str
+        :type feature_format: str
+        :type features: list
+        :return: a list of transferred records; untransferred
+            features are None
+        :rtype: list
+        """
+        record_type = TransferServer.transferrers[feature_format][1]
+        return [record_type(*i) if i is not None else None for i in
+                self.__request({'command': 'features',
+                                'map': map_name,
+                                'format': feature_format,
+                                'features': [list(i) for i in
+                                             features]})]
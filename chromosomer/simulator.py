@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import random
+import string
+from array import array
+from chromosomer.fragment import Map
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def write_fasta_record(fasta_file, name, chunks, line_width=60):
+    """
+    Write a FASTA record which sequence is given by chunks to the
+    specified file, so that the whole sequence is never kept in
+    memory.
+
+    :param fasta_file: an output FASTA file
+    :param name: a sequence name
+    :param chunks: an iterable of sequence chunks
+    :param line_width: the number of bases in a sequence line
+    :type fasta_file: file
+    :type name: str
+    :type line_width: int
+    """
+    fasta_file.write('>{}\n'.format(name))
+    leftover = ''
+    for chunk in chunks:
+        chunk = leftover + chunk
+        full_length = len(chunk) - len(chunk) % line_width
+        for i in xrange(0, full_length, line_width):
+            fasta_file.write(chunk[i:i + line_width])
+            fasta_file.write('\n')
+        leftover = chunk[full_length:]
+    if leftover:
+        fasta_file.write(leftover)
+        fasta_file.write('\n')
+
+
+class StreamSimulator(object):
+    """
+    The class describes routines to simulate genome fragments and
+    chromosomes that are composed from them. Unlike Simulator, it
+    keeps only fragment lengths and positions in memory: fragment
+    sequences are generated from the random seed when they are
+    written, so genomes of any size can be simulated.
+    """
+
+    length_distributions = ('fixed', 'uniform', 'exponential')
+
+    hex2nucl = string.maketrans('0123456789abcdef', 'ACGT' * 4)
+
+    def __init__(self, fragment_length, fragment_number,
+                 chromosome_number, unplaced_number, gap_size,
+                 seed=None, length_distribution='fixed',
+                 chunk_size=1 << 20):
+        """
+        Create a streaming fragment simulator object.
+
+        :param fragment_length: the mean length of a fragment
+        :param fragment_number: the number of fragments constituting
+            the chromosomes
+        :param chromosome_number: the number of chromosomes
+        :param unplaced_number: the number of fragments not included
+            in the chromosomes
+        :param gap_size: the length of gaps between fragments in
+            chromosomes
+        :param seed: the random seed; if it is omitted, a random one
+            is chosen
+        :param length_distribution: the distribution of fragment
+            lengths: 'fixed', 'uniform' (from a half to one and a
+            half of the mean length) or 'exponential'
+        :param chunk_size: the size of sequence chunks the fragments
+            are generated and written by
+        :type fragment_length: int
+        :type fragment_number: int
+        :type chromosome_number: int
+        :type unplaced_number: int
+        :type gap_size: int
+        :type seed: int
+        :type length_distribution: str
+        :type chunk_size: int
+        """
+        if length_distribution not in self.length_distributions:
+            raise ValueError('incorrect fragment length distribution '
+                             '{}'.format(length_distribution))
+
+        self.__fragment_length = fragment_length
+        self.__fragment_number = fragment_number
+        self.__chromosome_number = chromosome_number
+        self.__unplaced_number = unplaced_number or 0
+        self.__gap_size = gap_size
+        self.__length_distribution = length_distribution
+        self.__chunk_size = chunk_size
+
+        if seed is None:
+            seed = random.SystemRandom().randrange(1 << 32)
+        self.__seed = seed
+        logger.debug('simulation seed: %d', self.__seed)
+
+        rng = random.Random(self.__seed)
+        total_number = self.__fragment_number + self.__unplaced_number
+        self.__lengths = array('l', (self.__random_length(rng)
+                                     for _ in xrange(total_number)))
+
+        # assign fragments to chromosomes and choose their strands
+        self.__chr_fragments = [array('l') for _ in
+                                xrange(self.__chromosome_number)]
+        self.__strands = array('c')
+        for i in xrange(self.__fragment_number):
+            self.__chr_fragments[
+                rng.randrange(self.__chromosome_number)].append(i)
+            self.__strands.append(rng.choice('+-'))
+
+    @property
+    def seed(self):
+        return self.__seed
+
+    def __random_length(self, rng):
+        """
+        Return a random fragment length.
+
+        :param rng: a random number generator
+        :type rng: random.Random
+        :return: a fragment length
+        :rtype: int
+        """
+        if self.__length_distribution == 'uniform':
+            return rng.randint(max(1, self.__fragment_length // 2),
+                               self.__fragment_length +
+                               self.__fragment_length // 2)
+        elif self.__length_distribution == 'exponential':
+            return max(1, int(rng.expovariate(
+                1.0 / self.__fragment_length)))
+        return self.__fragment_length
+
+    @staticmethod
+    def fragment_name(index):
+        """
+        Given a fragment index, return its name.
+
+        :param index: a zero-based fragment index
+        :type index: int
+        :return: the fragment name
+        :rtype: str
+        """
+        return 'fragment{}'.format(index + 1)
+
+    def chromosome_names(self):
+        """
+        Return names of chromosomes composed of at least one fragment
+        in the order they are written to the output files.
+
+        :return: a list of tuples of chromosome names and indices
+        :rtype: list
+        """
+        return sorted(('chr{}'.format(i + 1), i)
+                      for i in xrange(self.__chromosome_number)
+                      if self.__chr_fragments[i])
+
+    def fragment_length(self, index):
+        """
+        Given a fragment index, return its length.
+
+        :param index: a zero-based fragment index
+        :type index: int
+        :return: the fragment length
+        :rtype: int
+        """
+        return self.__lengths[index]
+
+    def fragment_chunks(self, index, strand='+'):
+        """
+        Given a fragment index, return an iterator to its sequence
+        chunks. Each chunk is generated from its own seed, so the
+        reverse complement of a fragment is produced by the reversed
+        order of chunks.
+
+        :param index: a zero-based fragment index
+        :param strand: the fragment strand
+        :type index: int
+        :type strand: str
+        :return: an iterator to the sequence chunks
+        """
+        length = self.__lengths[index]
+        chunk_number = (length + self.__chunk_size - 1) // \
+            self.__chunk_size
+        if strand == '+':
+            chunk_order = xrange(chunk_number)
+        else:
+            chunk_order = xrange(chunk_number - 1, -1, -1)
+        for k in chunk_order:
+            chunk = self.__chunk(index, k)
+            if strand == '-':
+                chunk = chunk[::-1].translate(Map.complement)
+            yield chunk
+
+    def __chunk(self, index, k):
+        """
+        Given a fragment index and a chunk number, return the chunk
+        sequence.
+
+        :param index: a zero-based fragment index
+        :param k: a zero-based chunk number
+        :type index: int
+        :type k: int
+        :return: the chunk sequence
+        :rtype: str
+        """
+        chunk_length = min(self.__chunk_size,
+                           self.__lengths[index] - k * self.__chunk_size)
+        rng = self.__random(index, k)
+        chunk = '{:0{}x}'.format(rng.getrandbits(4 * chunk_length),
+                                 chunk_length)
+        return chunk.translate(self.hex2nucl)
+
+    def __random(self, index, k):
+        """
+        Return a random number generator for the specified fragment
+        index and chunk number. The fragment index 2^32 - 1 is
+        reserved for generators of alignments and features.
+
+        :param index: a zero-based fragment index
+        :param k: a zero-based chunk number
+        :type index: int
+        :type k: int
+        :return: a random number generator
+        :rtype: random.Random
+        """
+        return random.Random((self.__seed << 64) | (index << 32) | k)
+
+    def map_records(self):
+        """
+        Return an iterator to the simulated fragment map records in
+        the order they are written by Map.write.
+
+        :return: an iterator to fragment map records
+        """
+        for chr_name, chr_index in self.chromosome_names():
+            position = 0
+            for i in self.__chr_fragments[chr_index]:
+                length = self.__lengths[i]
+                yield Map.Record(
+                    fr_name=self.fragment_name(i),
+                    fr_length=length,
+                    fr_start=0,
+                    fr_end=length,
+                    fr_strand=self.__strands[i],
+                    ref_chr=chr_name,
+                    ref_start=position,
+                    ref_end=position + length
+                )
+                position += length
+                yield Map.Record(
+                    fr_name='GAP',
+                    fr_length=self.__gap_size,
+                    fr_start=0,
+                    fr_end=self.__gap_size,
+                    fr_strand='+',
+                    ref_chr=chr_name,
+                    ref_start=position,
+                    ref_end=position + self.__gap_size
+                )
+                position += self.__gap_size
+
+    def __chromosome_length(self, chr_index):
+        """
+        Given a chromosome index, return its length.
+
+        :param chr_index: a zero-based chromosome index
+        :type chr_index: int
+        :return: the chromosome length
+        :rtype: int
+        """
+        fragments = self.__chr_fragments[chr_index]
+        return sum(self.__lengths[i] for i in fragments) + \
+            len(fragments) * self.__gap_size
+
+    def __chromosome_chunks(self, chr_index):
+        """
+        Given a chromosome index, return an iterator to its sequence
+        chunks.
+
+        :param chr_index: a zero-based chromosome index
+        :type chr_index: int
+        :return: an iterator to the sequence chunks
+        """
+        gap = 'N' * self.__gap_size
+        for i in self.__chr_fragments[chr_index]:
+            for chunk in self.fragment_chunks(i, self.__strands[i]):
+                yield chunk
+            yield gap
+
+    def write(self, map_file, fragment_file, chromosome_file):
+        """
+        Write the produced data - a fragment map, a FASTA file of
+        fragments and a FASTA file of chromosomes - to the specified
+        files.
+
+        :param map_file: a name of a file to write the fragment map to
+        :param fragment_file: a name of a file to write fragment
+            sequences to
+        :param chromosome_file: a name of a file to write chromosome
+            sequences to
+        :type map_file: str
+        :type fragment_file: str
+        :type chromosome_file: str
+        """
+        template = '\t'.join(['{}'] * len(Map.record_names)) + '\n'
+        with open(map_file, 'w') as output_map_file:
+            for record in self.map_records():
+                output_map_file.write(template.format(*record))
+
+        with open(fragment_file, 'w') as fragment_fasta:
+            for i in xrange(len(self.__lengths)):
+                write_fasta_record(fragment_fasta,
+                                   self.fragment_name(i),
+                                   self.fragment_chunks(i))
+
+        with open(chromosome_file, 'w') as chromosome_fasta:
+            for chr_name, chr_index in self.chromosome_names():
+                write_fasta_record(chromosome_fasta, chr_name,
+                                   self.__chromosome_chunks(chr_index))
+
+        logger.debug('a simulated map of %d fragments written to %s',
+                     self.__fragment_number, map_file)
+        logger.debug('%d simulated fragments written to %s',
+                     len(self.__lengths), fragment_file)
+        logger.debug('%d simulated chromosomes written to %s',
+                     len(self.chromosome_names()), chromosome_file)
+
+    def write_alignments(self, alignment_file, decoy_number=1,
+                         score_ratio=2.0):
+        """
+        Write simulated BLAST alignments of the fragments to the
+        chromosomes in the tabular format. Every placed fragment has
+        its true alignment and the specified number of decoy
+        alignments (e.g., repeats or paralogs) to random chromosome
+        locations which bit scores are less than the true one by the
+        specified ratio. Unplaced fragments get decoy alignments of
+        equal bit scores only.
+
+        :param alignment_file: a name of the output BLAST tabular file
+        :param decoy_number: the number of decoy alignments per
+            fragment
+        :param score_ratio: the ratio of the true alignment bit score
+            to the decoy alignment ones
+        :type alignment_file: str
+        :type decoy_number: int
+        :type score_ratio: float
+        """
+        template = '\t'.join(['{}'] * 12) + '\n'
+        rng = self.__random((1 << 32) - 1, 0)
+        chromosomes = self.chromosome_names()
+        chr_lengths = dict((chr_name, self.__chromosome_length(chr_index))
+                           for chr_name, chr_index in chromosomes)
+        alignment_number = 0
+        # unplaced fragments get at least two decoy alignments, so
+        # that they are not placed by a single one
+        unplaced_decoy_number = max(2, decoy_number) if decoy_number \
+            else 0
+
+        def decoys(fragment, length, bit_score, number):
+            for _ in xrange(number):
+                chr_name = rng.choice(chromosomes)[0]
+                start = rng.randrange(max(1, chr_lengths[chr_name] -
+                                          length)) + 1
+                if rng.random() < 0.5:
+                    s_start, s_end = start, start + length - 1
+                else:
+                    s_start, s_end = start + length - 1, start
+                yield template.format(fragment, chr_name, '100.00',
+                                      length, 0, 0, 1, length,
+                                      s_start, s_end, '0.0',
+                                      '{:.1f}'.format(bit_score))
+
+        with open(alignment_file, 'w') as output_file:
+            for record in self.map_records():
+                if record.fr_name == 'GAP':
+                    continue
+                bit_score = 2.0 * record.fr_length
+                if record.fr_strand == '+':
+                    s_start, s_end = record.ref_start + 1, record.ref_end
+                else:
+                    s_start, s_end = record.ref_end, record.ref_start + 1
+                output_file.write(template.format(
+                    record.fr_name, record.ref_chr, '100.00',
+                    record.fr_length, 0, 0, 1, record.fr_length,
+                    s_start, s_end, '0.0', '{:.1f}'.format(bit_score)))
+                for line in decoys(record.fr_name, record.fr_length,
+                                   bit_score / score_ratio,
+                                   decoy_number):
+                    output_file.write(line)
+                alignment_number += 1 + decoy_number
+            for i in xrange(self.__fragment_number, len(self.__lengths)):
+                length = self.__lengths[i]
+                for line in decoys(self.fragment_name(i), length,
+                                   2.0 * length, unplaced_decoy_number):
+                    output_file.write(line)
+                alignment_number += unplaced_decoy_number
+
+        logger.debug('%d simulated alignments written to %s',
+                     alignment_number, alignment_file)
+
+    def write_features(self, feature_number, bed_file=None,
+                       gff3_file=None, vcf_file=None,
+                       max_feature_length=1000):
+        """
+        Write simulated features located on the fragments to BED,
+        GFF3 and VCF files. Every fragment gets the specified number
+        of BED features, GFF3 gene models (a gene, an mRNA and its
+        exons) and single-nucleotide variants which reference alleles
+        are taken from the fragment sequence.
+
+        :param feature_number: the number of features of each type
+            per fragment
+        :param bed_file: a name of the output BED file
+        :param gff3_file: a name of the output GFF3 file
+        :param vcf_file: a name of the output VCF file
+        :param max_feature_length: the maximal length of a BED
+            feature or a GFF3 gene
+        :type feature_number: int
+        :type bed_file: str
+        :type gff3_file: str
+        :type vcf_file: str
+        :type max_feature_length: int
+        """
+        bed_template = '\t'.join(['{}'] * 6) + '\n'
+        gff3_template = '\t'.join(['{}'] * 9) + '\n'
+        vcf_template = '\t'.join(['{}'] * 8) + '\n'
+        gff3_id = 0
+
+        outputs = [open(i, 'w') if i is not None else None
+                   for i in (bed_file, gff3_file, vcf_file)]
+        bed_output, gff3_output, vcf_output = outputs
+        # each file type has its own generator, so the produced
+        # features do not depend on the files to be written
+        bed_rng, gff3_rng, vcf_rng = [self.__random((1 << 32) - 1, i)
+                                      for i in (1, 2, 3)]
+        try:
+            if gff3_output is not None:
+                gff3_output.write('##gff-version 3\n')
+            if vcf_output is not None:
+                vcf_output.write('##fileformat=VCFv4.1\n')
+                for i in xrange(len(self.__lengths)):
+                    vcf_output.write('##contig=<ID={},length={}>\n'.format(
+                        self.fragment_name(i), self.__lengths[i]))
+                vcf_output.write('#' + '\t'.join((
+                    'CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL',
+                    'FILTER', 'INFO')) + '\n')
+
+            for i in xrange(len(self.__lengths)):
+                name = self.fragment_name(i)
+                length = self.__lengths[i]
+                max_length = min(length, max_feature_length)
+
+                if bed_output is not None:
+                    for j in xrange(feature_number):
+                        start = bed_rng.randrange(length)
+                        end = min(length, start + bed_rng.randint(
+                            1, max_length))
+                        bed_output.write(bed_template.format(
+                            name, start, end,
+                            '{}_feature{}'.format(name, j + 1), 0,
+                            bed_rng.choice('+-')))
+
+                if gff3_output is not None:
+                    gff3_output.write('##sequence-region {} 1 {}\n'.format(
+                        name, length))
+                    for _ in xrange(feature_number):
+                        gff3_id += 1
+                        start = gff3_rng.randrange(length) + 1
+                        end = min(length, start + gff3_rng.randint(
+                            1, max_length) - 1)
+                        strand = gff3_rng.choice('+-')
+                        gene_id = 'gene{}'.format(gff3_id)
+                        mrna_id = 'mRNA{}'.format(gff3_id)
+                        gff3_output.write(gff3_template.format(
+                            name, 'simulator', 'gene', start, end, '.',
+                            strand, '.', 'ID=' + gene_id))
+                        gff3_output.write(gff3_template.format(
+                            name, 'simulator', 'mRNA', start, end, '.',
+                            strand, '.',
+                            'ID={};Parent={}'.format(mrna_id, gene_id)))
+                        # the gene has two exons if it is long enough
+                        exon_length = (end - start + 1) // 3
+                        if exon_length > 0:
+                            exons = ((start, start + exon_length - 1),
+                                     (end - exon_length + 1, end))
+                        else:
+                            exons = ((start, end), )
+                        for exon_start, exon_end in exons:
+                            gff3_output.write(gff3_template.format(
+                                name, 'simulator', 'exon', exon_start,
+                                exon_end, '.', strand, '.',
+                                'Parent=' + mrna_id))
+                        gff3_output.write('###\n')
+
+                if vcf_output is not None:
+                    positions = sorted(vcf_rng.randrange(length)
+                                       for _ in xrange(feature_number))
+                    chunk_number = chunk = None
+                    for position in positions:
+                        k = position // self.__chunk_size
+                        if k != chunk_number:
+                            chunk_number = k
+                            chunk = self.__chunk(i, k)
+                        ref = chunk[position % self.__chunk_size]
+                        alt = vcf_rng.choice('ACGT'.replace(ref, ''))
+                        vcf_output.write(vcf_template.format(
+                            name, position + 1, '.', ref, alt, 50,
+                            'PASS', '.'))
+        finally:
+            for output in outputs:
+                if output is not None:
+                    output.close()
+
+        logger.debug('%d simulated features of each type per fragment '
+                     'written', feature_number)
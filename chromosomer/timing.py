@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import platform
+import resource
+import threading
+import time
+from collections import OrderedDict
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of the current process in
+    kilobytes.
+
+    :return: the peak resident set size
+    :rtype: int
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() == 'Darwin':
+        # macOS reports the value in bytes
+        peak //= 1024
+    return peak
+
+
+class Phase(object):
+    """
+    The class implements a context manager that measures time spent
+    in a phase of a Chromosomer routine.
+    """
+
+    def __init__(self, profiler, name):
+        """
+        Create a Phase object.
+
+        :param profiler: a profiler to add the phase time to
+        :param name: the phase name
+        :type profiler: Profiler
+        :type name: str
+        """
+        self.__profiler = profiler
+        self.__name = name
+        self.__start = None
+
+    def __enter__(self):
+        self.__start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.__profiler.add(self.__name, time.time() - self.__start)
+
+
+class NullPhase(object):
+    """
+    The class implements a context manager that does nothing; it is
+    used when a profiler is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class Profiler(object):
+    """
+    The class implements routines to collect timings of phases of
+    Chromosomer routines, e.g., loading a fragment map or writing
+    sequences. A disabled profiler adds almost no overhead.
+    """
+
+    null_phase = NullPhase()
+
+    def __init__(self):
+        """
+        Create a disabled Profiler object.
+        """
+        self.__enabled = False
+        self.__phases = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.__enabled
+
+    def enable(self):
+        """
+        Start collecting phase timings.
+        """
+        self.__enabled = True
+
+    def disable(self):
+        """
+        Stop collecting phase timings.
+        """
+        self.__enabled = False
+
+    def reset(self):
+        """
+        Remove the collected phase timings.
+        """
+        self.__phases = OrderedDict()
+
+    def phase(self, name):
+        """
+        Return a context manager that measures time spent in the
+        specified phase.
+
+        :param name: the phase name
+        :type name: str
+        :return: a context manager
+        """
+        if not self.__enabled:
+            return self.null_phase
+        return Phase(self, name)
+
+    def add(self, name, seconds, calls=1):
+        """
+        Add time spent in the specified phase.
+
+        :param name: the phase name
+        :param seconds: the time spent in the phase
+        :param calls: the number of times the phase was entered
+        :type name: str
+        :type seconds: float
+        :type calls: int
+        """
+        if not self.__enabled:
+            return
+        # phases may be measured by several threads
+        with self.__lock:
+            phase_calls, phase_seconds = self.__phases.get(name,
+                                                           (0, 0.0))
+            self.__phases[name] = (phase_calls + calls,
+                                   phase_seconds + seconds)
+
+    def summary(self):
+        """
+        Return a summary of the collected phase timings and the peak
+        memory usage.
+
+        :return: a dictionary with the list of phases (each one is a
+            dictionary of its name, the number of calls and the total
+            time in seconds) and the peak resident set size in
+            kilobytes
+        :rtype: dict
+        """
+        return {
+            'phases': [{'name': name, 'calls': calls,
+                        'seconds': seconds}
+                       for name, (calls, seconds) in
+                       self.__phases.iteritems()],
+            'peak_rss_kb': peak_rss()
+        }
+
+
+def format_seconds(seconds):
+    """
+    Format a time interval as hours, minutes and seconds.
+
+    :param seconds: a time interval in seconds
+    :type seconds: float
+    :return: the formatted time interval
+    :rtype: str
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{:02d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+class Progress(object):
+    """
+    The class implements periodic logging of the progress of a
+    Chromosomer routine: the number of processed records, their
+    processing rate, the number of processed bytes and the estimated
+    time to finish the routine.
+    """
+
+    def __init__(self, name, interval, total=None, total_bytes=None,
+                 unit='records'):
+        """
+        Create a Progress object.
+
+        :param name: the routine name
+        :param interval: the interval between progress messages in
+            seconds
+        :param total: the total number of records to be processed
+        :param total_bytes: the total number of bytes to be processed
+        :param unit: the name of processed records
+        :type name: str
+        :type interval: float
+        :type total: int
+        :type total_bytes: int
+        :type unit: str
+        """
+        self.__name = name
+        self.__interval = interval
+        self.__total = total
+        self.__total_bytes = total_bytes
+        self.__unit = unit
+        self.__records = 0
+        self.__bytes = 0
+        self.__start = time.time()
+        self.__next_report = self.__start + interval
+
+    @property
+    def records(self):
+        return self.__records
+
+    @property
+    def bytes(self):
+        return self.__bytes
+
+    def update(self, records=1, size=0):
+        """
+        Add processed records and bytes and log the progress if the
+        interval since the previous message has passed.
+
+        :param records: the number of processed records
+        :param size: the number of processed bytes
+        :type records: int
+        :type size: int
+        """
+        self.__records += records
+        self.__bytes += size
+        if time.time() >= self.__next_report:
+            self.report()
+
+    def lines(self, lines):
+        """
+        Iterate over lines and add their sizes to the number of
+        processed bytes.
+
+        :param lines: an iterable of lines, e.g., a file
+        :return: the same lines
+        """
+        for line in lines:
+            self.__bytes += len(line)
+            yield line
+
+    def report(self):
+        """
+        Log the current progress.
+        """
+        now = time.time()
+        self.__next_report = now + self.__interval
+        seconds = now - self.__start
+        message = ['{}: {} {}'.format(self.__name, self.__records,
+                                      self.__unit)]
+        if seconds > 0:
+            message.append('{:.1f} {}/s'.format(
+                self.__records / seconds, self.__unit))
+        if self.__bytes > 0:
+            message.append('{:.1f} MB'.format(self.__bytes / 1048576.0))
+        # the remaining time is estimated from the processed fraction
+        # of the input
+        fraction = None
+        if self.__total_bytes and self.__bytes > 0:
+            fraction = float(self.__bytes) / self.__total_bytes
+        elif self.__total and self.__records > 0:
+            fraction = float(self.__records) / self.__total
+        if fraction is not None:
+            fraction = min(fraction, 1.0)
+            message.append('{:.1f}%'.format(fraction * 100))
+            message.append('ETA {}'.format(format_seconds(
+                seconds / fraction - seconds)))
+        logger.info(', '.join(message))
+
+    def finish(self):
+        """
+        Log the final number of processed records and the total time.
+        """
+        logger.info('%s: %d %s processed in %s', self.__name,
+                    self.__records, self.__unit,
+                    format_seconds(time.time() - self.__start))
+
+
+class NullProgress(object):
+    """
+    The class implements a progress object that does nothing; it is
+    used when progress reporting is disabled.
+    """
+
+    records = 0
+    bytes = 0
+
+    def update(self, records=1, size=0):
+        pass
+
+    def lines(self, lines):
+        return lines
+
+    def report(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+class ProgressReporter(object):
+    """
+    The class creates progress objects for Chromosomer routines. A
+    disabled reporter returns objects that do nothing, so the
+    routines pay almost nothing for progress reporting.
+    """
+
+    null_progress = NullProgress()
+
+    def __init__(self):
+        """
+        Create a disabled ProgressReporter object.
+        """
+        self.__interval = None
+
+    @property
+    def enabled(self):
+        return self.__interval is not None
+
+    def enable(self, interval):
+        """
+        Start reporting progress of routines.
+
+        :param interval: the interval between progress messages in
+            seconds
+        :type interval: float
+        """
+        self.__interval = interval
+
+    def disable(self):
+        """
+        Stop reporting progress of routines.
+        """
+        self.__interval = None
+
+    def start(self, name, total=None, total_bytes=None,
+              unit='records'):
+        """
+        Return a progress object for a routine.
+
+        :param name: the routine name
+        :param total: the total number of records to be processed
+        :param total_bytes: the total number of bytes to be processed
+        :param unit: the name of processed records
+        :type name: str
+        :type total: int
+        :type total_bytes: int
+        :type unit: str
+        :return: a progress object
+        """
+        if self.__interval is None:
+            return self.null_progress
+        return Progress(name, self.__interval, total, total_bytes,
+                        unit)
+
+
+# the profiler used by Chromosomer routines
+profiler = Profiler()
+
+# the progress reporter used by Chromosomer routines
+progress = ProgressReporter()
@@ -6,23 +6,198 @@
 
 import bioformats.bed
 import bioformats.gff3
+import logging
+import os
+import threading
+from chromosomer.exception import TransferError
 from chromosomer.fragment import Map
+from chromosomer.timing import profiler
+from chromosomer.timing import progress
+from collections import OrderedDict
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class MapCache(object):
+    """
+    The class implements an LRU cache of fragment maps read from
+    files. A cached map is identified by its file path, modification
+    time and size, so a changed map file is read again. The cache
+    keeps maps within the memory budget by evicting the least
+    recently used ones.
+
+    The maps returned by the cache are shared between its users and
+    must not be modified. The cache may be used by several threads.
+    """
+
+    # the estimated number of bytes a map record and its index entry
+    # take in memory
+    record_size = 400
+
+    def __init__(self, budget=1 << 30):
+        """
+        Create a MapCache object.
+
+        :param budget: the maximal estimated size of cached maps in
+            bytes
+        :type budget: int
+        """
+        self.__budget = budget
+        self.__maps = OrderedDict()
+        self.__size = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        # the lock of the cached maps and the locks of map files that
+        # are being read
+        self.__lock = threading.Lock()
+        self.__path_locks = {}
+
+    @property
+    def budget(self):
+        return self.__budget
+
+    @budget.setter
+    def budget(self, value):
+        with self.__lock:
+            self.__budget = value
+            self.__evict()
+
+    def get(self, filename):
+        """
+        Return the fragment map read from the specified file.
+
+        :param filename: a name of a fragment map file
+        :type filename: str
+        :return: the fragment map
+        :rtype: Map
+        """
+        path = os.path.abspath(filename)
+        file_stat = os.stat(path)
+        identity = (file_stat.st_mtime, file_stat.st_size)
+        with self.__lock:
+            fragment_map = self.__lookup(path, identity)
+            if fragment_map is not None:
+                return fragment_map
+            path_lock = self.__path_locks.setdefault(path,
+                                                     threading.Lock())
+
+        # the map is read under the lock of its file, so other maps
+        # are available meanwhile and users of the same map wait for
+        # it to be read once
+        with path_lock:
+            with self.__lock:
+                fragment_map = self.__lookup(path, identity)
+                if fragment_map is not None:
+                    return fragment_map
+                self.__misses += 1
+            fragment_map = Map()
+            fragment_map.read(path)
+            size = self.record_size * sum(
+                len(i) for i in fragment_map.records.itervalues())
+            with self.__lock:
+                if size <= self.__budget:
+                    self.__maps[path] = (identity, fragment_map, size)
+                    self.__size += size
+                    self.__evict()
+                else:
+                    logger.debug('the map %s exceeds the cache budget',
+                                 path)
+            return fragment_map
+
+    def __lookup(self, path, identity):
+        """
+        Return the cached map of the specified file if the file was
+        not changed after it was cached, otherwise return None. The
+        method is called under the cache lock.
+        """
+        if path not in self.__maps:
+            return None
+        map_identity, fragment_map, size = self.__maps.pop(path)
+        if map_identity != identity:
+            # the map file was changed after it was cached
+            self.__size -= size
+            return None
+        self.__hits += 1
+        self.__maps[path] = (map_identity, fragment_map, size)
+        return fragment_map
+
+    def __evict(self):
+        """
+        Remove the least recently used maps until the cached maps fit
+        the budget.
+        """
+        while self.__size > self.__budget:
+            path, (_, _, size) = self.__maps.popitem(last=False)
+            self.__size -= size
+            self.__evictions += 1
+            logger.debug('the map %s evicted from the cache', path)
+
+    def clear(self):
+        """
+        Remove all maps from the cache.
+        """
+        with self.__lock:
+            self.__maps = OrderedDict()
+            self.__size = 0
+
+    def stats(self):
+        """
+        Return the cache statistics.
+
+        :return: a dictionary of the numbers of cache hits, misses,
+            evictions and cached maps and the estimated size of cached
+            maps in bytes
+        :rtype: dict
+        """
+        return {'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'maps': len(self.__maps),
+                'size': self.__size}
+
+
+# the cache of fragment maps used by transferring routines
+map_cache = MapCache()
 
 
 class Transfer(object):
     """
     Implements transfering routines for abstract data.
+
+    A feature is transferred according to the policy if it is not
+    located within a single placed region of its fragment: 'drop'
+    skips the feature, 'clip' clips it to the first placed region it
+    overlaps and 'split' transfers its parts overlapping placed
+    regions as separate features.
+
+    Subclasses implement the features method that returns a list of
+    features the given one is transferred to.
     """
 
-    def __init__(self, fragment_map):
+    policies = ('drop', 'clip', 'split')
+
+    def __init__(self, fragment_map, policy='drop'):
         """
         Create a Transfer object.
 
-        :param fragment_map: a fragment map for feature transfer
-        :type fragment_map: Map
+        :param fragment_map: a fragment map for feature transfer or a
+            name of a file to read it from; maps read from files are
+            shared through the map cache
+        :param policy: the policy of transferring features that are
+            not located within a single placed region of a fragment
+        :type fragment_map: Map or str
+        :type policy: str
         """
-        self.__fragment_map = Map()
-        self.__fragment_map.read(fragment_map)
+        if policy not in self.policies:
+            logger.error('incorrect feature transfer policy %s', policy)
+            raise TransferError
+        self.__policy = policy
+        if isinstance(fragment_map, Map):
+            self.__fragment_map = fragment_map
+        else:
+            self.__fragment_map = map_cache.get(fragment_map)
 
     def find_fragment(self, fragment):
         """
@@ -36,18 +211,29 @@ class Transfer(object):
             fragment
         :rtype Map.Record
         """
-        for chromosome in self.__fragment_map.chromosomes():
-            for record in self.__fragment_map.fragments(chromosome):
-                if record.fr_name == fragment:
-                    return record
+        with profiler.phase('fragment lookup'):
+            return self.__fragment_map.find_fragment(fragment)
 
-        return None
+    def chromosome_length(self, chromosome):
+        """
+        Given a chromosome name, return its length according to the
+        fragment map.
+
+        :param chromosome: a chromosome name
+        :type chromosome: str
+        :return: the chromosome length
+        :rtype: int
+        """
+        return max(i.ref_end for i in
+                   self.__fragment_map.records[chromosome])
 
     def coordinate(self, fragment, pos):
         """
         Given a position on a fragment, return the corresponding
         coordinates on the assembled chromosomes according to the
-        fragment map specified when the object was created.
+        fragment map specified when the object was created. If the
+        position is not located in a placed region of the fragment,
+        return None.
 
         :param fragment: a fragment name
         :param pos: a position on a fragment (zero-based)
@@ -56,127 +242,300 @@ class Transfer(object):
         :return: a tuple of the chromosome name and a position on it
         :rtype: tuple
         """
-        fr_record = self.find_fragment(fragment)
-        if fr_record is None:
-            # the fragment is absent in the assembly, skip the feature
+        fr_records = self.__fragment_map.fragment_records(fragment,
+                                                          pos, pos)
+        if not fr_records:
+            # the position is absent in the assembly, skip the feature
             return None
 
-        chrom = fr_record.ref_chr
+        return fr_records[0].ref_chr, self.__position(fr_records[0],
+                                                      pos)
+
+    @staticmethod
+    def __position(fr_record, pos):
+        """
+        Given a fragment map record and a position on its fragment,
+        return the position on the chromosome.
+        """
         if fr_record.fr_strand == '+':
-            chrom_pos = fr_record.ref_start + pos
+            return fr_record.ref_start + pos - fr_record.fr_start
         else:
-            chrom_pos = fr_record.ref_end - pos
+            return fr_record.ref_end - pos + fr_record.fr_start
 
-        return chrom, chrom_pos
+    def intervals(self, fragment, start, end, strand=None):
+        """
+        Given an interval on a fragment, return the intervals on the
+        assembled chromosomes it is transferred to according to the
+        transfer policy.
+
+        :param fragment: a fragment name
+        :param start: the interval start (zero-based)
+        :param end: the interval end (zero-based, exclusive)
+        :param strand: the interval strand; '+' and '-' are changed
+            according to the fragment strand, other values are kept
+        :type fragment: str
+        :type start: int
+        :type end: int
+        :type strand: str
+        :return: a list of tuples of a chromosome name, the interval
+            start and end on it and its strand
+        :rtype: list
+        """
+        fr_records = self.__fragment_map.fragment_records(fragment,
+                                                          start, end)
+        if not fr_records:
+            return []
+        if self.__policy == 'drop':
+            if len(fr_records) > 1 or \
+                    fr_records[0].fr_start > start or \
+                    fr_records[0].fr_end < end:
+                return []
+        elif self.__policy == 'clip':
+            fr_records = fr_records[:1]
+
+        result = []
+        for fr_record in fr_records:
+            chrom_start = self.__position(
+                fr_record, max(start, fr_record.fr_start))
+            chrom_end = self.__position(
+                fr_record, min(end, fr_record.fr_end))
+            if strand in ('+', '-') and fr_record.fr_strand == '-':
+                chrom_strand = '+' if strand == '-' else '-'
+            else:
+                chrom_strand = strand
+            result.append((fr_record.ref_chr,
+                           min(chrom_start, chrom_end),
+                           max(chrom_start, chrom_end), chrom_strand))
+        return result
+
+    def feature(self, feature):
+        """
+        Given a feature, return the transferred one. If the feature
+        is not transferred or is split into several parts, return
+        None.
+
+        :param feature: a feature
+        :return: a transferred feature
+        """
+        transferred_features = self.features(feature)
+        if len(transferred_features) != 1:
+            return None
+        return transferred_features[0]
 
 
 class BedTransfer(Transfer):
     """
     Implements transferring routines for files in the BED format.
     """
-    def feature(self, bed_record):
+    def features(self, bed_record):
         """
-        Given a record from a BED file, return the transferred one.
+        Given a record from a BED file, return the transferred ones.
 
         :param bed_record: a line from a BED file
         :type bed_record: bioformats.bed.BedRecord
-        :return: a transferred feature
-        :rtype: bioformats.bed.BedRecord
+        :return: a list of transferred features
+        :rtype: list
         """
-        fr_record = self.find_fragment(bed_record.seq)
-        if fr_record is None:
-            # the fragment is absent in the assembly, skip it
-            return None
+        result = []
+        for chrom, start, end, strand in self.intervals(
+                bed_record.seq, bed_record.start, bed_record.end,
+                bed_record.strand):
+            transferred_record = list(bed_record)
+            transferred_record[0] = chrom
+            transferred_record[1] = start
+            transferred_record[2] = end
+            transferred_record[5] = strand
+            result.append(bioformats.bed.Record(*transferred_record))
 
-        chrom = fr_record.ref_chr
-        start = self.coordinate(bed_record.seq, bed_record.start)[1]
-        end = self.coordinate(bed_record.seq, bed_record.end)[1]
-
-        # determine the transferred feature strand
-        if bed_record.strand is not None:
-            feature_strand = -1 if bed_record.strand == '-' else 1
-            fragment_strand = -1 if bed_record.strand == '-' else 1
-            if feature_strand * fragment_strand == -1:
-                strand = '-'
-            else:
-                strand = '+'
-        else:
-            strand = None
-
-        transferred_record = list(bed_record)
-        transferred_record[0] = chrom
-        transferred_record[1] = min(start, end)
-        transferred_record[2] = max(start, end)
-        transferred_record[5] = strand
-
-        return bioformats.bed.Record(*transferred_record)
+        return result
 
 
 class Gff3Transfer(Transfer):
     """
     Implements transferring routines for files in the GFF3 format.
     """
-    def feature(self, gff3_record):
+    def features(self, gff3_record):
         """
-        Given a record from a GFF3 file, return the transferred one.
+        Given a record from a GFF3 file, return the transferred ones.
 
         :param gff3_record: a line from a GFF3 file
         :type gff3_record: bioformats.gff3.Gff3Record
-        :return: a transferred feature
-        :rtype: bioformats.bed.BedRecord
+        :return: a list of transferred features
+        :rtype: list
         """
-        fr_record = self.find_fragment(gff3_record.seqid)
-        if fr_record is None:
-            # the fragment is absent in the assembly, skip it
-            return None
-
-        chrom = fr_record.ref_chr
-        start = self.coordinate(gff3_record.seqid,
-                                gff3_record.start - 1)[1]
-        end = self.coordinate(gff3_record.seqid, gff3_record.end)[1]
-
-        # determine the transferred feature strand
-        if gff3_record.strand != '.':
-            feature_strand = -1 if gff3_record.strand == '-' else 1
-            fragment_strand = -1 if gff3_record.strand == '-' else 1
-            if feature_strand * fragment_strand == -1:
-                strand = '-'
+        result = []
+        for chrom, start, end, strand in self.intervals(
+                gff3_record.seqid, gff3_record.start - 1,
+                gff3_record.end, gff3_record.strand):
+            transferred_record = list(gff3_record)
+            transferred_record[0] = chrom
+            transferred_record[3] = start + 1
+            transferred_record[4] = end
+            transferred_record[6] = strand
+            result.append(bioformats.gff3.Record(*transferred_record))
+
+        return result
+
+    def stream(self, lines, output_file, feature_progress=None):
+        """
+        Transfer features from GFF3 lines and write them to the output
+        file keeping feature hierarchy: a gene model, that is, a
+        feature with all its descendants, is either transferred
+        completely or skipped. Only the current models are kept in
+        memory; they are bounded by '###' directives and changes of
+        sequence IDs. The '##sequence-region' pragmas are replaced by
+        the ones of the chromosomes the fragments are placed on.
+
+        :param lines: lines of a GFF3 file
+        :param output_file: an output file of transferred features
+        :param feature_progress: a progress object to report processed
+            features to
+        :type output_file: file
+        :return: a tuple of the numbers of processed and transferred
+            features
+        :rtype: tuple
+        :raises TransferError: a line is malformed
+        """
+        if feature_progress is None:
+            feature_progress = progress.start('transfer',
+                                              unit='features')
+        self.__regions = set()
+        self.__counts = [0, 0]
+        block = []
+        block_seqid = None
+        # lines of a block are kept with their numbers
+        for lineno, line in enumerate(lines, 1):
+            if line.startswith('#'):
+                if block and not line.startswith('##'):
+                    # a comment inside a gene model is kept in place
+                    block.append((lineno, line))
+                    continue
+                self.__write_block(block, output_file)
+                block = []
+                if line.startswith('##FASTA'):
+                    # sequences of fragments are not transferred
+                    break
+                elif line.startswith('##sequence-region'):
+                    self.__write_region(lineno, line, output_file)
+                else:
+                    output_file.write(line)
+            elif line.strip():
+                seqid = line.split('\t', 1)[0]
+                if seqid != block_seqid:
+                    self.__write_block(block, output_file)
+                    block = []
+                    block_seqid = seqid
+                block.append((lineno, line))
+                feature_progress.update()
+        self.__write_block(block, output_file)
+        return tuple(self.__counts)
+
+    def __write_region(self, lineno, line, output_file):
+        """
+        Given a '##sequence-region' pragma of a fragment and its line
+        number, write the pragma of the chromosome the fragment is
+        placed on unless it was written before.
+        """
+        parts = line.split()
+        if len(parts) < 2:
+            logger.error('line %d: the sequence ID missing in the '
+                         'sequence-region pragma', lineno)
+            raise TransferError
+        fr_record = self.find_fragment(parts[1])
+        if fr_record is not None and \
+                fr_record.ref_chr not in self.__regions:
+            self.__regions.add(fr_record.ref_chr)
+            output_file.write('##sequence-region {} 1 {}\n'.format(
+                fr_record.ref_chr,
+                self.chromosome_length(fr_record.ref_chr)))
+
+    def __write_block(self, block, output_file):
+        """
+        Transfer features from lines of the block, given with their
+        numbers, and write the lines of the gene models which features
+        were all transferred.
+        """
+        if not block:
+            return
+        transferred = []
+        # a parent of every feature to join the features of a model
+        parents = range(len(block))
+
+        def root(k):
+            while parents[k] != k:
+                parents[k] = parents[parents[k]]
+                k = parents[k]
+            return k
+
+        ids = {}
+        feature_parents = []
+        for i, (lineno, line) in enumerate(block):
+            if line.startswith('#'):
+                transferred.append(line)
+                continue
+            self.__counts[0] += 1
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 9:
+                logger.error('line %d: the incorrect number of columns',
+                             lineno)
+                raise TransferError
+            for j in (3, 4):
+                try:
+                    parts[j] = int(parts[j])
+                except ValueError:
+                    logger.error('line %d: the incorrect numeric value '
+                                 '%s', lineno, parts[j])
+                    raise TransferError
+            features = self.features(
+                bioformats.gff3.Record(*parts[:9]))
+            if features:
+                transferred.append(''.join(
+                    '\t'.join(str(k) for k in j) + '\n'
+                    for j in features))
             else:
-                strand = '+'
-        else:
-            strand = '.'
-
-        transferred_record = list(gff3_record)
-        transferred_record[0] = chrom
-        transferred_record[3] = min(start, end) + 1
-        transferred_record[4] = max(start, end)
-        transferred_record[6] = strand
-
-        return bioformats.gff3.Record(*transferred_record)
+                transferred.append(None)
+            for attribute in parts[8].split(';'):
+                key, _, value = attribute.strip().partition('=')
+                if key == 'ID':
+                    ids[value] = i
+                elif key == 'Parent':
+                    feature_parents.extend((i, j) for j in
+                                           value.split(','))
+        for i, parent_id in feature_parents:
+            if parent_id in ids:
+                parents[root(i)] = root(ids[parent_id])
+
+        failed_models = set(root(i) for i, line in
+                            enumerate(transferred) if line is None)
+        for i, line in enumerate(transferred):
+            if block[i][1].startswith('#'):
+                output_file.write(line)
+            elif root(i) not in failed_models:
+                self.__counts[1] += 1
+                output_file.write(line)
 
 
 class VcfTransfer(Transfer):
     """
     Implements transferring routines for files in the VCF format.
     """
-    def feature(self, vcf_record):
+    def features(self, vcf_record):
         """
-        Given a record from a VCF file, return the transferred one.
+        Given a record from a VCF file, return the transferred ones.
 
         :param vcf_record: a variant record
         :type vcf_record: vcf.model._Record
-        :return: a transferred variant
-        :rtype: vcf.model._Record
+        :return: a list of the transferred variant or an empty list
+        :rtype: list
         """
-        fr_record = self.find_fragment(vcf_record.CHROM)
-        if fr_record is None:
-            # the fragment is absent in the assembly, skip it
-            return None
-
-        chrom = fr_record.ref_chr
-        pos = self.coordinate(vcf_record.CHROM, vcf_record.POS)[1]
+        # the first base of the variant is transferred
+        intervals = self.intervals(vcf_record.CHROM, vcf_record.POS - 1,
+                                   vcf_record.POS)
+        if not intervals:
+            # the variant is absent in the assembly, skip it
+            return []
 
-        vcf_record.CHROM = chrom
-        vcf_record.POS = pos
+        vcf_record.CHROM = intervals[0][0]
+        vcf_record.POS = intervals[0][1] + 1
 
-        return vcf_record
+        return [vcf_record]
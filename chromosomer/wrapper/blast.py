@@ -4,8 +4,16 @@
 # Copyright (C) 2015 by Gaik Tamazian
 # gaik (dot) tamazian (at) gmail (dot) com
 
+import glob
+import hashlib
 import logging
+import os
+import shutil
+import sqlite3
 import subprocess
+import tempfile
+from chromosomer.exception import AlignmentCacheError
+from chromosomer.wrapper.process import stream_output
 from itertools import chain
 
 logging.basicConfig()
@@ -50,7 +58,7 @@ class BlastN(object):
     BLAST+ package.
     """
 
-    def __init__(self, query, database, output):
+    def __init__(self, query, database, output=None):
         """
         Create a BlastN object to align the specified query to the
         specified database.
@@ -59,8 +67,10 @@ class BlastN(object):
             aligned
         :param database: a name of a BLAST database to align the query
             sequences to
+        :param output: a name of an output file
         :type query: str
         :type database: str
+        :type output: str
         """
         self.__query = query
         self.__database = database
@@ -98,3 +108,262 @@ class BlastN(object):
                 self.__parameters.iteritems())))
 
         subprocess.check_call(options)
+
+    def alignments(self):
+        """
+        Launch blastn with the specified parameters and iterate
+        through the lines of its output while they are produced. If
+        the output format is not specified, the tabular one is used.
+
+        :return: an iterator to the output lines
+        """
+        parameters = dict(self.__parameters)
+        if parameters.get('-outfmt') is None:
+            parameters['-outfmt'] = 6
+        return stream_output(
+            ['blastn', '-query', self.__query, '-db',
+             self.__database] + map(str, list(chain.from_iterable(
+                 parameters.iteritems()))))
+
+
+class AlignmentCache(object):
+    """
+    The class implements an on-disk SQLite store of BLAST tabular
+    alignments of query sequences. Alignments of a query are stored
+    without its name and are keyed by the query sequence hash, the
+    database identity and the alignment parameters.
+    """
+
+    def __init__(self, filename):
+        """
+        Open an alignment cache file; it is created if it is missing.
+
+        :param filename: a name of the cache file
+        :type filename: str
+        """
+        self.__connection = sqlite3.connect(filename)
+        self.__connection.text_factory = str
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS alignments ('
+            'sequence_hash TEXT, database TEXT, parameters TEXT, '
+            'lines TEXT, '
+            'PRIMARY KEY (sequence_hash, database, parameters))')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the cache file.
+        """
+        self.__connection.close()
+
+    @staticmethod
+    def sequence_hash(seq):
+        """
+        Return the hash of a sequence.
+
+        :param seq: a nucleotide sequence
+        :type seq: str
+        :return: the sequence hash
+        :rtype: str
+        """
+        return hashlib.sha1(seq).hexdigest()
+
+    def get(self, sequence_hash, database, parameters):
+        """
+        Get alignment lines of a query sequence.
+
+        :param sequence_hash: the query sequence hash
+        :param database: the database identity
+        :param parameters: the alignment parameters
+        :type sequence_hash: str
+        :type database: str
+        :type parameters: str
+        :return: the alignment lines without query names or None if
+            the query is missing in the cache
+        :rtype: str
+        """
+        row = self.__connection.execute(
+            'SELECT lines FROM alignments WHERE sequence_hash = ? AND '
+            'database = ? AND parameters = ?',
+            (sequence_hash, database, parameters)).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, alignments, database, parameters):
+        """
+        Store alignment lines of query sequences.
+
+        :param alignments: an iterable of tuples of query sequence
+            hashes and their alignment lines without query names
+        :param database: the database identity
+        :param parameters: the alignment parameters
+        :type database: str
+        :type parameters: str
+        """
+        with self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO alignments VALUES (?, ?, ?, ?)',
+                ((i, database, parameters, j) for i, j in alignments))
+
+
+class CachedBlastN(object):
+    """
+    The class implements a wrapper to launch blastn which takes
+    alignments of unchanged query sequences from an alignment cache
+    and aligns only the remaining ones. The output is in the BLAST
+    tabular format which first column is the query name.
+    """
+
+    def __init__(self, query, database, cache_filename, output=None):
+        """
+        Create a CachedBlastN object to align the specified query to
+        the specified database.
+
+        :param query: a name of a FASTA file of query sequences to be
+            aligned
+        :param database: a name of a BLAST database to align the query
+            sequences to
+        :param cache_filename: a name of an alignment cache file
+        :param output: a name of an output file
+        :type query: str
+        :type database: str
+        :type cache_filename: str
+        :type output: str
+        """
+        self.__query = query
+        self.__database = database
+        self.__output = output
+        self.__cache_filename = cache_filename
+        self.__parameters = {}
+
+    def get(self, parameter):
+        """
+        Get a value of the specified parameter.
+
+        :param parameter: a parameter name
+        :type parameter: str
+        :return: the specified parameter value or None if it was not
+            specified
+        """
+        return self.__parameters.setdefault(parameter)
+
+    def set(self, parameter, value):
+        """
+        Set the value of a blastn option.
+
+        :param parameter: a parameter name
+        :param value: a parameter value
+        :type parameter: str
+        """
+        self.__parameters[parameter] = value
+
+    def __database_identity(self):
+        """
+        Return a line identifying the BLAST database by names, sizes
+        and modification times of its files.
+        """
+        files = sorted(glob.glob(self.__database + '.n*'))
+        if not files:
+            logger.error('BLAST database %s missing', self.__database)
+            raise AlignmentCacheError
+        identity = hashlib.sha1()
+        for i in files:
+            file_stat = os.stat(i)
+            identity.update('{}\t{}\t{!r}\n'.format(
+                os.path.basename(i), file_stat.st_size,
+                file_stat.st_mtime))
+        return identity.hexdigest()
+
+    def __parameter_line(self):
+        """
+        Return a line of the parameters that change alignments.
+        """
+        return ' '.join('{} {}'.format(i, self.__parameters[i]) for i in
+                        sorted(self.__parameters)
+                        if i != '-num_threads' and
+                        self.__parameters[i] is not None)
+
+    def alignments(self):
+        """
+        Iterate through the alignment lines of the query sequences in
+        their order; alignments of the sequences missing in the cache
+        are obtained by blastn and stored in the cache.
+
+        :return: an iterator to the alignment lines
+        """
+        import pyfaidx
+        if self.__parameters.get('-outfmt') is None:
+            self.__parameters['-outfmt'] = 6
+        if not str(self.__parameters['-outfmt']).startswith('6'):
+            logger.error('only the tabular output is cached')
+            raise AlignmentCacheError
+        database = self.__database_identity()
+        parameters = self.__parameter_line()
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            with AlignmentCache(self.__cache_filename) as cache:
+                # the query sequences are hashed, the ones missing in
+                # the cache are written to a temporary FASTA file
+                queries = []
+                missing = {}
+                missing_hashes = set()
+                missing_fasta = os.path.join(temp_dir, 'query.fa')
+                with open(missing_fasta, 'w') as fasta_file:
+                    for record in pyfaidx.Fasta(self.__query):
+                        sequence_hash = AlignmentCache.sequence_hash(
+                            record[:].seq)
+                        queries.append((record.name, sequence_hash))
+                        if sequence_hash in missing_hashes or \
+                                cache.get(sequence_hash, database,
+                                          parameters) is not None:
+                            continue
+                        missing[record.name] = sequence_hash
+                        missing_hashes.add(sequence_hash)
+                        fasta_file.write('>{}\n{}\n'.format(
+                            record.name, record[:].seq))
+                logger.info('%d of %d query sequences found in the '
+                            'alignment cache',
+                            len(queries) - len(missing), len(queries))
+
+                if missing:
+                    missing_output = os.path.join(temp_dir, 'output.txt')
+                    wrapper = BlastN(missing_fasta, self.__database,
+                                     missing_output)
+                    for i, j in self.__parameters.iteritems():
+                        wrapper.set(i, j)
+                    wrapper.launch()
+                    new_alignments = dict((i, []) for i in missing)
+                    with open(missing_output) as output_file:
+                        for line in output_file:
+                            name, alignment = line.split('\t', 1)
+                            if name not in new_alignments:
+                                logger.error('unknown query %s in the '
+                                             'blastn output', name)
+                                raise AlignmentCacheError
+                            new_alignments[name].append(alignment)
+                    cache.put(((missing[i], ''.join(j)) for i, j in
+                               new_alignments.iteritems()),
+                              database, parameters)
+
+                for name, sequence_hash in queries:
+                    for alignment in cache.get(
+                            sequence_hash, database,
+                            parameters).splitlines(True):
+                        yield name + '\t' + alignment
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def launch(self):
+        """
+        Launch blastn with the specified parameters for query
+        sequences missing in the cache and write the alignments of all
+        query sequences to the output file.
+        """
+        with open(self.__output, 'w') as output_file:
+            for line in self.alignments():
+                output_file.write(line)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import os
+import subprocess
+from chromosomer.wrapper.process import stream_output
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+class Minimap2(object):
+    """
+    The class implements a wrapper to launch minimap2 to align query
+    sequences to reference ones. The reference index is saved to an
+    .mmi file and reused by further launches while the reference
+    sequences and the indexing parameters are unchanged.
+    """
+
+    # parameters that change the reference index
+    index_parameters = ('-x', '-k', '-w', '-H', '-I')
+
+    def __init__(self, query, reference, output=None, index=None,
+                 threads=1):
+        """
+        Create a Minimap2 object to align the specified query to the
+        specified reference.
+
+        :param query: a name of a FASTA file of query sequences to be
+            aligned
+        :param reference: a name of a FASTA file of reference
+            sequences to align the query sequences to
+        :param output: a name of an output PAF file
+        :param index: a name of the reference index file; by default,
+            the reference file name with the .mmi extension
+        :param threads: the number of alignment threads
+        :type query: str
+        :type reference: str
+        :type output: str
+        :type index: str
+        :type threads: int
+        """
+        self.__query = query
+        self.__reference = reference
+        self.__output = output
+        self.__index = index or reference + '.mmi'
+        self.__threads = threads
+        self.__parameters = {}
+
+    def get(self, parameter):
+        """
+        Get a value of the specified parameter.
+
+        :param parameter: a parameter name
+        :type parameter: str
+        :return: the specified parameter value or None if it was not
+            specified
+        """
+        return self.__parameters.get(parameter)
+
+    def set(self, parameter, value):
+        """
+        Set the value of a minimap2 option. An option without an
+        argument (e.g., -c) is passed if its value is True and
+        omitted if it is False or None.
+
+        :param parameter: a parameter name
+        :param value: a parameter value
+        :type parameter: str
+        """
+        self.__parameters[parameter] = value
+
+    def __options(self, parameters=None):
+        """
+        Return a list of minimap2 options of the specified
+        parameters, all parameters by default.
+        """
+        if parameters is None:
+            parameters = sorted(self.__parameters)
+        options = ['-t', str(self.__threads)]
+        for i in parameters:
+            value = self.__parameters.get(i)
+            if value is True:
+                options.append(i)
+            elif value is not None and value is not False:
+                options.extend((i, str(value)))
+        return options
+
+    def __index_options(self):
+        """
+        Return a line describing the indexing parameters that is
+        saved next to the index.
+        """
+        return ' '.join(self.__options(self.index_parameters)[2:])
+
+    def index(self):
+        """
+        Build the reference index if it is missing or outdated and
+        return its file name.
+
+        :return: the index file name
+        :rtype: str
+        """
+        options_filename = self.__index + '.options'
+        index_options = self.__index_options()
+        if os.path.isfile(self.__index) and \
+                os.path.isfile(options_filename) and \
+                os.path.getmtime(self.__index) >= \
+                os.path.getmtime(self.__reference):
+            with open(options_filename) as options_file:
+                if options_file.read().rstrip('\n') == index_options:
+                    logger.debug('using the index %s', self.__index)
+                    return self.__index
+
+        logger.debug('building the index %s', self.__index)
+        subprocess.check_call(
+            ['minimap2'] + self.__options(self.index_parameters) +
+            ['-d', self.__index, self.__reference])
+        with open(options_filename, 'w') as options_file:
+            options_file.write(index_options + '\n')
+        return self.__index
+
+    def launch(self):
+        """
+        Launch minimap2 with the specified parameters and write the
+        alignments to the output file.
+        """
+        subprocess.check_call(['minimap2'] + self.__options() +
+                              ['-o', self.__output, self.index(),
+                               self.__query])
+
+    def alignments(self):
+        """
+        Launch minimap2 with the specified parameters and iterate
+        through the lines of PAF alignments while they are produced.
+
+        :return: an iterator to the PAF lines
+        """
+        return stream_output(['minimap2'] + self.__options() +
+                             [self.index(), self.__query])
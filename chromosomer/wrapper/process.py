@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import logging
+import subprocess
+from chromosomer.fileio import open_output
+
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+
+
+def stream_output(options, buffer_size=1 << 20):
+    """
+    Launch a program and iterate through lines of its standard output
+    while it is running. If the iteration is stopped before the
+    output ends, the program is terminated.
+
+    :param options: a list of the program name and its arguments
+    :param buffer_size: the size of the output buffer in bytes
+    :type options: list
+    :type buffer_size: int
+    :return: an iterator to the output lines
+    """
+    logger.debug('launching %s', ' '.join(options))
+    process = subprocess.Popen(options, stdout=subprocess.PIPE,
+                               bufsize=buffer_size)
+    completed = False
+    try:
+        for line in iter(process.stdout.readline, ''):
+            yield line
+        completed = True
+    finally:
+        process.stdout.close()
+        if not completed and process.poll() is None:
+            # the output was not read to its end
+            process.terminate()
+        process.wait()
+    if process.returncode:
+        logger.error('%s exited with code %d', options[0],
+                     process.returncode)
+        raise subprocess.CalledProcessError(process.returncode,
+                                            options[0])
+
+
+def tee_lines(lines, filename):
+    """
+    Iterate through lines and write them to a file at the same time.
+    The file is compressed if its name ends with .gz, .bgz, .bz2 or
+    .xz.
+
+    :param lines: an iterator to lines
+    :param filename: a name of a file to write the lines to
+    :type filename: str
+    :return: an iterator to the lines
+    """
+    with open_output(filename) as output_file:
+        for line in lines:
+            output_file.write(line)
+            yield line
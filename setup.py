@@ -31,7 +31,8 @@ setup(name='chromosomer',
 
       install_requires=['pyfaidx',
                         'future',
-                        'bioformats'],
+                        'bioformats',
+                        'numpy'],
 
       entry_points={
           'console_scripts': [
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import random
+import tempfile
+import unittest
+from bioformats.bed import Record
+from bioformats.blast import BlastTab
+from chromosomer.alignment import PafAlignments
+from chromosomer.alignment import ParallelBlastTab
+from chromosomer.alignment import add_best_alignment
+from chromosomer.alignment import skip_queries
+from chromosomer.columnar import ColumnarBlastTab
+from chromosomer.exception import AlignmentToMapError
+from chromosomer.fragment import AlignmentToMap
+from collections import OrderedDict
+from collections import defaultdict
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestParallelBlastTab(unittest.TestCase):
+    def setUp(self):
+        # create a BLAST tabular file of random alignments grouped by
+        # queries
+        self.__alignment_file = tempfile.mkstemp()[1]
+        template = '\t'.join(['{}'] * 12) + '\n'
+        with open(self.__alignment_file, 'w') as alignment_file:
+            for i in xrange(100):
+                for _ in xrange(random.randrange(1, 6)):
+                    alignment_file.write(template.format(
+                        'fragment{}'.format(i + 1),
+                        'chr{}'.format(random.randrange(1, 4)),
+                        100.0, 100, 0, 0, 1, 100,
+                        random.randrange(1, 1000),
+                        random.randrange(1, 1000),
+                        1e-50, float(random.randrange(50, 200))
+                    ))
+
+    def test_ranges(self):
+        """
+        Check that ranges cover the file and do not split queries.
+        """
+        reader = ParallelBlastTab(self.__alignment_file, 2, 7)
+        ranges = reader.ranges()
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1],
+                         os.path.getsize(self.__alignment_file))
+        queries = set()
+        with open(self.__alignment_file, 'rb') as alignment_file:
+            for start, end in ranges:
+                alignment_file.seek(start)
+                range_queries = set(
+                    i.split('\t', 1)[0] for i in
+                    alignment_file.read(end - start).splitlines())
+                self.assertFalse(queries & range_queries)
+                queries |= range_queries
+
+    def test_alignments(self):
+        """
+        Compare the parallel reading results to the sequential ones.
+        """
+        expected = OrderedDict()
+        with open(self.__alignment_file) as alignment_file:
+            for alignment in BlastTab(alignment_file).alignments():
+                expected[alignment.query] = add_best_alignment(
+                    expected.get(alignment.query, []), alignment)
+        expected = [i for j in expected.itervalues() for i in j]
+
+        reader = ParallelBlastTab(self.__alignment_file, 2, 7)
+        self.assertEqual(list(reader.alignments()), expected)
+
+    def test_skipped_queries(self):
+        """
+        Check that alignments of skipped queries are filtered out.
+        """
+        skipped = set('fragment{}'.format(i + 1) for i in xrange(50))
+        with open(self.__alignment_file) as alignment_file:
+            expected = list(BlastTab(skip_queries(
+                alignment_file, skipped)).alignments())
+        self.assertTrue(expected)
+        self.assertFalse(set(i.query for i in expected) & skipped)
+
+        reader = ParallelBlastTab(self.__alignment_file, 2, 7,
+                                  skipped_queries=skipped)
+        self.assertEqual(set(i.query for i in reader.alignments()),
+                         set(i.query for i in expected))
+
+    def tearDown(self):
+        os.unlink(self.__alignment_file)
+
+
+class TestColumnarBlastTab(unittest.TestCase):
+    def setUp(self):
+        # create a BLAST tabular file of random alignments which are
+        # not grouped by queries and have equal bit scores
+        self.__alignment_file = tempfile.mkstemp()[1]
+        self.__lengths = {}
+        template = '\t'.join(['{}'] * 12) + '\n'
+        random.seed(1)
+        with open(self.__alignment_file, 'w') as alignment_file:
+            alignment_file.write('# BLASTN\n')
+            for i in xrange(1000):
+                fragment = 'fragment{}'.format(random.randrange(200))
+                self.__lengths[fragment] = random.randrange(50, 150)
+                s_start = random.randrange(1, 1000)
+                alignment_file.write(template.format(
+                    fragment, 'chr{}'.format(random.randrange(1, 4)),
+                    100.0, 100, 0, 0, 1, 100, s_start,
+                    s_start + random.choice((-99, 99)),
+                    1e-50, float(random.choice((50, 100, 150)))
+                ))
+        self.__centromeres = {'chr1': Record('chr1', 500, 501,
+                                             *([None] * 9))}
+
+    def tearDown(self):
+        os.unlink(self.__alignment_file)
+
+    def test_best_alignments(self):
+        """
+        Compare the best alignments to the ones selected sequentially.
+        """
+        best_alignments = defaultdict(list)
+        with open(self.__alignment_file) as alignment_file:
+            for alignment in BlastTab(alignment_file).alignments():
+                best_alignments[alignment.query] = add_best_alignment(
+                    best_alignments[alignment.query], alignment)
+        for chunk_size in (100, 1 << 20):
+            self.assertEqual(
+                ColumnarBlastTab(self.__alignment_file,
+                                 chunk_size).best_alignments(),
+                best_alignments)
+
+    def test_blast(self):
+        """
+        Compare the columnar fragment map construction to the
+        sequential one.
+        """
+        result = []
+        for columnar in (False, True):
+            map_creator = AlignmentToMap(10, self.__lengths, 100,
+                                         self.__centromeres)
+            if columnar:
+                fragment_map, unlocalized, unplaced = \
+                    map_creator.blast_columnar(self.__alignment_file,
+                                               1.2, 1000)
+            else:
+                with open(self.__alignment_file) as alignment_file:
+                    fragment_map, unlocalized, unplaced = \
+                        map_creator.blast(BlastTab(alignment_file), 1.2)
+            result.append((
+                dict((i, list(fragment_map.fragments(i))) for i in
+                     fragment_map.chromosomes()),
+                unlocalized, unplaced))
+        self.assertEqual(result[0], result[1])
+        self.assertTrue(any(i.endswith('_2') for i in result[0][0]))
+
+
+class TestPafAlignments(unittest.TestCase):
+    def setUp(self):
+        self.__lines = [
+            'fragment1\t200\t0\t100\t+\tchr1\t1000\t10\t110\t90\t'
+            '100\t60\ttp:A:P\tAS:i:170\n',
+            'fragment1\t200\t100\t200\t-\tchr2\t1000\t500\t600\t'
+            '50\t100\t0\ttp:A:S\tAS:i:80\n',
+            'fragment2\t300\t0\t0\t*\t*\t0\t0\t0\t0\t0\t0\n'
+        ]
+
+    def test_alignments(self):
+        """
+        Check that PAF records are converted to BLAST alignments.
+        """
+        alignments = list(PafAlignments(self.__lines).alignments())
+        self.assertEqual(len(alignments), 2)
+        self.assertEqual(alignments[0], BlastTab.Alignment(
+            'fragment1', 'chr1', 90.0, 100, 10, 0, 1, 100, 11, 110,
+            0.0, 100.0))
+        # alignments to the reverse strand have swapped subject
+        # positions
+        self.assertEqual(alignments[1].q_start, 101)
+        self.assertEqual(alignments[1].q_end, 200)
+        self.assertEqual(alignments[1].s_start, 600)
+        self.assertEqual(alignments[1].s_end, 501)
+
+        for score, values in (('matches', [90.0, 50.0]),
+                              ('AS', [170.0, 80.0])):
+            self.assertEqual(
+                [i.bit_score for i in PafAlignments(
+                    self.__lines, score).alignments()], values)
+
+        with self.assertRaises(AlignmentToMapError):
+            PafAlignments(self.__lines, 'mapq')
+        with self.assertRaises(AlignmentToMapError):
+            list(PafAlignments(['fragment1\t200\t0\n']).alignments())
+        with self.assertRaises(AlignmentToMapError):
+            list(PafAlignments([self.__lines[0].replace(
+                '\tAS:i:170', '')], 'AS').alignments())
+
+    def test_blast(self):
+        """
+        Check that a fragment map is constructed from PAF alignments.
+        """
+        map_creator = AlignmentToMap(10, {'fragment1': 200,
+                                          'fragment2': 300})
+        fragment_map, unlocalized, unplaced = map_creator.blast(
+            PafAlignments(self.__lines, 'AS'), 1.2)
+        self.assertEqual(list(fragment_map.chromosomes()), ['chr1'])
+        record = list(fragment_map.fragments('chr1'))[0]
+        self.assertEqual(record.fr_name, 'fragment1')
+        self.assertEqual(record.fr_strand, '+')
+        self.assertEqual(record.fr_end, 200)
+        self.assertEqual(unlocalized, [])
+        self.assertEqual(unplaced, [])
+
+    def test_zero_score(self):
+        """
+        Check that alignments with zero scores are skipped.
+        """
+        lines = [self.__lines[0], self.__lines[1].replace('AS:i:80',
+                                                          'AS:i:0')]
+        self.assertEqual(
+            len(list(PafAlignments(lines, 'AS').alignments())), 1)
+        map_creator = AlignmentToMap(10, {'fragment1': 200})
+        fragment_map, unlocalized, unplaced = map_creator.blast(
+            PafAlignments(lines, 'AS'), 1.2)
+        self.assertEqual(
+            [i.fr_name for i in fragment_map.fragments('chr1')],
+            ['fragment1', 'GAP'])
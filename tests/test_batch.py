@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from chromosomer.batch import Batch
+from chromosomer.cli import create_parser
+from chromosomer.cli import run
+from chromosomer.exception import BatchError
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        self.__data = os.path.join(self.__dir, 'data')
+        os.mkdir(self.__data)
+        self.__jobs = [
+            {'name': 'simulate',
+             'args': ['simulator', '--seed', 1, 10, 100, 2,
+                      self.__data]},
+            ['fragmentmapbed', os.path.join(self.__data, 'map.txt'),
+             os.path.join(self.__dir, 'map.bed')],
+            ['fragmentmapstat', os.path.join(self.__data, 'map.txt'),
+             os.path.join(self.__dir, 'map_stat.txt')],
+            ['assemble', os.path.join(self.__data, 'map.txt'),
+             os.path.join(self.__data, 'fragments.fa'),
+             os.path.join(self.__dir, 'assembled.fa')]
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.__dir)
+
+    def test_dependencies(self):
+        """
+        Check that steps depend on steps writing files they use.
+        """
+        batch = Batch(self.__jobs, create_parser())
+        self.assertEqual([i.name for i in batch.steps],
+                         ['simulate', '2', '3', '4'])
+        self.assertEqual([i.dependencies for i in batch.steps],
+                         [[], [0], [0], [0]])
+
+        # the step writing the file read by the previous step
+        self.__jobs.append(['fragmentmapbed',
+                            os.path.join(self.__dir, 'map.bed'),
+                            os.path.join(self.__data, 'map.txt')])
+        # the step explicitly following another one
+        self.__jobs.append({'args': ['fastalength',
+                                     os.path.join(self.__dir, 'x.fa'),
+                                     os.path.join(self.__dir, 'x.txt')],
+                            'after': ['3']})
+        batch = Batch(self.__jobs, create_parser())
+        self.assertEqual(batch.steps[4].dependencies, [0, 1, 2, 3])
+        self.assertEqual(batch.steps[5].dependencies, [2])
+
+        # the steps creating the index of the same reference
+        reference = os.path.join(self.__dir, 'reference.fa')
+        batch = Batch([['pipeline', 'x.fa', reference, 10, 'x.txt'],
+                       ['pipeline', 'y.fa', reference, 10, 'y.txt']],
+                      create_parser())
+        self.assertEqual(batch.steps[1].dependencies, [0])
+
+    def test_incorrect(self):
+        """
+        Check that incorrect steps are rejected.
+        """
+        for jobs in ([['serve', 'map.txt']], [['unknown']], [[]],
+                     [{'args': ['fastalength', 'x.fa', 'x.txt'],
+                       'after': ['missing']}]):
+            with self.assertRaises(BatchError):
+                Batch(jobs, create_parser())
+
+    def test_run(self):
+        """
+        Check that steps of a batch are run.
+        """
+        jobs_filename = os.path.join(self.__dir, 'jobs.json')
+        with open(jobs_filename, 'w') as jobs_file:
+            json.dump({'steps': self.__jobs, 'workers': 2}, jobs_file)
+        Batch.read(jobs_filename, create_parser()).run(run)
+        for i in ('map.bed', 'map_stat.txt', 'assembled.fa'):
+            self.assertTrue(os.path.isfile(os.path.join(self.__dir,
+                                                        i)))
+        with open(os.path.join(self.__dir, 'assembled.fa')) as fasta:
+            self.assertEqual(sum(1 for i in fasta
+                                 if i.startswith('>')), 2)
+
+    def test_shared_index(self):
+        """
+        Check that concurrent steps reading the same unindexed FASTA
+        file get its complete index.
+        """
+        fasta = os.path.join(self.__dir, 'sequences.fa')
+        with open(fasta, 'w') as fasta_file:
+            for i in xrange(20000):
+                fasta_file.write('>seq{}\n{}\n'.format(i, 'A' * (i + 1)))
+        jobs = [['fastalength', fasta,
+                 os.path.join(self.__dir, 'lengths{}.txt'.format(i))]
+                for i in xrange(4)]
+        batch = Batch(jobs, create_parser())
+        self.assertEqual([i.dependencies for i in batch.steps],
+                         [[]] * 4)
+        batch.run(run, 4)
+        expected = ''.join('seq{}\t{}\r\n'.format(i, i + 1)
+                           for i in xrange(20000))
+        for i in xrange(4):
+            with open(os.path.join(self.__dir,
+                                   'lengths{}.txt'.format(i))) as \
+                    length_file:
+                self.assertEqual(length_file.read(), expected)
+
+    def test_failure(self):
+        """
+        Check that steps depending on a failed step are skipped.
+        """
+        self.__jobs[0] = ['fragmentmapbed',
+                          os.path.join(self.__dir, 'missing.txt'),
+                          os.path.join(self.__data, 'map.txt')]
+        with self.assertRaises(BatchError):
+            Batch(self.__jobs, create_parser()).run(run, 2)
+        self.assertFalse(os.path.exists(os.path.join(self.__dir,
+                                                     'map.bed')))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+from chromosomer.bench import Benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.__output = tempfile.mkstemp()[1]
+        # silence the logging message
+        logging.disable(logging.ERROR)
+
+    def test_write(self):
+        """
+        Check that benchmark results are written for every routine.
+        """
+        Benchmark([10, 20], fragment_length=100,
+                  chromosome_number=2).write(self.__output)
+        with open(self.__output) as output_file:
+            results = json.load(output_file)['results']
+        self.assertEqual(len(results), 18)
+        for i in results:
+            self.assertGreater(i['records'], 0)
+            self.assertGreater(i['peak_rss_kb'], 0)
+        self.assertIn('AlignmentToMap.blast',
+                      set(i['name'] for i in results))
+
+    def tearDown(self):
+        os.unlink(self.__output)
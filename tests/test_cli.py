@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestCliStartup(unittest.TestCase):
+    # modules that only subcommands should import
+    subcommand_modules = ('vcf', 'pyfaidx', 'bioformats.bed',
+                          'bioformats.gff3', 'chromosomer.fragment',
+                          'chromosomer.transfer', 'chromosomer.bench')
+
+    def test_imports(self):
+        """
+        Check that importing the command-line interface does not
+        import dependencies of its subcommands.
+        """
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import json, sys, time; start = time.time(); '
+            'import chromosomer.cli; '
+            'print(json.dumps({"seconds": time.time() - start, '
+            '"modules": sorted(sys.modules)}))'])
+        result = json.loads(output)
+        for module in self.subcommand_modules:
+            self.assertNotIn(module, result['modules'])
+
+
+# a stub of minimap2 that outputs alignments of two fragments; the
+# AS tags are output only if base-level alignment (-c) is requested
+MINIMAP2_STUB = """#!/bin/sh
+case "$*" in
+    *-d*) exit 0 ;;
+esac
+tag=""
+case " $* " in
+    *" -c "*) tag="\tAS:i:150" ;;
+esac
+printf "fragment1\t200\t0\t200\t-\tchr1\t1000\t10\t210\t190\t200\t60$tag\n"
+printf "fragment2\t300\t0\t300\t+\tchr1\t1000\t400\t700\t300\t300\t60$tag\n"
+"""
+
+
+class TestCliPipeline(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        stub = os.path.join(self.__dir, 'minimap2')
+        with open(stub, 'w') as stub_file:
+            stub_file.write(MINIMAP2_STUB)
+        os.chmod(stub, 0o755)
+        self.__fragments = os.path.join(self.__dir, 'fragments.fa')
+        with open(self.__fragments, 'w') as fasta_file:
+            fasta_file.write('>fragment1\n{}\n>fragment2\n{}\n'.format(
+                'A' * 200, 'C' * 300))
+
+    def tearDown(self):
+        shutil.rmtree(self.__dir)
+
+    def test_pipeline(self):
+        """
+        Check that a fragment map is constructed from the aligner
+        output and the output is archived.
+        """
+        env = dict(os.environ)
+        env['PATH'] = self.__dir + os.pathsep + env['PATH']
+        output_map = os.path.join(self.__dir, 'map.txt')
+        archive = os.path.join(self.__dir, 'alignments.paf.gz')
+        subprocess.check_call([
+            sys.executable, '-c',
+            'from chromosomer.cli import chromosomer; chromosomer()',
+            'pipeline', '-a', 'minimap2', '--archive', archive,
+            self.__fragments, self.__fragments, '10', output_map],
+            env=env)
+        with open(output_map) as map_file:
+            records = [i.split('\t') for i in map_file]
+        self.assertEqual([(i[0], i[4]) for i in records],
+                         [('fragment1', '-'), ('GAP', '+'),
+                          ('fragment2', '+'), ('GAP', '+')])
+        with gzip.open(archive) as archive_file:
+            self.assertEqual(len(archive_file.readlines()), 2)
+
+    def test_pipeline_as_score(self):
+        """
+        Check that minimap2 is launched with base-level alignment if
+        alignment scores are taken from the AS tags.
+        """
+        env = dict(os.environ)
+        env['PATH'] = self.__dir + os.pathsep + env['PATH']
+        output_map = os.path.join(self.__dir, 'map.txt')
+        subprocess.check_call([
+            sys.executable, '-c',
+            'from chromosomer.cli import chromosomer; chromosomer()',
+            'pipeline', '-a', 'minimap2', '--paf_score', 'AS',
+            self.__fragments, self.__fragments, '10', output_map],
+            env=env)
+        with open(output_map) as map_file:
+            self.assertEqual([i.split('\t')[0] for i in map_file],
+                             ['fragment1', 'GAP', 'fragment2', 'GAP'])
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import shutil
+import tempfile
+import unittest
+from chromosomer.cli import create_parser
+from chromosomer.cli import run
+from chromosomer.fileio import detect_compression
+from chromosomer.fileio import open_input
+from chromosomer.fileio import open_output
+from chromosomer.fileio import output_compression
+from chromosomer.fileio import uncompressed_output
+from chromosomer.fragment import Map
+from distutils.spawn import find_executable
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestFileIO(unittest.TestCase):
+    def setUp(self):
+        self.__dir = tempfile.mkdtemp()
+        self.__lines = ['line{}\n'.format(i) for i in xrange(1000)]
+        self.__path = os.environ['PATH']
+
+    def tearDown(self):
+        os.environ['PATH'] = self.__path
+        shutil.rmtree(self.__dir)
+
+    def __formats(self):
+        formats = ['.gz', '.bz2']
+        if find_executable('xz') is not None:
+            formats.append('.xz')
+        return formats
+
+    def __write_read(self, extension):
+        filename = os.path.join(self.__dir, 'test.txt' + extension)
+        with open_output(filename) as output_file:
+            for line in self.__lines:
+                output_file.write(line)
+        self.assertEqual(detect_compression(filename),
+                         output_compression(filename))
+        with open_input(filename) as input_file:
+            self.assertEqual(list(input_file), self.__lines)
+        # a file which is not read to its end is closed
+        with open_input(filename) as input_file:
+            self.assertEqual(input_file.readline(), self.__lines[0])
+
+    def test_compression(self):
+        """
+        Check writing and reading compressed files by external
+        programs.
+        """
+        self.__write_read('')
+        for extension in self.__formats():
+            self.__write_read(extension)
+
+    def test_fallback(self):
+        """
+        Check writing and reading compressed files by the Python
+        standard library.
+        """
+        os.environ['PATH'] = self.__dir
+        for extension in ('.gz', '.bz2'):
+            self.__write_read(extension)
+
+    def test_uncompressed_output(self):
+        """
+        Check that files written by their names are compressed.
+        """
+        filename = os.path.join(self.__dir, 'test.txt.gz')
+        with uncompressed_output(filename) as plain_filename:
+            self.assertNotEqual(plain_filename, filename)
+            with open(plain_filename, 'w') as output_file:
+                output_file.writelines(self.__lines)
+        self.assertFalse(os.path.exists(plain_filename))
+        self.assertEqual(detect_compression(filename), 'gzip')
+        with open_input(filename) as input_file:
+            self.assertEqual(input_file.readlines(), self.__lines)
+
+        filename = os.path.join(self.__dir, 'test.txt')
+        with uncompressed_output(filename) as plain_filename:
+            self.assertEqual(plain_filename, filename)
+
+    def test_map(self):
+        """
+        Check writing and reading a compressed fragment map.
+        """
+        fragment_map = Map()
+        fragment_map.read(os.path.join(
+            'data', 'fragment_map', 'fragment_map_line.txt'))
+        for extension in self.__formats():
+            filename = os.path.join(self.__dir, 'map.txt' + extension)
+            fragment_map.write(filename)
+            compressed_map = Map()
+            compressed_map.read(filename)
+            self.assertEqual(
+                [list(compressed_map.fragments(i)) for i in
+                 compressed_map.chromosomes()],
+                [list(fragment_map.fragments(i)) for i in
+                 fragment_map.chromosomes()])
+
+    def test_vcf_transfer(self):
+        """
+        Check transferring variants from a compressed VCF file.
+        """
+        vcf_filename = os.path.join(self.__dir, 'variants.vcf.gz')
+        with open_output(vcf_filename) as vcf_file:
+            vcf_file.write('##fileformat=VCFv4.1\n'
+                           '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER'
+                           '\tINFO\n'
+                           'fragment1\t11\t.\tA\tC\t.\t.\t.\n')
+        map_filename = os.path.join('data', 'fragment_map',
+                                    'fragment_map_line.txt')
+        output_filename = os.path.join(self.__dir, 'output.vcf')
+        args = create_parser().parse_args([
+            'transfer', '-f', 'vcf', map_filename, vcf_filename,
+            output_filename])
+        for program_path in (self.__path, self.__dir):
+            os.environ['PATH'] = program_path
+            run(args)
+            with open(output_filename) as output_file:
+                records = [i.split('\t')[:2] for i in output_file
+                           if not i.startswith('#')]
+            self.assertEqual(records, [['chr1', '5011']])
@@ -6,6 +6,7 @@
 
 import os
 import glob
+import gzip
 import logging
 import pyfaidx
 import random
@@ -19,9 +20,12 @@ from bioformats.fasta import Writer
 from chromosomer.fragment import AlignmentToMap
 from chromosomer.fragment import AlignmentToMapError
 from chromosomer.fragment import SeqLengths
+from chromosomer.fragment import SeqLengthsError
+from chromosomer.fragment import index_fasta
 from chromosomer.fragment import Map
 from chromosomer.fragment import MapError
 from chromosomer.fragment import Simulator
+from chromosomer.exception import UnsortedMapError
 from chromosomer.wrapper.blast import BlastN
 from chromosomer.wrapper.blast import MakeBlastDb
 from itertools import izip
@@ -129,6 +133,77 @@ class TestFragmentMap(unittest.TestCase):
             for _ in reader.records():
                 pass
 
+    def __unsorted_map(self):
+        """
+        Write a fragment map file which records are not sorted.
+        """
+        records = []
+        for chromosome in ('chr1', 'chr2'):
+            for i in xrange(5):
+                records.append(Map.Record(
+                    'fragment{}'.format(len(records) + 1), 100, 0, 100,
+                    '+', chromosome, i * 110, i * 110 + 100))
+                records.append(Map.Record(
+                    'GAP', 10, 0, 10, '+', chromosome, i * 110 + 100,
+                    i * 110 + 110))
+        random.seed(1)
+        random.shuffle(records)
+        template = '\t'.join(['{}'] * len(Map.record_names)) + '\n'
+        with open(self.__output_file, 'w') as map_file:
+            for record in records:
+                map_file.write(template.format(*record))
+
+    def test_iter_file(self):
+        """
+        Test the Map file iterator.
+        """
+        self.assertEqual(list(Map.iter_file(self.__test_line, True)),
+                         [Map.Record('fragment1', 180, 0, 180, '+',
+                                     'chr1', 5000, 5180)])
+        self.__unsorted_map()
+        self.assertEqual(len(list(Map.iter_file(self.__output_file))),
+                         20)
+        with self.assertRaises(UnsortedMapError):
+            list(Map.iter_file(self.__output_file, True))
+        for i in self.__incorrect_files:
+            with self.assertRaises(MapError):
+                list(Map.iter_file(os.path.join(
+                    self.__incorrect_file_dir, i)))
+
+    def test_file_summary(self):
+        """
+        Test the summary routine of a map file.
+        """
+        self.__unsorted_map()
+        fragment_map = Map()
+        fragment_map.read(self.__output_file)
+        summary = Map.file_summary(self.__output_file)
+        self.assertEqual(summary, fragment_map.summary())
+        self.assertEqual(summary['chr1'], (10, 50, 550))
+
+    def test_convert_file2bed(self):
+        """
+        Test the BED conversion routine of a map file.
+        """
+        self.__unsorted_map()
+        fragment_map = Map()
+        fragment_map.read(self.__output_file)
+        bed_filename = self.__output_file + '.bed'
+        results = []
+        for sort_map in (False, True):
+            if sort_map:
+                fragment_map.write(self.__output_file)
+            Map.convert_file2bed(self.__output_file, bed_filename)
+            with open(bed_filename) as bed_file:
+                results.append(bed_file.read())
+        fragment_map.convert2bed(bed_filename)
+        with open(bed_filename) as bed_file:
+            results.append(bed_file.read())
+        os.unlink(bed_filename)
+        self.assertEqual(len(results[0].splitlines()), 20)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
     def test_write(self):
         """
         Test the Map writing routine.
@@ -244,6 +319,74 @@ class TestFragmentMap(unittest.TestCase):
         os.unlink(output_fragments)
         os.unlink(output_fragments + '.fai')
 
+    def test_assemble_incremental(self):
+        """
+        Test the incremental mode of the assemble routine.
+        """
+        fragments = {'fragment1': 'ACGTACGTAC',
+                     'fragment2': 'GGGTTTCCCA'}
+        output_fragments = os.path.join(self.__output_dir,
+                                        'temp_fragments.txt')
+        output_chromosomes = os.path.join(self.__output_dir,
+                                          'temp_chromosomes.txt')
+        with Writer(output_fragments) as writer:
+            for i, j in fragments.iteritems():
+                writer.write(i, j)
+
+        fragment_map = Map()
+        fragment_map.add_record(Map.Record(
+            'fragment1', 10, 0, 10, '+', 'chr1', 0, 10))
+        fragment_map.add_record(Map.Record(
+            'fragment2', 10, 0, 10, '-', 'chr2', 0, 10))
+
+        fragment_map.assemble(output_fragments, output_chromosomes,
+                              incremental=True)
+        self.assertTrue(os.path.isfile(output_chromosomes +
+                                       '.hashes'))
+        with open(output_chromosomes) as chromosome_file:
+            first_output = chromosome_file.read()
+
+        # the second run reuses both chromosomes and must produce the
+        # same output
+        fragment_map.assemble(output_fragments, output_chromosomes,
+                              incremental=True)
+        with open(output_chromosomes) as chromosome_file:
+            self.assertEqual(first_output, chromosome_file.read())
+
+        # change one chromosome and check that it is reassembled
+        fragment_map.add_record(Map.Record(
+            'GAP', 5, 0, 5, '+', 'chr1', 10, 15))
+        fragment_map.assemble(output_fragments, output_chromosomes,
+                              incremental=True)
+        assembled_chromosomes = pyfaidx.Fasta(output_chromosomes)
+        self.assertEqual(assembled_chromosomes['chr1'][:].seq,
+                         'ACGTACGTACNNNNN')
+        self.assertEqual(assembled_chromosomes['chr2'][:].seq,
+                         'TGGGAAACCC')
+        assembled_chromosomes.close()
+
+        # the fragment FASTA file is closed after every run, so
+        # editing fragments and reassembling does not leak handles
+        def open_handles():
+            return [i for i in os.listdir('/proc/self/fd') if
+                    os.path.realpath(os.path.join('/proc/self/fd', i))
+                    == os.path.realpath(output_fragments)]
+
+        for i in xrange(3):
+            with Writer(output_fragments) as writer:
+                for name, seq in fragments.iteritems():
+                    writer.write(name, seq[i:] + seq[:i])
+            fragment_map.assemble(output_fragments, output_chromosomes,
+                                  incremental=True)
+            if os.path.isdir('/proc/self/fd'):
+                self.assertEqual(open_handles(), [])
+
+        for i in (output_chromosomes, output_chromosomes + '.fai',
+                  output_chromosomes + '.hashes', output_fragments,
+                  output_fragments + '.fai'):
+            if os.path.isfile(i):
+                os.unlink(i)
+
     def tearDown(self):
         if os.path.isfile(self.__output_file):
             os.unlink(self.__output_file)
@@ -271,8 +414,51 @@ class TestFragmentLength(unittest.TestCase):
         for i in lengths.itervalues():
             self.assertEqual(i, self.__fragment_length)
 
+    def test_index_lengths(self):
+        """
+        Test the lengths method applied to a FASTA index file.
+        """
+        fasta_lengths = SeqLengths(self.__fasta_temp).lengths()
+        index_lengths = SeqLengths(self.__fasta_temp + '.fai').lengths()
+        self.assertEqual(fasta_lengths, index_lengths)
+
+    def test_index_fasta(self):
+        """
+        Test the FASTA indexing routine against pyfaidx.
+        """
+        index_file = tempfile.mkstemp()[1]
+        index_fasta(self.__fasta_temp, index_file)
+        pyfaidx.Faidx(self.__fasta_temp).close()
+        with open(index_file) as x:
+            with open(self.__fasta_temp + '.fai') as y:
+                self.assertEqual(x.read(), y.read())
+
+        # check if lines of different lengths are processed correctly
+        with open(self.__fasta_temp, 'w') as fasta_file:
+            fasta_file.write('>seq1\nACGT\nAC\nACGT\n')
+        with self.assertRaises(SeqLengthsError):
+            index_fasta(self.__fasta_temp, index_file)
+        self.assertFalse(os.path.isfile(index_file))
+
+    def test_compressed(self):
+        """
+        Check that a compressed FASTA file is rejected.
+        """
+        gzip_filename = self.__fasta_temp + '.gz'
+        with open(self.__fasta_temp) as fasta_file:
+            with gzip.open(gzip_filename, 'wb') as gzip_file:
+                gzip_file.write(fasta_file.read())
+        try:
+            with self.assertRaises(SeqLengthsError):
+                SeqLengths(gzip_filename).lengths()
+            self.assertFalse(os.path.isfile(gzip_filename + '.fai'))
+        finally:
+            os.unlink(gzip_filename)
+
     def tearDown(self):
         os.unlink(self.__fasta_temp)
+        if os.path.isfile(self.__fasta_temp + '.fai'):
+            os.unlink(self.__fasta_temp + '.fai')
 
 
 class TestFragmentSimulator(unittest.TestCase):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import pyfaidx
+import random
+import shutil
+import tempfile
+import unittest
+from bioformats.fasta import Writer
+from chromosomer.exception import MapError
+from chromosomer.fragment import Map
+from chromosomer.genome import AssembledGenome
+from chromosomer.simulator import StreamSimulator
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestAssembledGenome(unittest.TestCase):
+    def setUp(self):
+        self.__output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__output_dir)
+
+    def test_fetch(self):
+        """
+        Test fetching regions of fragments placed with offsets and
+        on the reverse strand.
+        """
+        fragment_file = os.path.join(self.__output_dir, 'fragments.fa')
+        with Writer(fragment_file) as fragment_writer:
+            fragment_writer.write('f', 'AACCGGTTac')
+        fragment_map = Map()
+        for record in (('f', 10, 2, 6, '+', 'chr1', 0, 4),
+                       ('GAP', 3, 0, 3, '+', 'chr1', 4, 7),
+                       ('f', 10, 6, 10, '-', 'chr1', 7, 11)):
+            fragment_map.add_record(Map.Record(*record))
+
+        with AssembledGenome(fragment_map, fragment_file,
+                             block_size=3, cache_size=2) as genome:
+            self.assertEqual(genome.keys(), ['chr1'])
+            self.assertEqual(len(genome['chr1']), 11)
+            self.assertEqual(genome.fetch('chr1', 0, 11), 'CCGGNNNGTAA')
+            self.assertEqual(genome.fetch('chr1', 3, 9), 'GNNNGT')
+            self.assertEqual(genome.fetch('chr1', 9, 20), 'AA')
+            self.assertEqual(genome['chr1'][-2].seq, 'A')
+            self.assertEqual(str(genome['chr1']), 'CCGGNNNGTAA')
+            with self.assertRaises(MapError):
+                genome.fetch('chr2', 0, 10)
+        with AssembledGenome(fragment_map, fragment_file,
+                             save_soft_mask=True) as genome:
+            self.assertEqual(genome.fetch('chr1', 7, 11), 'gtAA')
+
+    def test_assemble(self):
+        """
+        Compare the genome with chromosomes written by the assembling
+        routine.
+        """
+        filenames = [os.path.join(self.__output_dir, i) for i in
+                     ('map.txt', 'fragments.fa', 'chromosomes.fa')]
+        simulator = StreamSimulator(100, 30, 3, 5, 10, seed=1)
+        simulator.write(*filenames)
+        fragment_map = Map()
+        fragment_map.read(filenames[0])
+        assembled_file = os.path.join(self.__output_dir, 'assembled.fa')
+        fragment_map.assemble(filenames[1], assembled_file)
+
+        assembled = pyfaidx.Fasta(assembled_file)
+        random.seed(1)
+        with AssembledGenome(filenames[0], filenames[1],
+                             block_size=64) as genome:
+            for chromosome in genome:
+                self.assertEqual(len(chromosome),
+                                 len(assembled[chromosome.name]))
+                self.assertEqual(str(chromosome),
+                                 str(assembled[chromosome.name]))
+                for _ in xrange(20):
+                    start = random.randrange(len(chromosome))
+                    end = random.randrange(start, len(chromosome) + 1)
+                    self.assertEqual(
+                        chromosome[start:end].seq,
+                        assembled[chromosome.name][start:end].seq)
+        assembled.close()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import numpy as np
+import os
+import random
+import tempfile
+import unittest
+from chromosomer.fragment import Map
+from chromosomer.mapstat import MapStatistics
+from chromosomer.mapstat import grouped_n50
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+def naive_n50(lengths):
+    """
+    Compute N50 and L50 values by their definition.
+    """
+    lengths = sorted(lengths, reverse=True)
+    total = 0
+    for i, length in enumerate(lengths):
+        total += length
+        if 2 * total >= sum(lengths):
+            return length, i + 1
+    return 0, 0
+
+
+class TestMapStatistics(unittest.TestCase):
+    def setUp(self):
+        # two chromosomes of fragments separated by gaps
+        self.__records = []
+        for chromosome, lengths, strands in (
+                ('chr1', (100, 2000, 300), '+-+'),
+                ('chr2', (50000, ), '-')):
+            position = 0
+            for length, strand in zip(lengths, strands):
+                self.__records.append(Map.Record(
+                    'fragment{}'.format(len(self.__records)), length,
+                    0, length, strand, chromosome, position,
+                    position + length))
+                position += length
+                self.__records.append(Map.Record(
+                    'GAP', 10, 0, 10, '+', chromosome, position,
+                    position + 10))
+                position += 10
+        self.__output_file = tempfile.mkstemp()[1]
+
+    def tearDown(self):
+        os.unlink(self.__output_file)
+
+    def test_grouped_n50(self):
+        """
+        Compare N50 and L50 values to the ones computed by their
+        definition.
+        """
+        random.seed(1)
+        lengths = [random.randrange(1, 1000) for _ in xrange(1000)]
+        groups = [random.randrange(5) for _ in xrange(1000)]
+        n50_values, l50_values = grouped_n50(
+            np.array(lengths), np.array(groups), 6)
+        for i in xrange(6):
+            self.assertEqual(
+                (n50_values[i], l50_values[i]),
+                naive_n50([j for j, k in zip(lengths, groups)
+                           if k == i]))
+
+    def test_result(self):
+        """
+        Check the statistics of the fragment map records.
+        """
+        for chunk_size in (1, 3, 100):
+            statistics = MapStatistics((1000, 10000), chunk_size)
+            statistics.add(reversed(self.__records))
+            result = statistics.result()
+            self.assertEqual(result['total']['fragments'], 4)
+            self.assertEqual(result['total']['gaps'], 4)
+            self.assertEqual(result['total']['n50'], 50000)
+            self.assertEqual(result['total']['l50'], 1)
+            self.assertEqual(
+                [i['fragments'] for i in result['total']['histogram']],
+                [2, 1, 1])
+            chr1 = result['chromosomes']['chr1']
+            self.assertEqual(chr1['length'], 2430)
+            self.assertEqual(chr1['placed_length'], 2400)
+            self.assertEqual(chr1['gap_length'], 30)
+            self.assertEqual(chr1['n50'], 2000)
+            self.assertEqual(chr1['l50'], 1)
+            self.assertEqual(chr1['plus_fragments'], 2)
+            self.assertEqual(chr1['minus_fragments'], 1)
+            self.assertAlmostEqual(chr1['plus_fraction'], 2.0 / 3)
+            self.assertAlmostEqual(chr1['placed_percent'],
+                                   100.0 * 2400 / 2430)
+
+    def test_file_statistics(self):
+        """
+        Check the statistics of a fragment map file.
+        """
+        fragment_map = Map()
+        for record in self.__records:
+            fragment_map.add_record(record)
+        fragment_map.write(self.__output_file)
+        statistics = MapStatistics()
+        statistics.add(self.__records)
+        self.assertEqual(
+            MapStatistics.file_statistics(self.__output_file),
+            statistics.result())
+        summary = fragment_map.summary()
+        for chromosome, values in statistics.result()[
+                'chromosomes'].iteritems():
+            self.assertEqual(summary[chromosome][2], values['length'])
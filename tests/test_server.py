@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import bioformats.bed
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from chromosomer.exception import TransferServerError
+from chromosomer.server import TransferClient
+from chromosomer.server import TransferServer
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestTransferServer(unittest.TestCase):
+    def setUp(self):
+        self.__map_file = os.path.join(
+            'data', 'fragment_map', 'fragment_map_line.txt')
+        self.__server = TransferServer({'line': self.__map_file})
+        self.__temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__temp_dir)
+
+    def __check_requests(self, address):
+        """
+        Launch the server on the specified address and check its
+        responses to client requests.
+        """
+        address = self.__server.bind(address)
+        server_thread = threading.Thread(
+            target=self.__server.serve_forever)
+        server_thread.start()
+        try:
+            with TransferClient(address) as client:
+                self.assertEqual(client.maps(), ['line'])
+                self.assertEqual(
+                    client.coordinates('line', [['fragment1', 10],
+                                                ['fragment2', 10]]),
+                    [('chr1', 5010), None])
+                feature = bioformats.bed.Record(
+                    'fragment1', 10, 20, 'feature', None, '+',
+                    *([None] * 6))
+                transferred = client.features('line', 'bed', [feature])
+                self.assertEqual(len(transferred), 1)
+                self.assertEqual(transferred[0].seq, 'chr1')
+                self.assertEqual(transferred[0].start, 5010)
+                self.assertEqual(transferred[0].end, 5020)
+                with self.assertRaises(TransferServerError):
+                    client.coordinates('missing', [['fragment1', 10]])
+        finally:
+            self.__server.shutdown()
+            server_thread.join()
+
+    def test_tcp(self):
+        """
+        Test requests to the server on a TCP socket.
+        """
+        self.__check_requests(('127.0.0.1', 0))
+
+    def test_unix(self):
+        """
+        Test requests to the server on a Unix socket.
+        """
+        self.__check_requests(os.path.join(self.__temp_dir, 'socket'))
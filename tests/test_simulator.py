@@ -6,10 +6,17 @@
 
 import chromosomer.cli
 import os
+import pyfaidx
 import shutil
 import sys
 import tempfile
 import unittest
+import vcf
+from bioformats.bed import Reader
+from bioformats.blast import BlastTab
+from chromosomer.fragment import AlignmentToMap
+from chromosomer.fragment import Map
+from chromosomer.simulator import StreamSimulator
 
 
 class TestFragmentSimulator(unittest.TestCase):
@@ -26,3 +33,90 @@ class TestFragmentSimulator(unittest.TestCase):
     def tearDown(self):
         if os.path.isdir(self.__output_dir):
             shutil.rmtree(self.__output_dir)
+
+
+class TestStreamSimulator(unittest.TestCase):
+    def setUp(self):
+        self.__output_dir = tempfile.mkdtemp()
+
+    def __write(self, prefix, seed):
+        """
+        Simulate data with the specified seed and return names of the
+        produced files.
+        """
+        simulator = StreamSimulator(50, 20, 3, 5, 10, seed=seed,
+                                    length_distribution='uniform',
+                                    chunk_size=16)
+        filenames = [os.path.join(self.__output_dir, prefix + i)
+                     for i in ('map.txt', 'fragments.fa',
+                               'chromosomes.fa')]
+        simulator.write(*filenames)
+        return filenames
+
+    def test_write(self):
+        """
+        Check that the simulated chromosomes are assembled from the
+        simulated map and fragments.
+        """
+        map_file, fragment_file, chromosome_file = self.__write('a_',
+                                                                1)
+        fragment_map = Map()
+        fragment_map.read(map_file)
+        assembled_file = os.path.join(self.__output_dir,
+                                      'assembled.fa')
+        fragment_map.assemble(fragment_file, assembled_file)
+        assembled = pyfaidx.Fasta(assembled_file)
+        simulated = pyfaidx.Fasta(chromosome_file)
+        self.assertEqual(sorted(assembled.keys()),
+                         sorted(simulated.keys()))
+        for i in simulated.keys():
+            self.assertEqual(assembled[i][:].seq, simulated[i][:].seq)
+
+    def test_seed(self):
+        """
+        Check that the same seed produces the same data.
+        """
+        for x, y in zip(self.__write('a_', 1), self.__write('b_', 1)):
+            with open(x) as x_file:
+                with open(y) as y_file:
+                    self.assertEqual(x_file.read(), y_file.read())
+
+    def test_alignments(self):
+        """
+        Check that a fragment map constructed from the simulated
+        alignments is the simulated one.
+        """
+        simulator = StreamSimulator(50, 20, 3, 5, 10, seed=2)
+        map_file, alignment_file = [
+            os.path.join(self.__output_dir, i) for i in
+            ('map.txt', 'alignments.txt')]
+        simulator.write(map_file, os.devnull, os.devnull)
+        simulator.write_alignments(alignment_file, decoy_number=3)
+
+        lengths = dict((simulator.fragment_name(i),
+                        simulator.fragment_length(i))
+                       for i in xrange(25))
+        with open(alignment_file) as alignment_file:
+            new_map, _, unplaced = AlignmentToMap(10, lengths).blast(
+                BlastTab(alignment_file), 1.2)
+        orig_map = Map()
+        orig_map.read(map_file)
+        for i in orig_map.chromosomes():
+            self.assertEqual(list(orig_map.fragments(i)),
+                             list(new_map.fragments(i)))
+
+    def test_features(self):
+        """
+        Check that the simulated features are written.
+        """
+        simulator = StreamSimulator(50, 20, 3, 5, 10, seed=3)
+        filenames = [os.path.join(self.__output_dir, 'features.' + i)
+                     for i in ('bed', 'gff3', 'vcf')]
+        simulator.write_features(2, *filenames)
+        with open(filenames[0]) as bed_file:
+            self.assertEqual(len(list(Reader(bed_file).records())), 50)
+        with open(filenames[2]) as vcf_file:
+            self.assertEqual(len(list(vcf.Reader(vcf_file))), 50)
+
+    def tearDown(self):
+        shutil.rmtree(self.__output_dir)
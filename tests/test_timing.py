@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import unittest
+from chromosomer.fragment import Map
+from chromosomer.timing import Profiler
+from chromosomer.timing import ProgressReporter
+from chromosomer.timing import format_seconds
+from chromosomer.timing import profiler
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_phase(self):
+        """
+        Check that phase timings are collected only by an enabled
+        profiler.
+        """
+        test_profiler = Profiler()
+        with test_profiler.phase('test'):
+            pass
+        self.assertEqual(test_profiler.summary()['phases'], [])
+
+        test_profiler.enable()
+        for _ in xrange(2):
+            with test_profiler.phase('test'):
+                pass
+        phases = test_profiler.summary()['phases']
+        self.assertEqual(len(phases), 1)
+        self.assertEqual(phases[0]['name'], 'test')
+        self.assertEqual(phases[0]['calls'], 2)
+        self.assertGreater(test_profiler.summary()['peak_rss_kb'], 0)
+
+    def test_map_hooks(self):
+        """
+        Check that the Map routines report their phases.
+        """
+        profiler.reset()
+        profiler.enable()
+        try:
+            fragment_map = Map()
+            fragment_map.read(os.path.join(
+                'data', 'fragment_map', 'fragment_map_line.txt'))
+        finally:
+            profiler.disable()
+        self.assertIn('map load', [i['name'] for i in
+                                   profiler.summary()['phases']])
+        profiler.reset()
+
+
+class TestProgress(unittest.TestCase):
+    def test_start(self):
+        """
+        Check that a disabled reporter returns a progress object that
+        does nothing.
+        """
+        reporter = ProgressReporter()
+        self.assertIs(reporter.start('test'), reporter.null_progress)
+        lines = ['a\n', 'bc\n']
+        self.assertIs(reporter.start('test').lines(lines), lines)
+
+    def test_update(self):
+        """
+        Check that an enabled reporter counts records and bytes.
+        """
+        reporter = ProgressReporter()
+        reporter.enable(0)
+        test_progress = reporter.start('test', total_bytes=10)
+        for _ in test_progress.lines(['a\n', 'bc\n']):
+            test_progress.update()
+        test_progress.finish()
+        self.assertEqual(test_progress.records, 2)
+        self.assertEqual(test_progress.bytes, 5)
+
+    def test_format_seconds(self):
+        self.assertEqual(format_seconds(3725.5), '01:02:05')
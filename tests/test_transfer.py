@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2016 by Gaik Tamazian
+# gaik (dot) tamazian (at) gmail (dot) com
+
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from bioformats.bed import Record
+from chromosomer.exception import TransferError
+from chromosomer.fragment import Map
+from chromosomer.transfer import BedTransfer
+from chromosomer.transfer import Gff3Transfer
+from chromosomer.transfer import MapCache
+from chromosomer.transfer import map_cache
+
+path = os.path.dirname(__file__)
+os.chdir(path)
+
+
+class TestMapCache(unittest.TestCase):
+    def setUp(self):
+        self.__temp_dir = tempfile.mkdtemp()
+        self.__map_files = []
+        for i in xrange(2):
+            map_file = os.path.join(self.__temp_dir,
+                                    'map{}.txt'.format(i))
+            shutil.copy(os.path.join('data', 'fragment_map',
+                                     'fragment_map_line.txt'),
+                        map_file)
+            self.__map_files.append(map_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.__temp_dir)
+
+    def test_get(self):
+        """
+        Check that a map is read once and read again after its file
+        is changed.
+        """
+        cache = MapCache()
+        fragment_map = cache.get(self.__map_files[0])
+        self.assertIs(cache.get(self.__map_files[0]), fragment_map)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+        with open(self.__map_files[0], 'a') as map_file:
+            map_file.write('fragment2\t100\t0\t100\t+\tchr2\t0\t100\n')
+        changed_map = cache.get(self.__map_files[0])
+        self.assertIsNot(changed_map, fragment_map)
+        self.assertIsNotNone(changed_map.find_fragment('fragment2'))
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual(cache.stats()['maps'], 1)
+
+    def test_budget(self):
+        """
+        Check that the least recently used maps are evicted.
+        """
+        cache = MapCache(MapCache.record_size)
+        cache.get(self.__map_files[0])
+        cache.get(self.__map_files[1])
+        stats = cache.stats()
+        self.assertEqual(stats['maps'], 1)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['size'], MapCache.record_size)
+
+        cache.budget = 0
+        self.assertEqual(cache.stats()['maps'], 0)
+
+    def test_transfer(self):
+        """
+        Check that transferrers share maps through the cache.
+        """
+        map_cache.clear()
+        hits = map_cache.stats()['hits']
+        BedTransfer(self.__map_files[0])
+        transferrer = BedTransfer(self.__map_files[0])
+        self.assertEqual(map_cache.stats()['hits'], hits + 1)
+        self.assertEqual(transferrer.coordinate('fragment1', 10),
+                         ('chr1', 5010))
+        map_cache.clear()
+
+
+class TestGff3Transfer(unittest.TestCase):
+    def setUp(self):
+        self.__map_file = os.path.join('data', 'fragment_map',
+                                       'fragment_map_line.txt')
+
+    def test_stream(self):
+        """
+        Test the streaming GFF3 transfer routine.
+        """
+        input_lines = [
+            '##gff-version 3\n',
+            '##sequence-region fragment1 1 180\n',
+            '##sequence-region fragment2 1 100\n',
+            'fragment1\ttest\tgene\t11\t50\t.\t+\t.\tID=gene1\n',
+            '# a comment\n',
+            'fragment1\ttest\tmRNA\t11\t50\t.\t+\t.\t'
+            'ID=mrna1;Parent=gene1\n',
+            '###\n',
+            'fragment2\ttest\tgene\t1\t10\t.\t+\t.\tID=gene2\n',
+            '##FASTA\n',
+            '>fragment1\n'
+        ]
+        output_file = StringIO()
+        transferrer = Gff3Transfer(self.__map_file)
+        self.assertEqual(transferrer.stream(input_lines, output_file),
+                         (3, 2))
+        self.assertEqual(output_file.getvalue().splitlines(), [
+            '##gff-version 3',
+            '##sequence-region chr1 1 5180',
+            'chr1\ttest\tgene\t5011\t5050\t.\t+\t.\tID=gene1',
+            '# a comment',
+            'chr1\ttest\tmRNA\t5011\t5050\t.\t+\t.\t'
+            'ID=mrna1;Parent=gene1',
+            '###'
+        ])
+
+    def test_stream_incorrect(self):
+        """
+        Check that malformed GFF3 lines are reported.
+        """
+        transferrer = Gff3Transfer(self.__map_file)
+        for line in ('fragment1\ttest\tgene\t11\t50\n',
+                     'fragment1\ttest\tgene\t11\tend\t.\t+\t.\t'
+                     'ID=gene1\n',
+                     '##sequence-region\n'):
+            with self.assertRaises(TransferError):
+                transferrer.stream(['##gff-version 3\n', line],
+                                   StringIO())
+
+
+class TestTransferPolicy(unittest.TestCase):
+    def setUp(self):
+        # the fragment is placed partially in two regions on different
+        # strands
+        self.__map = Map()
+        self.__map.add_record(Map.Record('f', 300, 0, 100, '+', 'chr1',
+                                         1000, 1100))
+        self.__map.add_record(Map.Record('f', 300, 150, 300, '-',
+                                         'chr2', 0, 150))
+
+    @staticmethod
+    def __bed(start, end, strand='+'):
+        return Record('f', start, end, 'feature', None, strand,
+                      *([None] * 6))
+
+    def test_coordinate(self):
+        transferrer = BedTransfer(self.__map)
+        self.assertEqual(transferrer.coordinate('f', 50), ('chr1', 1050))
+        self.assertIsNone(transferrer.coordinate('f', 120))
+        self.assertEqual(transferrer.coordinate('f', 200), ('chr2', 100))
+        self.assertIsNone(transferrer.coordinate('g', 50))
+
+    def test_policies(self):
+        """
+        Test transferring features according to the policies.
+        """
+        for policy in BedTransfer.policies:
+            transferrer = BedTransfer(self.__map, policy)
+            transferred = transferrer.features(self.__bed(50, 80))
+            self.assertEqual(len(transferred), 1)
+            self.assertEqual(transferred[0][:3], ('chr1', 1050, 1080))
+            self.assertEqual(transferred[0].strand, '+')
+            transferred = transferrer.feature(self.__bed(160, 170))
+            self.assertEqual(transferred[:3], ('chr2', 130, 140))
+            self.assertEqual(transferred.strand, '-')
+            self.assertEqual(transferrer.features(self.__bed(110, 120)),
+                             [])
+
+        feature = self.__bed(50, 200)
+        self.assertEqual(BedTransfer(self.__map).features(feature), [])
+        self.assertEqual(
+            [i[:3] for i in BedTransfer(self.__map, 'clip').features(
+                feature)], [('chr1', 1050, 1100)])
+        self.assertEqual(
+            [i[:3] for i in BedTransfer(self.__map, 'split').features(
+                feature)], [('chr1', 1050, 1100), ('chr2', 100, 150)])
+        self.assertIsNone(BedTransfer(self.__map, 'split').feature(
+            feature))
+
+        with self.assertRaises(TransferError):
+            BedTransfer(self.__map, 'incorrect')
+
+    def test_models(self):
+        """
+        Check that a gene model is skipped if one of its features is
+        not transferred.
+        """
+        input_lines = [
+            'f\ttest\tgene\t51\t200\t.\t+\t.\tID=gene1\n',
+            'f\ttest\texon\t51\t80\t.\t+\t.\tParent=gene1\n',
+            'f\ttest\tgene\t61\t70\t.\t+\t.\tID=gene2\n'
+        ]
+        output_file = StringIO()
+        self.assertEqual(Gff3Transfer(self.__map).stream(
+            input_lines, output_file), (3, 1))
+        self.assertEqual(output_file.getvalue(),
+                         'chr1\ttest\tgene\t1061\t1070\t.\t+\t.\t'
+                         'ID=gene2\n')
@@ -6,12 +6,17 @@
 
 import glob
 import os
+import shutil
+import subprocess
 import tempfile
 import unittest
 from bioformats.fasta import RandomSequence
 from bioformats.fasta import Writer
 from chromosomer.wrapper.blast import BlastN
+from chromosomer.wrapper.blast import CachedBlastN
 from chromosomer.wrapper.blast import MakeBlastDb
+from chromosomer.wrapper.minimap2 import Minimap2
+from chromosomer.wrapper.process import stream_output
 
 path = os.path.dirname(__file__)
 os.chdir(path)
@@ -77,3 +82,203 @@ class TestWrapperBlastN(unittest.TestCase):
         wrapper.set('-outfmt', 6)
         wrapper.get('-outfmt')
         wrapper.launch()
+
+
+# a stub of minimap2 that records its arguments, creates the index
+# and outputs a PAF line
+MINIMAP2_STUB = """#!/bin/sh
+echo "$@" >> "$MINIMAP2_LOG"
+output=
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -d) echo index > "$2"; exit 0 ;;
+        -o) output="$2"; shift ;;
+    esac
+    shift
+done
+line="seq1\t100\t0\t100\t+\tseq1\t100\t0\t100\t100\t100\t60"
+if [ -n "$output" ]; then
+    printf "$line\n" > "$output"
+else
+    printf "$line\n$line\n"
+fi
+"""
+
+
+class TestWrapperMinimap2(unittest.TestCase):
+    def setUp(self):
+        # put the minimap2 stub to PATH
+        self.__bin_dir = tempfile.mkdtemp()
+        stub = os.path.join(self.__bin_dir, 'minimap2')
+        with open(stub, 'w') as stub_file:
+            stub_file.write(MINIMAP2_STUB)
+        os.chmod(stub, 0o755)
+        self.__path = os.environ['PATH']
+        os.environ['PATH'] = self.__bin_dir + os.pathsep + self.__path
+        self.__log = os.path.join(self.__bin_dir, 'log.txt')
+        os.environ['MINIMAP2_LOG'] = self.__log
+
+        self.__fasta = os.path.join(self.__bin_dir, 'ref.fa')
+        with Writer(self.__fasta) as fasta_writer:
+            fasta_writer.write('seq1', RandomSequence(100).get())
+        self.__output = os.path.join(self.__bin_dir, 'output.paf')
+
+    def tearDown(self):
+        os.environ['PATH'] = self.__path
+        del os.environ['MINIMAP2_LOG']
+        shutil.rmtree(self.__bin_dir)
+
+    def __calls(self):
+        with open(self.__log) as log_file:
+            return [i.split() for i in log_file]
+
+    def test_launch(self):
+        """
+        Test the minimap2 launching routine and reusing the index.
+        """
+        wrapper = Minimap2(self.__fasta, self.__fasta, self.__output,
+                           threads=4)
+        wrapper.set('-x', 'asm5')
+        self.assertEqual(wrapper.get('-x'), 'asm5')
+        wrapper.launch()
+        index = self.__fasta + '.mmi'
+        self.assertEqual(self.__calls(), [
+            ['-t', '4', '-x', 'asm5', '-d', index, self.__fasta],
+            ['-t', '4', '-x', 'asm5', '-o', self.__output, index,
+             self.__fasta]])
+        with open(self.__output) as output_file:
+            self.assertEqual(len(output_file.readlines()), 1)
+
+        # the index is reused if the indexing parameters are the same
+        wrapper.set('-N', 10)
+        wrapper.launch()
+        self.assertEqual(len(self.__calls()), 3)
+        self.assertNotIn('-d', self.__calls()[2])
+        self.assertIn('-N', self.__calls()[2])
+
+        # and it is rebuilt otherwise
+        wrapper.set('-k', 19)
+        wrapper.launch()
+        self.assertEqual(len(self.__calls()), 5)
+        self.assertIn('-d', self.__calls()[3])
+
+    def test_flags(self):
+        """
+        Test passing minimap2 options without arguments.
+        """
+        wrapper = Minimap2(self.__fasta, self.__fasta, self.__output)
+        self.assertIsNone(wrapper.get('-c'))
+        wrapper.set('-c', True)
+        wrapper.set('--cs', False)
+        wrapper.set('-N', 0)
+        wrapper.launch()
+        self.assertEqual(self.__calls()[-1], [
+            '-t', '1', '-N', '0', '-c', '-o', self.__output,
+            self.__fasta + '.mmi', self.__fasta])
+
+    def test_alignments(self):
+        """
+        Test streaming minimap2 alignments.
+        """
+        wrapper = Minimap2(self.__fasta, self.__fasta)
+        lines = list(wrapper.alignments())
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0].split('\t')[0], 'seq1')
+
+
+class TestStreamOutput(unittest.TestCase):
+    def test_stream_output(self):
+        """
+        Test streaming output of a program.
+        """
+        self.assertEqual(list(stream_output(['echo', 'test'])),
+                         ['test\n'])
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(stream_output(['false']))
+        # the program is terminated if its output is not read
+        lines = stream_output(['yes'])
+        self.assertEqual(next(lines), 'y\n')
+        lines.close()
+
+
+# a stub of blastn that records the number of query sequences and
+# outputs an alignment of each of them
+BLASTN_STUB = """#!/bin/sh
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -query) query="$2"; shift ;;
+        -out) output="$2"; shift ;;
+    esac
+    shift
+done
+grep -c '^>' "$query" >> "$BLASTN_LOG"
+grep '^>' "$query" | sed 's/^>//' | while read name; do
+    printf "%s\tchr1\t100.0\t10\t0\t0\t1\t10\t1\t10\t1e-5\t20.0\n" \
+        "$name"
+done > "$output"
+"""
+
+
+class TestWrapperCachedBlastN(unittest.TestCase):
+    def setUp(self):
+        # put the blastn stub to PATH
+        self.__dir = tempfile.mkdtemp()
+        stub = os.path.join(self.__dir, 'blastn')
+        with open(stub, 'w') as stub_file:
+            stub_file.write(BLASTN_STUB)
+        os.chmod(stub, 0o755)
+        self.__path = os.environ['PATH']
+        os.environ['PATH'] = self.__dir + os.pathsep + self.__path
+        self.__log = os.path.join(self.__dir, 'log.txt')
+        os.environ['BLASTN_LOG'] = self.__log
+
+        self.__database = os.path.join(self.__dir, 'db')
+        with open(self.__database + '.nin', 'w') as database_file:
+            database_file.write('database')
+        self.__cache = os.path.join(self.__dir, 'cache.db')
+        self.__output = os.path.join(self.__dir, 'output.txt')
+        self.__seqs = [RandomSequence(100).get() for _ in xrange(2)]
+
+    def tearDown(self):
+        os.environ['PATH'] = self.__path
+        del os.environ['BLASTN_LOG']
+        shutil.rmtree(self.__dir)
+
+    def __launch(self, seqs, evalue=10):
+        query = os.path.join(self.__dir, 'query.fa')
+        for i in glob.glob(query + '*'):
+            os.unlink(i)
+        with Writer(query) as fasta_writer:
+            for i, seq in enumerate(seqs):
+                fasta_writer.write('seq{}'.format(i + 1), seq)
+        wrapper = CachedBlastN(query, self.__database, self.__cache,
+                               self.__output)
+        wrapper.set('-evalue', evalue)
+        wrapper.launch()
+        with open(self.__output) as output_file:
+            return [i.split('\t', 1)[0] for i in output_file]
+
+    def __aligned(self):
+        with open(self.__log) as log_file:
+            return [int(i) for i in log_file]
+
+    def test_launch(self):
+        """
+        Check that only sequences missing in the cache are aligned.
+        """
+        # the third sequence duplicates the first one
+        seqs = self.__seqs + [self.__seqs[0]]
+        self.assertEqual(self.__launch(seqs), ['seq1', 'seq2', 'seq3'])
+        self.assertEqual(self.__aligned(), [2])
+
+        seqs[1] = RandomSequence(100).get()
+        self.assertEqual(self.__launch(seqs), ['seq1', 'seq2', 'seq3'])
+        self.assertEqual(self.__aligned(), [2, 1])
+
+        self.assertEqual(self.__launch(seqs), ['seq1', 'seq2', 'seq3'])
+        self.assertEqual(self.__aligned(), [2, 1])
+
+        # other parameters require new alignments
+        self.assertEqual(self.__launch(seqs, 1), ['seq1', 'seq2',
+                                                  'seq3'])
+        self.assertEqual(self.__aligned(), [2, 1, 2])